@@ -9,6 +9,11 @@ from config.config import Config
 from app.utils.logging_config import setup_logging
 from app.utils.error_handlers import register_error_handlers
 from app.utils.cache import cache_manager
+from app.utils.json_provider import FastJSONProvider
+from app.utils.database import init_database
+from app.utils.metrics import metrics
+from app.utils import profiling
+from app.utils.decorators import has_admin_token
 import os
 import uuid
 import time
@@ -20,14 +25,16 @@ def create_app(config_class=Config):
     """创建Flask应用实例"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app, app.config.get('JSON_BACKEND', 'auto'))
     
     # 设置日志系统
     setup_logging(app)
 
     # 初始化扩展
-    db.init_app(app)
+    init_database(app, db)
     migrate.init_app(app, db)
     cache_manager.init_app(app)
+    metrics.init_app(app)
 
     # 注册错误处理器
     register_error_handlers(app)
@@ -40,8 +47,13 @@ def create_app(config_class=Config):
         request.request_id = str(uuid.uuid4())[:8]
         g.request_start_time = time.time()
 
-        # 记录请求信息
+        # 抽样剖析；管理员可用 X-Profile: 1 强制剖析本次请求
         if not request.path.startswith('/static/'):
+            forced = request.headers.get('X-Profile') == '1' and has_admin_token()
+            g.profile_session = profiling.start_profile('request', request.endpoint or request.path, forced)
+
+        # 记录请求信息
+        if app.config.get('REQUEST_LOG_ENABLED', True) and not request.path.startswith('/static/'):
             app.logger.info(f"请求开始: {request.method} {request.path} [ID: {request.request_id}]")
 
     @app.after_request
@@ -49,13 +61,42 @@ def create_app(config_class=Config):
         """请求后处理"""
         if hasattr(g, 'request_start_time'):
             duration = time.time() - g.request_start_time
-            app.logger.info(
-                f"请求完成: {request.method} {request.path} "
-                f"[ID: {getattr(request, 'request_id', 'unknown')}] "
-                f"状态: {response.status_code} 耗时: {duration:.3f}s"
-            )
+
+            # 按端点（而不是路径）统计，避免地图ID等参数造成标签膨胀
+            endpoint = request.endpoint or 'unmatched'
+            metrics.inc('craftne_http_requests_total', {
+                'endpoint': endpoint, 'method': request.method, 'status': response.status_code
+            })
+            metrics.observe('craftne_http_request_duration_seconds', duration, {
+                'endpoint': endpoint, 'method': request.method
+            })
+
+            profile_session = g.pop('profile_session', None)
+            if profile_session is not None:
+                profile_id = profiling.finish_profile(profile_session, {
+                    'method': request.method,
+                    'path': request.full_path.rstrip('?'),
+                    'status': response.status_code,
+                    'request_id': getattr(request, 'request_id', None)
+                })
+                if profile_id:
+                    response.headers['X-Profile-Id'] = profile_id
+
+            if app.config.get('REQUEST_LOG_ENABLED', True):
+                app.logger.info(
+                    f"请求完成: {request.method} {request.path} "
+                    f"[ID: {getattr(request, 'request_id', 'unknown')}] "
+                    f"状态: {response.status_code} 耗时: {duration:.3f}s"
+                )
         return response
 
+    @app.teardown_request
+    def teardown_request(exc):
+        """未返回响应（未处理的异常）时停止剖析，不保存"""
+        profile_session = g.pop('profile_session', None)
+        if profile_session is not None:
+            profile_session.stop()
+
     # 注册蓝图
     from app.views.main import bp as main_bp
     from app.views.upload import bp as upload_bp
@@ -2,5 +2,8 @@
 from .map_data import MapData
 from .annotation import Annotation
 from .training_job import TrainingJob
+from .stats_counter import StatsCounter
+from . import search_index  # 注册全文索引同步事件
+from . import spatial_index  # 注册空间索引同步事件
 
-__all__ = ['MapData', 'Annotation', 'TrainingJob']
+__all__ = ['MapData', 'Annotation', 'TrainingJob', 'StatsCounter']
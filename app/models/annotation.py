@@ -3,16 +3,22 @@
 """
 
 from app import db
+from app.models.map_data import MapData
 from datetime import datetime, timezone
+from sqlalchemy import event
 import json
 
 class Annotation(db.Model):
     """标注数据模型"""
     
     __tablename__ = 'annotations'
+    __table_args__ = (
+        # 按地图列出标注的游标分页
+        db.Index('ix_annotations_map_data_id_created_at_id', 'map_data_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    map_data_id = db.Column(db.Integer, db.ForeignKey('map_data.id'), nullable=False)
+    map_data_id = db.column_property(db.Column(db.Integer, db.ForeignKey('map_data.id'), nullable=False), active_history=True)
     
     # 标注信息
     label = db.Column(db.String(100), nullable=False)
@@ -75,6 +81,36 @@ class Annotation(db.Model):
             properties=json.dumps(properties) if properties else None
         )
 
+def adjust_annotation_count(connection, map_data_id, delta):
+    """在当前事务中调整地图的冗余标注计数"""
+    if map_data_id is None:
+        return
+    table = MapData.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == map_data_id)
+        .values(annotation_count=table.c.annotation_count + delta)
+    )
+
+
+@event.listens_for(Annotation, 'after_insert')
+def _annotation_inserted(mapper, connection, target):
+    adjust_annotation_count(connection, target.map_data_id, 1)
+
+
+@event.listens_for(Annotation, 'after_delete')
+def _annotation_deleted(mapper, connection, target):
+    adjust_annotation_count(connection, target.map_data_id, -1)
+
+
+@event.listens_for(Annotation, 'after_update')
+def _annotation_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.map_data_id.history
+    if history.has_changes():
+        for old_id in history.deleted:
+            adjust_annotation_count(connection, old_id, -1)
+        adjust_annotation_count(connection, target.map_data_id, 1)
+
 class AnnotationLabel(db.Model):
     """标注标签预设"""
     
@@ -3,14 +3,48 @@
 """
 
 from app import db
+from collections import OrderedDict
 from datetime import datetime, timezone
 import json
 import os
+import threading
+
+# 解码后的统计字段缓存，键为 (地图ID, 字段名, updated_at)，记录更新后自然失效
+_DECODED_STATS_CACHE = OrderedDict()
+_DECODED_STATS_CACHE_SIZE = 2048
+_decoded_stats_lock = threading.Lock()
+
+
+def _decode_stats_field(map_id, field, updated_at, raw):
+    """解码JSON统计字段，同一版本的记录只解码一次"""
+    if not raw:
+        return {}
+
+    key = (map_id, field, updated_at)
+    with _decoded_stats_lock:
+        value = _DECODED_STATS_CACHE.get(key)
+        if value is not None:
+            _DECODED_STATS_CACHE.move_to_end(key)
+            return value
+
+    value = json.loads(raw)
+    with _decoded_stats_lock:
+        _DECODED_STATS_CACHE[key] = value
+        if len(_DECODED_STATS_CACHE) > _DECODED_STATS_CACHE_SIZE:
+            _DECODED_STATS_CACHE.popitem(last=False)
+    return value
 
 class MapData(db.Model):
     """地图数据模型"""
     
     __tablename__ = 'map_data'
+    __table_args__ = (
+        # 列表游标分页：按 (created_at, id) 倒序，可选按解析状态过滤
+        db.Index('ix_map_data_created_at_id', 'created_at', 'id'),
+        db.Index('ix_map_data_parse_status_created_at_id', 'parse_status', 'created_at', 'id'),
+        # 地图列表页、训练数据只取已解析的地图
+        db.Index('ix_map_data_is_parsed_created_at_id', 'is_parsed', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -26,8 +60,9 @@ class MapData(db.Model):
     region_z = db.Column(db.Integer)
 
     # 解析状态
-    is_parsed = db.Column(db.Boolean, default=False)
-    parse_status = db.Column(db.String(50), default='pending')  # pending, parsing, completed, failed
+    # active_history: 修改前加载旧值，统计计数事件据此计算增减
+    is_parsed = db.column_property(db.Column(db.Boolean, default=False), active_history=True)
+    parse_status = db.column_property(db.Column(db.String(50), default='pending'), active_history=True)  # pending, parsing, completed, failed
     parse_error = db.Column(db.Text)
     parse_progress = db.Column(db.Float, default=0.0)
     task_id = db.Column(db.String(255))  # Celery任务ID
@@ -36,6 +71,7 @@ class MapData(db.Model):
     block_types_count = db.Column(db.Text)  # JSON格式存储方块类型统计
     biome_distribution = db.Column(db.Text)  # JSON格式存储生物群系分布
     height_map_data = db.Column(db.Text)  # JSON格式存储高度图数据
+    annotation_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 由标注模型事件维护
 
     # 时间戳
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -49,8 +85,16 @@ class MapData(db.Model):
     def __repr__(self):
         return f'<MapData {self.filename}>'
 
-    def to_dict(self):
-        """转换为字典格式"""
+    def to_dict(self, annotation_count=None):
+        """
+        转换为字典格式
+
+        Args:
+            annotation_count: 批量序列化时预先查询的标注数量，默认使用冗余计数列
+        """
+        if annotation_count is None:
+            annotation_count = self.annotation_count or 0
+
         return {
             'id': self.id,
             'filename': self.filename,
@@ -67,11 +111,16 @@ class MapData(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'parsed_at': self.parsed_at.isoformat() if self.parsed_at else None,
-            'block_types_count': json.loads(self.block_types_count) if self.block_types_count else {},
-            'biome_distribution': json.loads(self.biome_distribution) if self.biome_distribution else {},
-            'annotation_count': self.annotations.count()
+            'block_types_count': _decode_stats_field(self.id, 'block_types_count', self.updated_at, self.block_types_count),
+            'biome_distribution': _decode_stats_field(self.id, 'biome_distribution', self.updated_at, self.biome_distribution),
+            'annotation_count': annotation_count
         }
 
+    @classmethod
+    def serialize_many(cls, maps):
+        """批量序列化，标注数量读取 annotation_count 计数列，不再额外查询"""
+        return [map_data.to_dict() for map_data in maps]
+
     def get_file_size_formatted(self):
         """获取格式化的文件大小"""
         size = self.file_size
@@ -114,6 +163,9 @@ class ChunkData(db.Model):
     """区块数据模型"""
     
     __tablename__ = 'chunk_data'
+    __table_args__ = (
+        db.Index('ix_chunk_data_map_data_id_chunk_x_chunk_z', 'map_data_id', 'chunk_x', 'chunk_z'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     map_data_id = db.Column(db.Integer, db.ForeignKey('map_data.id'), nullable=False)
@@ -0,0 +1,166 @@
+"""
+全文搜索索引
+
+使用 SQLite FTS5 虚拟表索引地图文件名、世界名以及标注标签和描述，
+rowid 直接对应原记录ID，模型事件在同一事务中按 rowid 删除并重新写入对应行。
+非 SQLite 数据库或 SQLite 未编译 FTS5 时索引不可用，搜索退回 LIKE 查询。
+"""
+
+import logging
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.map_data import MapData
+from app.models.annotation import Annotation
+
+logger = logging.getLogger(__name__)
+
+MAP_SEARCH_TABLE = 'map_search'
+ANNOTATION_SEARCH_TABLE = 'annotation_search'
+
+SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+
+CREATE_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {MAP_SEARCH_TABLE} "
+    f"USING fts5(title, body, tokenize = '{SEARCH_TOKENIZER}')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {ANNOTATION_SEARCH_TABLE} "
+    f"USING fts5(title, body, map_data_id UNINDEXED, tokenize = '{SEARCH_TOKENIZER}')",
+)
+
+REBUILD_STATEMENTS = (
+    f"DELETE FROM {MAP_SEARCH_TABLE}",
+    f"INSERT INTO {MAP_SEARCH_TABLE} (rowid, title, body) "
+    f"SELECT id, original_filename, COALESCE(world_name, '') FROM map_data",
+    f"DELETE FROM {ANNOTATION_SEARCH_TABLE}",
+    f"INSERT INTO {ANNOTATION_SEARCH_TABLE} (rowid, title, body, map_data_id) "
+    f"SELECT id, label, COALESCE(description, ''), map_data_id FROM annotations",
+)
+
+# 各数据库的索引可用状态，进程内只检查一次
+_index_state = {}
+
+
+def rebuild_search_index(connection):
+    """用原表数据重建全部索引"""
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(text(statement))
+    logger.info("全文搜索索引已重建")
+
+
+def ensure_search_index(connection) -> bool:
+    """
+    确保索引表存在且与原表行数一致，返回索引是否可用
+
+    首次使用时建表；行数不一致（例如索引创建之前已有数据）时重建。
+    """
+    key = str(connection.engine.url)
+    state = _index_state.get(key)
+    if state is not None:
+        return state
+
+    if connection.dialect.name != 'sqlite':
+        state = False
+    else:
+        try:
+            for statement in CREATE_STATEMENTS:
+                connection.execute(text(statement))
+
+            indexed_maps = connection.execute(text(f"SELECT COUNT(*) FROM {MAP_SEARCH_TABLE}")).scalar()
+            indexed_annotations = connection.execute(text(f"SELECT COUNT(*) FROM {ANNOTATION_SEARCH_TABLE}")).scalar()
+            total_maps = connection.execute(text("SELECT COUNT(*) FROM map_data")).scalar()
+            total_annotations = connection.execute(text("SELECT COUNT(*) FROM annotations")).scalar()
+            if (indexed_maps, indexed_annotations) != (total_maps, total_annotations):
+                rebuild_search_index(connection)
+            state = True
+        except OperationalError as e:
+            logger.warning(f"全文搜索索引不可用，将使用LIKE查询: {e}")
+            state = False
+
+    _index_state[key] = state
+    return state
+
+
+def _index_row(connection, table, row_id, values):
+    """按 rowid 替换索引行"""
+    connection.execute(text(f"DELETE FROM {table} WHERE rowid = :rowid"), {'rowid': row_id})
+    columns = ', '.join(values)
+    placeholders = ', '.join(f':{column}' for column in values)
+    connection.execute(
+        text(f"INSERT INTO {table} (rowid, {columns}) VALUES (:rowid, {placeholders})"),
+        dict(values, rowid=row_id)
+    )
+
+
+def index_annotations_by_id(connection, ids):
+    """
+    为批量导入的新标注写入索引行（批量插入绕过了模型事件）
+
+    调用方需先通过 ensure_search_index 确认索引可用，否则首次检查时按行数重建的索引会与这里写入的行重复。
+    """
+    if ids:
+        connection.execute(text(
+            f"INSERT INTO {ANNOTATION_SEARCH_TABLE} (rowid, title, body, map_data_id) "
+            f"SELECT id, label, COALESCE(description, ''), map_data_id FROM annotations WHERE id IN :ids"
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)})
+
+
+def _remove_row(connection, table, row_id):
+    connection.execute(text(f"DELETE FROM {table} WHERE rowid = :rowid"), {'rowid': row_id})
+
+
+def _changed(target, *attributes) -> bool:
+    state = db.inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _index_map(connection, target):
+    _index_row(connection, MAP_SEARCH_TABLE, target.id, {
+        'title': target.original_filename or '',
+        'body': target.world_name or ''
+    })
+
+
+def _index_annotation(connection, target):
+    _index_row(connection, ANNOTATION_SEARCH_TABLE, target.id, {
+        'title': target.label or '',
+        'body': target.description or '',
+        'map_data_id': target.map_data_id
+    })
+
+
+@event.listens_for(MapData, 'after_insert')
+def _map_inserted(mapper, connection, target):
+    if ensure_search_index(connection):
+        _index_map(connection, target)
+
+
+@event.listens_for(MapData, 'after_update')
+def _map_updated(mapper, connection, target):
+    if _changed(target, 'original_filename', 'world_name') and ensure_search_index(connection):
+        _index_map(connection, target)
+
+
+@event.listens_for(MapData, 'after_delete')
+def _map_deleted(mapper, connection, target):
+    if ensure_search_index(connection):
+        _remove_row(connection, MAP_SEARCH_TABLE, target.id)
+
+
+@event.listens_for(Annotation, 'after_insert')
+def _annotation_inserted(mapper, connection, target):
+    if ensure_search_index(connection):
+        _index_annotation(connection, target)
+
+
+@event.listens_for(Annotation, 'after_update')
+def _annotation_updated(mapper, connection, target):
+    if _changed(target, 'label', 'description', 'map_data_id') and ensure_search_index(connection):
+        _index_annotation(connection, target)
+
+
+@event.listens_for(Annotation, 'after_delete')
+def _annotation_deleted(mapper, connection, target):
+    if ensure_search_index(connection):
+        _remove_row(connection, ANNOTATION_SEARCH_TABLE, target.id)
@@ -0,0 +1,128 @@
+"""
+标注空间索引
+
+使用 SQLite R*Tree（rtree_i32，整数坐标）索引标注的包围盒，id 直接对应标注ID。
+第一维存放地图ID（上下界相同），按地图过滤也走索引，不同地图坐标重叠时互不干扰。
+模型事件在同一事务中按 id 删除并重新写入对应行。
+非 SQLite 数据库或 SQLite 未编译 R*Tree 时索引不可用，空间查询退回对标注列的范围条件。
+"""
+
+import logging
+
+from sqlalchemy import bindparam, column, event, table, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.annotation import Annotation
+
+logger = logging.getLogger(__name__)
+
+ANNOTATION_RTREE_TABLE = 'annotation_rtree'
+
+CREATE_STATEMENT = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {ANNOTATION_RTREE_TABLE} "
+    f"USING rtree_i32(id, min_map, max_map, min_x, max_x, min_y, max_y, min_z, max_z)"
+)
+
+_INSERT_COLUMNS = "(id, min_map, max_map, min_x, max_x, min_y, max_y, min_z, max_z)"
+_SELECT_BOXES = "SELECT id, map_data_id, map_data_id, min_x, max_x, min_y, max_y, min_z, max_z FROM annotations"
+
+REBUILD_STATEMENTS = (
+    f"DELETE FROM {ANNOTATION_RTREE_TABLE}",
+    f"INSERT INTO {ANNOTATION_RTREE_TABLE} {_INSERT_COLUMNS} {_SELECT_BOXES}",
+)
+
+# 查询用的表结构（不加入模型元数据，不会被 create_all 创建）
+annotation_rtree = table(
+    ANNOTATION_RTREE_TABLE,
+    column('id'), column('min_map'), column('max_map'),
+    column('min_x'), column('max_x'), column('min_y'), column('max_y'), column('min_z'), column('max_z'),
+)
+
+# 各数据库的索引可用状态，进程内只检查一次
+_index_state = {}
+
+
+def rebuild_spatial_index(connection):
+    """用标注表数据重建索引"""
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(text(statement))
+    logger.info("标注空间索引已重建")
+
+
+def ensure_spatial_index(connection) -> bool:
+    """
+    确保索引表存在且与标注表行数一致，返回索引是否可用
+
+    首次使用时建表；行数不一致（例如索引创建之前已有数据）时重建。
+    """
+    key = str(connection.engine.url)
+    state = _index_state.get(key)
+    if state is not None:
+        return state
+
+    if connection.dialect.name != 'sqlite':
+        state = False
+    else:
+        try:
+            connection.execute(text(CREATE_STATEMENT))
+            indexed = connection.execute(text(f"SELECT COUNT(*) FROM {ANNOTATION_RTREE_TABLE}")).scalar()
+            total = connection.execute(text("SELECT COUNT(*) FROM annotations")).scalar()
+            if indexed != total:
+                rebuild_spatial_index(connection)
+            state = True
+        except OperationalError as e:
+            logger.warning(f"标注空间索引不可用，将使用范围查询: {e}")
+            state = False
+
+    _index_state[key] = state
+    return state
+
+
+def index_annotation_boxes_by_id(connection, ids):
+    """
+    为批量导入的新标注写入索引行（批量插入绕过了模型事件）
+
+    调用方需先通过 ensure_spatial_index 确认索引可用。
+    """
+    if ids:
+        connection.execute(text(
+            f"INSERT INTO {ANNOTATION_RTREE_TABLE} {_INSERT_COLUMNS} {_SELECT_BOXES} WHERE id IN :ids"
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)})
+
+
+def _index_box(connection, target):
+    connection.execute(text(f"DELETE FROM {ANNOTATION_RTREE_TABLE} WHERE id = :id"), {'id': target.id})
+    connection.execute(text(
+        f"INSERT INTO {ANNOTATION_RTREE_TABLE} {_INSERT_COLUMNS} "
+        f"VALUES (:id, :map_id, :map_id, :min_x, :max_x, :min_y, :max_y, :min_z, :max_z)"
+    ), {
+        'id': target.id, 'map_id': target.map_data_id,
+        'min_x': target.min_x, 'max_x': target.max_x,
+        'min_y': target.min_y, 'max_y': target.max_y,
+        'min_z': target.min_z, 'max_z': target.max_z
+    })
+
+
+def _changed(target, *attributes) -> bool:
+    state = db.inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+@event.listens_for(Annotation, 'after_insert')
+def _annotation_inserted(mapper, connection, target):
+    if ensure_spatial_index(connection):
+        _index_box(connection, target)
+
+
+@event.listens_for(Annotation, 'after_update')
+def _annotation_updated(mapper, connection, target):
+    if _changed(target, 'map_data_id', 'min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z') \
+            and ensure_spatial_index(connection):
+        _index_box(connection, target)
+
+
+@event.listens_for(Annotation, 'after_delete')
+def _annotation_deleted(mapper, connection, target):
+    if ensure_spatial_index(connection):
+        connection.execute(text(f"DELETE FROM {ANNOTATION_RTREE_TABLE} WHERE id = :id"), {'id': target.id})
@@ -0,0 +1,154 @@
+"""
+统计计数器模型
+
+单行表保存地图、标注、训练任务按状态的数量，由模型事件在同一事务中增减，
+仪表板和统计接口只需读取这一行，不再对各表逐个执行 COUNT。
+计数行缺失时由 stats_service 用分组查询重建。
+"""
+
+from app import db
+from app.models.map_data import MapData
+from app.models.annotation import Annotation
+from app.models.training_job import TrainingJob
+from datetime import datetime, timezone
+from sqlalchemy import event
+
+# 计数行固定主键
+COUNTER_ROW_ID = 1
+
+MAP_STATUSES = ('pending', 'parsing', 'completed', 'failed')
+JOB_STATUSES = ('pending', 'running', 'completed', 'failed', 'stopped')
+
+
+class StatsCounter(db.Model):
+    """系统统计计数器（单行）"""
+
+    __tablename__ = 'stats_counters'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    maps_total = db.Column(db.Integer, nullable=False, default=0)
+    maps_parsed = db.Column(db.Integer, nullable=False, default=0)
+    maps_pending = db.Column(db.Integer, nullable=False, default=0)
+    maps_parsing = db.Column(db.Integer, nullable=False, default=0)
+    maps_completed = db.Column(db.Integer, nullable=False, default=0)
+    maps_failed = db.Column(db.Integer, nullable=False, default=0)
+
+    annotations_total = db.Column(db.Integer, nullable=False, default=0)
+
+    jobs_total = db.Column(db.Integer, nullable=False, default=0)
+    jobs_pending = db.Column(db.Integer, nullable=False, default=0)
+    jobs_running = db.Column(db.Integer, nullable=False, default=0)
+    jobs_completed = db.Column(db.Integer, nullable=False, default=0)
+    jobs_failed = db.Column(db.Integer, nullable=False, default=0)
+    jobs_stopped = db.Column(db.Integer, nullable=False, default=0)
+
+    rebuilt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    COUNTER_FIELDS = (
+        'maps_total', 'maps_parsed', 'maps_pending', 'maps_parsing', 'maps_completed', 'maps_failed',
+        'annotations_total',
+        'jobs_total', 'jobs_pending', 'jobs_running', 'jobs_completed', 'jobs_failed', 'jobs_stopped',
+    )
+
+    def to_dict(self):
+        """转换为字典格式"""
+        result = {field: getattr(self, field) or 0 for field in self.COUNTER_FIELDS}
+        result['rebuilt_at'] = self.rebuilt_at.isoformat() if self.rebuilt_at else None
+        return result
+
+    def __repr__(self):
+        return f'<StatsCounter maps={self.maps_total} annotations={self.annotations_total} jobs={self.jobs_total}>'
+
+
+def map_counter_fields(parse_status, is_parsed):
+    """一条地图记录计入的计数字段"""
+    fields = ['maps_total']
+    if parse_status in MAP_STATUSES:
+        fields.append(f'maps_{parse_status}')
+    if is_parsed:
+        fields.append('maps_parsed')
+    return fields
+
+
+def job_counter_fields(status):
+    """一条训练任务记录计入的计数字段"""
+    fields = ['jobs_total']
+    if status in JOB_STATUSES:
+        fields.append(f'jobs_{status}')
+    return fields
+
+
+def apply_counter_deltas(connection, deltas):
+    """在当前事务中增减计数，计数行不存在时不做处理（读取时会重建）"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = StatsCounter.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == COUNTER_ROW_ID)
+        .values({field: table.c[field] + delta for field, delta in deltas.items()})
+    )
+
+
+def _field_deltas(old_fields, new_fields):
+    deltas = {}
+    for field in old_fields:
+        deltas[field] = deltas.get(field, 0) - 1
+    for field in new_fields:
+        deltas[field] = deltas.get(field, 0) + 1
+    return deltas
+
+
+def _previous_value(target, attribute):
+    """属性在本次刷新前的值"""
+    history = db.inspect(target).attrs[attribute].history
+    if history.has_changes():
+        return history.deleted[0] if history.deleted else None
+    return getattr(target, attribute)
+
+
+@event.listens_for(MapData, 'after_insert')
+def _map_inserted(mapper, connection, target):
+    apply_counter_deltas(connection, _field_deltas([], map_counter_fields(target.parse_status, target.is_parsed)))
+
+
+@event.listens_for(MapData, 'after_delete')
+def _map_deleted(mapper, connection, target):
+    apply_counter_deltas(connection, _field_deltas(map_counter_fields(target.parse_status, target.is_parsed), []))
+
+
+@event.listens_for(MapData, 'after_update')
+def _map_updated(mapper, connection, target):
+    old_fields = map_counter_fields(_previous_value(target, 'parse_status'), _previous_value(target, 'is_parsed'))
+    new_fields = map_counter_fields(target.parse_status, target.is_parsed)
+    if old_fields != new_fields:
+        apply_counter_deltas(connection, _field_deltas(old_fields, new_fields))
+
+
+@event.listens_for(Annotation, 'after_insert')
+def _annotation_inserted(mapper, connection, target):
+    apply_counter_deltas(connection, {'annotations_total': 1})
+
+
+@event.listens_for(Annotation, 'after_delete')
+def _annotation_deleted(mapper, connection, target):
+    apply_counter_deltas(connection, {'annotations_total': -1})
+
+
+@event.listens_for(TrainingJob, 'after_insert')
+def _job_inserted(mapper, connection, target):
+    apply_counter_deltas(connection, _field_deltas([], job_counter_fields(target.status)))
+
+
+@event.listens_for(TrainingJob, 'after_delete')
+def _job_deleted(mapper, connection, target):
+    apply_counter_deltas(connection, _field_deltas(job_counter_fields(target.status), []))
+
+
+@event.listens_for(TrainingJob, 'after_update')
+def _job_updated(mapper, connection, target):
+    old_status = _previous_value(target, 'status')
+    if old_status != target.status:
+        apply_counter_deltas(connection, _field_deltas(job_counter_fields(old_status), job_counter_fields(target.status)))
@@ -10,6 +10,12 @@ class TrainingJob(db.Model):
     """训练任务模型"""
 
     __tablename__ = 'training_jobs'
+    __table_args__ = (
+        # 列表游标分页：按 (created_at, id) 倒序，可选按状态过滤
+        db.Index('ix_training_jobs_created_at_id', 'created_at', 'id'),
+        db.Index('ix_training_jobs_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_training_jobs_map_data_id', 'map_data_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -27,7 +33,7 @@ class TrainingJob(db.Model):
     validation_data_path = db.Column(db.String(500))
 
     # 训练状态
-    status = db.Column(db.String(50), default='pending')  # pending, running, completed, failed, stopped
+    status = db.column_property(db.Column(db.String(50), default='pending'), active_history=True)  # pending, running, completed, failed, stopped
     progress = db.Column(db.Float, default=0.0)  # 0.0 - 1.0
     current_epoch = db.Column(db.Integer, default=0)
     total_epochs = db.Column(db.Integer, default=100)
@@ -95,6 +101,9 @@ class GeneratedMap(db.Model):
     """生成的地图模型"""
 
     __tablename__ = 'generated_maps'
+    __table_args__ = (
+        db.Index('ix_generated_maps_training_job_id', 'training_job_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     training_job_id = db.Column(db.Integer, db.ForeignKey('training_jobs.id'), nullable=False)
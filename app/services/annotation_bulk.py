@@ -0,0 +1,335 @@
+"""
+标注批量导入导出
+
+导入：逐行读取 NDJSON 或 CSV，每批数千行用 numpy 一次性校验坐标，合法行用 Core insert 的
+executemany 写入，整个导入在同一事务中完成；不合法的行按行号返回错误。
+批量插入不经过模型事件，地图标注计数、统计计数、全文索引和空间索引在同一事务中一并更新。
+导出：直接按列流式读取，不构造ORM对象。
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select
+
+from app import db
+from app.models.annotation import Annotation, adjust_annotation_count
+from app.models.map_data import MapData
+from app.models.search_index import ensure_search_index, index_annotations_by_id
+from app.models.spatial_index import ensure_spatial_index, index_annotation_boxes_by_id
+from app.models.stats_counter import apply_counter_deltas
+from app.utils.json_provider import RawJSON
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+ANNOTATION_TYPES = ('region', 'structure', 'biome')
+
+BATCH_SIZE = 5000
+EXPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+COORDINATE_FIELDS = ('min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z')
+CSV_COLUMNS = ('id', 'label', 'description') + COORDINATE_FIELDS + ('annotation_type', 'properties', 'created_at')
+
+# 世界边界、高度范围（1.18+）与区域文件边长
+WORLD_BORDER = 30_000_000
+MIN_Y, MAX_Y = -64, 319
+REGION_SIZE = 512
+LABEL_MAX_LENGTH = Annotation.__table__.c.label.type.length
+
+
+class AnnotationImportError(Exception):
+    """整个导入请求无效（格式不支持、CSV缺少列等）"""
+
+
+# ---- 解析 ----
+
+def _coordinates_from_record(record: Dict) -> List:
+    """NDJSON 行可以使用 bbox: {min, max} 或平铺的 min_x ... max_z"""
+    bbox = record.get('bbox')
+    if isinstance(bbox, dict):
+        low, high = bbox.get('min') or [], bbox.get('max') or []
+        if len(low) != 3 or len(high) != 3:
+            raise ValueError('bbox.min 和 bbox.max 必须各有3个坐标')
+        return list(low) + list(high)
+    return [record.get(field) for field in COORDINATE_FIELDS]
+
+
+def _parse_properties(value) -> Optional[str]:
+    if value in (None, '', {}):
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise ValueError('properties 必须是JSON对象')
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _iter_ndjson(stream: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'JSON解析失败: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, '每行必须是JSON对象'
+            continue
+        yield line_no, record, None
+
+
+def _iter_csv(stream: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    reader = csv.DictReader(stream)
+    missing = {'label', *COORDINATE_FIELDS} - set(reader.fieldnames or ())
+    if missing:
+        raise AnnotationImportError(f"CSV缺少列: {', '.join(sorted(missing))}")
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def _batches(rows: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---- 校验 ----
+
+def _validate_batch(batch: List, map_data: MapData, now: datetime) -> Tuple[List[Dict], Dict[int, List[str]]]:
+    """
+    校验一批已解析的行
+
+    Returns:
+        (可插入的行, {行号: [错误信息]})
+    """
+    errors: Dict[int, List[str]] = {}
+    candidates = []
+
+    # 逐行只做类型转换，数值约束在下面统一用数组检查
+    coordinates = np.full((len(batch), 6), np.nan)
+    for index, (line_no, record, parse_error) in enumerate(batch):
+        if parse_error:
+            errors[line_no] = [parse_error]
+            continue
+        try:
+            values = _coordinates_from_record(record)
+            coordinates[index] = [float(value) for value in values]
+        except (TypeError, ValueError) as e:
+            errors[line_no] = [f'坐标无效: {e}' if str(e) else '坐标无效']
+            continue
+
+        row_errors = []
+        label = str(record.get('label') or '').strip()
+        if not label:
+            row_errors.append('label 不能为空')
+        elif len(label) > LABEL_MAX_LENGTH:
+            row_errors.append(f'label 超过 {LABEL_MAX_LENGTH} 个字符')
+
+        annotation_type = record.get('annotation_type') or 'region'
+        if annotation_type not in ANNOTATION_TYPES:
+            row_errors.append(f"annotation_type 必须是 {' / '.join(ANNOTATION_TYPES)}")
+
+        try:
+            properties = _parse_properties(record.get('properties'))
+        except (TypeError, ValueError) as e:
+            row_errors.append(f'properties 无效: {e}')
+            properties = None
+
+        if row_errors:
+            errors[line_no] = row_errors
+            continue
+        candidates.append((index, line_no, {
+            'map_data_id': map_data.id,
+            'label': label,
+            'description': record.get('description') or '',
+            'annotation_type': annotation_type,
+            'properties': properties,
+            'created_at': now,
+            'updated_at': now
+        }))
+
+    if not candidates:
+        return [], errors
+
+    indices = np.array([index for index, _, _ in candidates])
+    values = coordinates[indices]
+    low, high = values[:, :3], values[:, 3:]
+
+    checks = [
+        (~np.isfinite(values).all(axis=1), '坐标必须是数字'),
+        ((values != np.floor(values)).any(axis=1), '坐标必须是整数'),
+        ((np.abs(values) > WORLD_BORDER).any(axis=1), f'坐标超出世界边界 ±{WORLD_BORDER}'),
+        ((low > high).any(axis=1), 'min 坐标不能大于 max 坐标'),
+        ((low[:, 1] < MIN_Y) | (high[:, 1] > MAX_Y), f'y 坐标必须在 {MIN_Y} 到 {MAX_Y} 之间'),
+    ]
+    if map_data.region_x is not None and map_data.region_z is not None:
+        origin_x, origin_z = map_data.region_x * REGION_SIZE, map_data.region_z * REGION_SIZE
+        checks.append((
+            (low[:, 0] < origin_x) | (high[:, 0] >= origin_x + REGION_SIZE)
+            | (low[:, 2] < origin_z) | (high[:, 2] >= origin_z + REGION_SIZE),
+            f'坐标超出区域 r.{map_data.region_x}.{map_data.region_z} 的范围'
+        ))
+
+    # 非数字的坐标只报告第一条，其余检查的错误全部列出
+    numeric = np.isfinite(values).all(axis=1)
+    invalid = np.zeros(len(candidates), dtype=bool)
+    for mask, message in checks:
+        for position in np.flatnonzero(mask & (numeric | ~invalid)):
+            errors.setdefault(candidates[position][1], []).append(message)
+        invalid |= mask
+
+    rows = []
+    integer_values = np.nan_to_num(values).astype(np.int64)
+    for position in np.flatnonzero(~invalid):
+        row = candidates[position][2]
+        row.update(zip(COORDINATE_FIELDS, integer_values[position].tolist()))
+        rows.append(row)
+
+    return rows, errors
+
+
+# ---- 导入 ----
+
+def import_annotations(map_data: MapData, stream: Iterable[str], fmt: str = 'ndjson',
+                       on_error: str = 'skip', batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    批量导入标注
+
+    Args:
+        map_data: 目标地图
+        stream: 文本行迭代器（请求体）
+        fmt: ndjson / csv
+        on_error: skip 跳过无效行继续导入；abort 有任何无效行则整体回滚
+        batch_size: 每批校验和插入的行数
+
+    Returns:
+        {'total', 'inserted', 'failed', 'errors': [{'line', 'errors'}], 'errors_truncated', 'rolled_back'}
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise AnnotationImportError(f"不支持的导入格式: {fmt}，支持 {' / '.join(IMPORT_FORMATS)}")
+
+    rows_iter = _iter_csv(stream) if fmt == 'csv' else _iter_ndjson(stream)
+    connection = db.session.connection()
+    # 先确认索引可用，避免首次检查时的按行数重建与本次写入的索引行重复
+    search_enabled = ensure_search_index(connection)
+    spatial_enabled = ensure_spatial_index(connection)
+
+    table = Annotation.__table__
+    # 不要求 RETURNING 按参数顺序返回：SQLite 上那样会退化为逐行插入
+    statement = insert(table).returning(table.c.id)
+    now = datetime.now(timezone.utc)
+
+    total = inserted = failed = 0
+    reported_errors = []
+
+    try:
+        for batch in _batches(rows_iter, batch_size):
+            total += len(batch)
+            rows, errors = _validate_batch(batch, map_data, now)
+
+            failed += len(errors)
+            for line_no in sorted(errors):
+                if len(reported_errors) < MAX_REPORTED_ERRORS:
+                    reported_errors.append({'line': line_no, 'errors': errors[line_no]})
+
+            if not rows or (on_error == 'abort' and failed):
+                continue
+
+            ids = connection.execute(statement, rows).scalars().all()
+            if search_enabled:
+                index_annotations_by_id(connection, ids)
+            if spatial_enabled:
+                index_annotation_boxes_by_id(connection, ids)
+            inserted += len(ids)
+
+        rolled_back = on_error == 'abort' and failed > 0
+        if rolled_back:
+            db.session.rollback()
+            inserted = 0
+        else:
+            adjust_annotation_count(connection, map_data.id, inserted)
+            apply_counter_deltas(connection, {'annotations_total': inserted})
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"批量导入标注: 地图 {map_data.id} 共 {total} 行，导入 {inserted} 条，失败 {failed} 行")
+    return {
+        'total': total,
+        'inserted': inserted,
+        'failed': failed,
+        'errors': reported_errors,
+        'errors_truncated': failed > len(reported_errors),
+        'rolled_back': rolled_back
+    }
+
+
+# ---- 导出 ----
+
+def _export_rows(map_id: int) -> Iterator:
+    table = Annotation.__table__
+    statement = (
+        select(table.c.id, table.c.label, table.c.description, *[table.c[field] for field in COORDINATE_FIELDS],
+               table.c.annotation_type, table.c.properties, table.c.created_at)
+        .where(table.c.map_data_id == map_id)
+        .order_by(table.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return db.session.execute(statement)
+
+
+def export_ndjson(map_id: int, dumps) -> Iterator[bytes]:
+    """
+    导出为NDJSON，每行与单条标注接口的结构一致
+
+    Args:
+        dumps: 对象 -> 字节的编码函数（应用的 JSON provider），properties 以原始JSON拼接
+    """
+    for row in _export_rows(map_id):
+        yield dumps({
+            'id': row.id,
+            'map_data_id': map_id,
+            'label': row.label,
+            'description': row.description,
+            'bbox': {
+                'min': [row.min_x, row.min_y, row.min_z],
+                'max': [row.max_x, row.max_y, row.max_z]
+            },
+            'annotation_type': row.annotation_type,
+            'properties': RawJSON(row.properties) if row.properties else {},
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }) + b'\n'
+
+
+def export_csv(map_id: int) -> Iterator[bytes]:
+    """导出为CSV，列与导入格式一致，每批行编码一次"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+
+    for count, row in enumerate(_export_rows(map_id), 1):
+        writer.writerow((
+            row.id, row.label, row.description or '', *[row[3 + i] for i in range(6)],
+            row.annotation_type, row.properties or '', row.created_at.isoformat() if row.created_at else ''
+        ))
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
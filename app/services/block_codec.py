@@ -0,0 +1,171 @@
+"""
+方块二进制编码服务
+
+供 Three.js 查看器使用的紧凑二进制格式，所有数值均为小端序::
+
+    头部（28字节）
+      0   char[4]  magic        固定为 b'CNEB'
+      4   uint16   version      当前为 1
+      6   uint16   flags        bit0 = 1 时坐标为 Int32，否则为 Int16
+      8   uint32   palette_size 方块类型数量
+      12  uint32   block_count  方块总数
+      16  int32[3] origin       坐标原点 (x, y, z)，坐标均相对原点存储
+
+    调色板（palette_size 项，紧随头部）
+      uint16   name_length
+      uint8[]  name         UTF-8 方块名，如 minecraft:stone
+      uint16   block_id     数值ID（未知为0）
+      uint32   count        该类型的方块数量
+      整个调色板末尾补零对齐到4字节
+
+    坐标数据（按调色板顺序，每种类型一段连续数组）
+      Int16/Int32[count * 3]  交错的 x, y, z（相对 origin）
+      每段末尾补零对齐到4字节，客户端可以直接创建 TypedArray 视图
+
+坐标相对区域最小角存储，单个区域文件（512x512）内总能使用 Int16。
+"""
+
+import os
+import struct
+import tempfile
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+MAGIC = b'CNEB'
+VERSION = 1
+FLAG_INT32 = 0x1
+HEADER_FORMAT = '<4sHHII3i'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CONTENT_TYPE = 'application/octet-stream'
+
+
+def _pad4(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def encode_blocks(blocks: Iterable[Dict]) -> bytes:
+    """将方块字典序列编码为二进制格式"""
+    palette_index: Dict[str, int] = {}
+    palette: List[Tuple[str, int]] = []
+    type_indices: List[int] = []
+    coords: List[int] = []
+
+    for block in blocks:
+        block_type = block['block_type']
+        index = palette_index.get(block_type)
+        if index is None:
+            index = palette_index[block_type] = len(palette)
+            palette.append((block_type, block.get('block_id', 0) or 0))
+        type_indices.append(index)
+        coords.extend((block['x'], block['y'], block['z']))
+
+    positions = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    return encode_arrays(positions, np.asarray(type_indices, dtype=np.int64), palette)
+
+
+def encode_arrays(positions: np.ndarray, types: np.ndarray, palette: List[Tuple[str, int]]) -> bytes:
+    """
+    将坐标数组编码为二进制格式
+
+    Args:
+        positions: (N, 3) 整数坐标
+        types: (N,) 调色板下标
+        palette: [(方块名, 数值ID), ...]
+    """
+    block_count = len(types)
+
+    origin = positions.min(axis=0) if block_count else np.zeros(3, dtype=np.int64)
+    relative = positions - origin
+
+    use_int32 = block_count > 0 and int(relative.max()) > np.iinfo(np.int16).max
+    dtype = np.dtype('<i4') if use_int32 else np.dtype('<i2')
+
+    # 稳定排序保持同一类型内的原始（区块）顺序
+    order = np.argsort(types, kind='stable')
+    counts = np.bincount(types, minlength=len(palette)) if block_count else np.zeros(len(palette), dtype=np.int64)
+    sorted_positions = relative[order].astype(dtype)
+
+    parts = [struct.pack(
+        HEADER_FORMAT, MAGIC, VERSION, FLAG_INT32 if use_int32 else 0,
+        len(palette), block_count, *(int(v) for v in origin)
+    )]
+
+    palette_bytes = bytearray()
+    for index, (block_type, block_id) in enumerate(palette):
+        name = block_type.encode('utf-8')
+        palette_bytes += struct.pack('<H', len(name)) + name
+        palette_bytes += struct.pack('<HI', block_id, int(counts[index]))
+    palette_bytes += b'\0' * _pad4(len(palette_bytes))
+    parts.append(bytes(palette_bytes))
+
+    start = 0
+    for index in range(len(palette)):
+        count = int(counts[index])
+        section = sorted_positions[start:start + count].tobytes()
+        parts.append(section + b'\0' * _pad4(len(section)))
+        start += count
+
+    return b''.join(parts)
+
+
+def decode_blocks(data: bytes) -> Dict:
+    """解码二进制格式，返回调色板和每种类型的坐标数组（绝对坐标）"""
+    magic, version, flags, palette_size, block_count, ox, oy, oz = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC:
+        raise ValueError('不是有效的CraftNE方块数据')
+    if version != VERSION:
+        raise ValueError(f'不支持的方块数据版本: {version}')
+
+    dtype = np.dtype('<i4') if flags & FLAG_INT32 else np.dtype('<i2')
+    origin = np.array([ox, oy, oz], dtype=np.int64)
+
+    offset = HEADER_SIZE
+    palette = []
+    for _ in range(palette_size):
+        (name_length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        block_id, count = struct.unpack_from('<HI', data, offset)
+        offset += 6
+        palette.append({'block_type': name, 'block_id': block_id, 'count': count})
+    offset += _pad4(offset - HEADER_SIZE)
+
+    for entry in palette:
+        length = entry['count'] * 3 * dtype.itemsize
+        positions = np.frombuffer(data, dtype=dtype, count=entry['count'] * 3, offset=offset)
+        entry['positions'] = positions.reshape(-1, 3).astype(np.int64) + origin
+        offset += length + _pad4(length)
+
+    return {'block_count': block_count, 'origin': origin.tolist(), 'palette': palette}
+
+
+def write_binary_artifact(path: str, blocks: Iterable[Dict]) -> int:
+    """编码并原子写入二进制产物，返回字节数；每次写入使用独立的临时文件，并发生成时互不影响"""
+    data = encode_blocks(blocks)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(data)
+
+
+def ensure_binary_artifact(store, name: str = 'blocks.bin', blocks: Iterable[Dict] = None) -> str:
+    """
+    确保地图目录下存在二进制产物，不存在时从方块存储生成
+
+    Args:
+        store: BlockStore 实例
+        name: 产物文件名
+        blocks: 方块来源，默认使用整个方块存储
+    """
+    path = store.artifact_path(name)
+    if not os.path.exists(path):
+        write_binary_artifact(path, blocks if blocks is not None else store.iter_blocks())
+    return path
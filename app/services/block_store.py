@@ -0,0 +1,249 @@
+"""
+按区块组织的方块存储服务
+
+解析结果按区块写入 ``<cache_dir>/map_{id}/blocks.ndjson``，每行是一个区块：
+``{"chunk":[cx,cz],"count":n,"blocks":[...]}``。
+``blocks_index.json`` 记录每个区块行的偏移和长度（按区块坐标排序），
+读取方可以按区块顺序逐行读取原始字节，不需要把整个文件解析进内存。
+同一目录也用于存放由方块存储派生的其他产物。重新解析时先写入 ``map_{id}.tmp``，
+派生产物也在该目录中生成，全部完成后整体替换正式目录，解析期间读取方仍使用旧数据，
+解析失败时旧数据保持不变。
+派生的方块集合（如只含外表面的 ``shell``）使用同样的格式，文件名以集合名为前缀。
+"""
+
+import bisect
+import json
+import logging
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from config.mca_parser_config import MCAParserConfig
+    DEFAULT_CACHE_DIR = MCAParserConfig.CACHE_DIR
+except ImportError:
+    DEFAULT_CACHE_DIR = os.path.join('instance', 'cache')
+
+logger = logging.getLogger(__name__)
+
+
+def replace_directory(staging_path: str, live_path: str):
+    """
+    用临时目录替换正式目录：旧目录先改名让开再删除，两次改名之间正式目录只短暂缺失
+
+    临时目录应由调用方独占（如 tempfile.mkdtemp 创建）。并发替换时若正式目录已被
+    另一个写入方换上，放弃本次结果。
+    """
+    retired_path = f"{staging_path}.old"
+    if os.path.exists(retired_path):
+        shutil.rmtree(retired_path)
+    try:
+        os.rename(live_path, retired_path)
+    except FileNotFoundError:
+        retired_path = None
+
+    try:
+        os.rename(staging_path, live_path)
+    except OSError:
+        if not os.path.isdir(live_path):
+            raise
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+    if retired_path:
+        shutil.rmtree(retired_path, ignore_errors=True)
+
+
+class BlockStore:
+    """单个地图的区块存储"""
+
+    # 解析器写入的完整方块集合
+    FULL_SET = 'blocks'
+
+    def __init__(self, map_data_id: int, cache_dir: str = None, block_set: str = FULL_SET, path: str = None):
+        self.map_data_id = map_data_id
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.block_set = block_set
+        # 默认为正式目录；指向临时目录时用于在替换前生成派生产物
+        self.path = path or os.path.join(self.cache_dir, f'map_{map_data_id}')
+        self._index = None
+
+    @property
+    def blocks_path(self) -> str:
+        return os.path.join(self.path, f'{self.block_set}.ndjson')
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.path, f'{self.block_set}_index.json')
+
+    def sibling(self, block_set: str) -> 'BlockStore':
+        """同一地图目录下的另一个方块集合"""
+        return BlockStore(self.map_data_id, self.cache_dir, block_set, self.path)
+
+    def artifact_path(self, *parts: str) -> str:
+        """派生产物路径（位于同一地图目录下）"""
+        return os.path.join(self.path, *parts)
+
+    def exists(self) -> bool:
+        """存储是否已完整写入"""
+        return os.path.exists(self.index_path) and os.path.exists(self.blocks_path)
+
+    def reset(self):
+        """清空地图目录，连同所有派生产物"""
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path, exist_ok=True)
+        self._index = None
+
+    @property
+    def staging_path(self) -> str:
+        """重新写入整个地图目录时使用的临时目录"""
+        return f"{self.path}.tmp"
+
+    def open_writer(self, reset: bool = True) -> 'BlockStoreWriter':
+        """
+        返回写入器
+
+        Args:
+            reset: 是否替换整个地图目录（在临时目录中写入，完成时替换正式目录，旧产物随之移除）；
+                写入派生集合时传 False，直接在正式目录中写入，保留完整集合和其他产物
+        """
+        if reset:
+            staging_path = self.staging_path
+            if os.path.exists(staging_path):
+                shutil.rmtree(staging_path)
+            os.makedirs(staging_path)
+            return BlockStoreWriter(self, staging_path)
+
+        os.makedirs(self.path, exist_ok=True)
+        self._index = None
+        return BlockStoreWriter(self)
+
+    def load_index(self) -> Dict:
+        """读取区块索引"""
+        if self._index is None:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        return self._index
+
+    @property
+    def meta(self) -> Dict:
+        return self.load_index().get('meta', {})
+
+    def chunk_entries(self) -> List[List[int]]:
+        """按区块坐标排序的索引条目 [cx, cz, offset, length, count]"""
+        return self.load_index().get('chunks', [])
+
+    def has_chunk(self, chunk_x: int, chunk_z: int) -> bool:
+        """索引中是否有该区块（条目按坐标排序，二分查找）"""
+        entries = self.chunk_entries()
+        position = bisect.bisect_left(entries, [chunk_x, chunk_z])
+        return position < len(entries) and entries[position][:2] == [chunk_x, chunk_z]
+
+    def iter_chunk_lines(self, chunks: Optional[List[Tuple[int, int]]] = None) -> Iterator[bytes]:
+        """按区块顺序逐行返回原始NDJSON字节（含换行符）"""
+        entries = self.chunk_entries()
+        if chunks is not None:
+            wanted = set(map(tuple, chunks))
+            entries = [entry for entry in entries if (entry[0], entry[1]) in wanted]
+
+        with open(self.blocks_path, 'rb') as f:
+            for _, _, offset, length, _ in entries:
+                f.seek(offset)
+                yield f.read(length)
+
+    def iter_chunks(self, chunks: Optional[List[Tuple[int, int]]] = None) -> Iterator[Tuple[int, int, List[Dict]]]:
+        """按区块顺序返回 (cx, cz, blocks)"""
+        for line in self.iter_chunk_lines(chunks):
+            record = json.loads(line)
+            cx, cz = record['chunk']
+            yield cx, cz, record['blocks']
+
+    def read_chunk(self, chunk_x: int, chunk_z: int) -> List[Dict]:
+        """读取单个区块的方块，不存在时返回空列表"""
+        for _, _, blocks in self.iter_chunks([(chunk_x, chunk_z)]):
+            return blocks
+        return []
+
+    def iter_blocks(self) -> Iterator[Dict]:
+        """逐个返回所有方块"""
+        for _, _, blocks in self.iter_chunks():
+            yield from blocks
+
+
+class BlockStoreWriter:
+    """区块存储写入器，完成前写入临时文件（或临时目录），完成时原子替换"""
+
+    def __init__(self, store: BlockStore, staging_path: Optional[str] = None):
+        self.store = store
+        self.staging_path = staging_path
+        # 写入目录对应的存储：替换前可以在其上生成派生产物
+        self.staged_store = BlockStore(store.map_data_id, store.cache_dir, store.block_set, staging_path) \
+            if staging_path else store
+        directory = staging_path or store.path
+        self._blocks_path = os.path.join(directory, os.path.basename(store.blocks_path))
+        self._index_path = os.path.join(directory, os.path.basename(store.index_path))
+        self._tmp_blocks = f"{self._blocks_path}.partial"
+        self._file = open(self._tmp_blocks, 'wb')
+        self._entries = []
+        self._offset = 0
+        self.block_count = 0
+
+    def write_chunk(self, chunk_x: int, chunk_z: int, blocks: List[Dict]):
+        """写入一个区块（调用顺序无要求，索引会按坐标排序）"""
+        if not blocks:
+            return
+
+        line = json.dumps(
+            {'chunk': [chunk_x, chunk_z], 'count': len(blocks), 'blocks': blocks},
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8') + b'\n'
+
+        self._file.write(line)
+        self._entries.append([chunk_x, chunk_z, self._offset, len(line), len(blocks)])
+        self._offset += len(line)
+        self.block_count += len(blocks)
+
+    def finalize(self, meta: Optional[Dict] = None, publish: bool = True):
+        """
+        写入索引并原子替换正式文件
+
+        Args:
+            publish: 在临时目录中写入时是否立即替换正式目录；传 False 时先在 staged_store 上
+                生成派生产物，再调用 publish()
+        """
+        self._file.close()
+        self._entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+        index = {
+            'meta': dict(meta or {}, chunk_count=len(self._entries), block_count=self.block_count),
+            'chunks': self._entries
+        }
+
+        tmp_index = f"{self._index_path}.partial"
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+
+        os.replace(self._tmp_blocks, self._blocks_path)
+        os.replace(tmp_index, self._index_path)
+        self.staged_store._index = index
+
+        logger.info(f"方块存储写入完成: map_{self.store.map_data_id} {self.store.block_set}, "
+                    f"{len(self._entries)} 个区块, {self.block_count} 个方块")
+
+        if publish:
+            self.publish()
+
+    def publish(self):
+        """用临时目录（方块存储及其中已生成的派生产物）替换正式目录"""
+        if self.staging_path:
+            replace_directory(self.staging_path, self.store.path)
+        self.store._index = self.staged_store._index
+
+    def abort(self):
+        """放弃写入，正式目录保持不变"""
+        if not self._file.closed:
+            self._file.close()
+        if self.staging_path:
+            shutil.rmtree(self.staging_path, ignore_errors=True)
+        elif os.path.exists(self._tmp_blocks):
+            os.remove(self._tmp_blocks)
@@ -0,0 +1,148 @@
+"""
+地图缓存预热服务
+解析完成后预先计算地图详情、方块数据、统计信息、导出用的Three.js数据，
+以及查看器读取的二进制方块产物和瓦片网格，让第一个打开地图的用户直接命中缓存
+"""
+
+import logging
+import time
+from typing import Dict, List
+
+from flask import current_app
+
+from app.models.map_data import MapData
+from app.services.block_store import BlockStore
+from app.services.block_codec import ensure_binary_artifact
+from app.services.mca_parser import MCAParser
+from app.services import map_shell
+from app.services import map_tiles
+from app.services import mesher
+from app.utils.cache import cache_manager
+
+logger = logging.getLogger(__name__)
+
+# 统计信息缓存时间（秒），解析或标注变化时按标签失效
+MAP_STATS_EXPIRE = 3600
+
+
+def map_stats_cache_key(map_id: int) -> str:
+    """地图统计信息的缓存键"""
+    return f"map_stats:{map_id}"
+
+
+def load_map_stats(map_id: int) -> Dict:
+    """读取地图统计信息，未命中时计算并写入缓存"""
+    cache_key = map_stats_cache_key(map_id)
+    stats = cache_manager.get(cache_key)
+    if stats is None:
+        stats = MCAParser().get_map_stats(map_id)
+        cache_manager.set(cache_key, stats, MAP_STATS_EXPIRE, tags=[f"map:{map_id}"])
+    return stats
+
+
+class CacheWarmer:
+    """地图缓存预热器"""
+
+    # 需要预热的视图：(端点名, URL模板, 查询参数变体)
+    # 不带 lod 的方块数据直接拼接磁盘上的Three.js文件（RawJSON），不进缓存，由第1步预热
+    VIEW_TARGETS = [
+        ('api.get_map_detail', '/api/maps/{map_id}', [{}]),
+        ('api.get_map_blocks', '/api/maps/{map_id}/blocks', [{'lod': '4'}, {'lod': '8'}]),
+    ]
+
+    def __init__(self, app=None):
+        self.app = app or current_app._get_current_object()
+
+    def warm(self, map_id: int) -> Dict:
+        """预热单个地图的所有缓存层"""
+        start_time = time.time()
+        map_data = MapData.query.get(map_id)
+        if not map_data or not map_data.is_parsed:
+            return {'success': False, 'error': f'地图 {map_id} 不存在或尚未解析'}
+
+        warmed: List[str] = []
+        errors: List[str] = []
+
+        # 1. 导出和查看器读取的Three.js数据文件
+        threejs_result = MCAParser().generate_threejs_data(
+            map_data.file_path, map_id,
+            output_dir=self.app.config.get('MODEL_CACHE_DIR', 'models_cache')
+        )
+        if threejs_result.get('success'):
+            warmed.append('threejs_data')
+        else:
+            errors.append(f"threejs_data: {threejs_result.get('error')}")
+
+        # 2. 统计信息
+        try:
+            cache_manager.delete(map_stats_cache_key(map_id))
+            load_map_stats(map_id)
+            warmed.append('stats')
+        except Exception as e:
+            errors.append(f"stats: {e}")
+
+        # 3. API视图缓存（地图详情、各变体的方块数据）
+        for endpoint, url_template, variants in self.VIEW_TARGETS:
+            for query in variants:
+                name = f"{endpoint}{'?' + str(query) if query else ''}"
+                try:
+                    self._warm_view(endpoint, url_template.format(map_id=map_id), query, map_id=map_id)
+                    warmed.append(name)
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+
+        # 4. 查看器直接读取的磁盘产物（二进制方块数据、瓦片网格）
+        store = BlockStore(map_id)
+        if store.exists():
+            self._warm_artifacts(store, warmed, errors)
+
+        duration = time.time() - start_time
+        logger.info(f"地图 {map_id} 缓存预热完成: {len(warmed)} 项成功, {len(errors)} 项失败, 耗时 {duration:.2f}s")
+
+        return {
+            'success': not errors,
+            'map_data_id': map_id,
+            'warmed': warmed,
+            'errors': errors,
+            'duration': duration
+        }
+
+    def _warm_view(self, endpoint: str, path: str, query: Dict, **view_args):
+        """在模拟请求上下文中调用视图的缓存层"""
+        view = self.app.view_functions[endpoint]
+        cached_view = getattr(view, 'cached_view', None)
+        if cached_view is None:
+            raise ValueError(f"视图 {endpoint} 未使用 cache_result")
+
+        with self.app.test_request_context(path, query_string=query):
+            result = cached_view(**view_args)
+
+        # 错误响应不会写入缓存，不能算作已预热
+        if isinstance(result, tuple):
+            raise ValueError(f"视图返回状态码 {result[1]}，未写入缓存")
+
+    def _warm_artifacts(self, store: BlockStore, warmed: List[str], errors: List[str]):
+        """生成 blocks.bin / shell.bin 和各瓦片的网格，锁名与接口按需生成时一致"""
+        map_id = store.map_data_id
+        sources = [store]
+        shell = map_shell.shell_store(store)
+        if shell.exists():
+            sources.append(shell)
+
+        for source in sources:
+            name = map_shell.binary_artifact_name(source)
+            try:
+                with cache_manager.lock(f"artifact:{map_id}:{name}", timeout=300, blocking_timeout=300):
+                    ensure_binary_artifact(source, name)
+                warmed.append(name)
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+
+        try:
+            with cache_manager.lock(f"artifact:{map_id}:tiles", timeout=300, blocking_timeout=300):
+                manifest = map_tiles.ensure_tiles(store)
+            for tile in manifest['tiles']:
+                mesher.ensure_tile_mesh(store, tile['tx'], tile['tz'], manifest['tile_size'])
+            warmed.append(f"tile_meshes ({len(manifest['tiles'])})")
+        except Exception as e:
+            errors.append(f"tile_meshes: {e}")
@@ -0,0 +1,204 @@
+"""
+地图细节层次（LOD）金字塔
+
+解析完成后按 1x、2x、4x、8x 对方块存储降采样：每级把 factor x factor x factor 个
+采样格合并为一个单元，单元内出现最多的方块类型作为该单元的方块，坐标取单元最小角。
+各级以 block_codec 二进制格式分别保存在 ``map_{id}/lod/lod_{factor}.bin``，
+1x 即完整数据，直接复用 ``blocks.bin``。``lod/index.json`` 记录每级的单元尺寸和方块数量。
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.block_codec import decode_blocks, encode_arrays, ensure_binary_artifact
+from app.services.block_store import replace_directory
+
+try:
+    from config.mca_parser_config import MCAParserConfig
+    LOD_FACTORS = MCAParserConfig.LOD_FACTORS
+except (ImportError, AttributeError):
+    LOD_FACTORS = (1, 2, 4, 8)
+
+logger = logging.getLogger(__name__)
+
+LOD_DIR = 'lod'
+INDEX_FILE = 'index.json'
+
+
+def level_filename(factor: int) -> str:
+    return f"lod_{factor}.bin"
+
+
+def level_path(store, factor: int) -> str:
+    """某一级数据的路径，1x 为完整的 blocks.bin"""
+    if factor == 1:
+        return store.artifact_path('blocks.bin')
+    return store.artifact_path(LOD_DIR, level_filename(factor))
+
+
+def index_path(store) -> str:
+    return store.artifact_path(LOD_DIR, INDEX_FILE)
+
+
+def load_block_arrays(store) -> Tuple[np.ndarray, np.ndarray, List[Tuple[str, int]]]:
+    """把方块存储读为 (坐标数组, 调色板下标数组, 调色板)"""
+    palette_index: Dict[str, int] = {}
+    palette: List[Tuple[str, int]] = []
+    coords: List[int] = []
+    types: List[int] = []
+
+    for block in store.iter_blocks():
+        block_type = block['block_type']
+        index = palette_index.get(block_type)
+        if index is None:
+            index = palette_index[block_type] = len(palette)
+            palette.append((block_type, block.get('block_id', 0) or 0))
+        types.append(index)
+        coords.extend((block['x'], block['y'], block['z']))
+
+    positions = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    return positions, np.asarray(types, dtype=np.int64), palette
+
+
+def downsample(positions: np.ndarray, types: np.ndarray, cell_size) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按单元取多数方块降采样
+
+    单元网格以世界坐标0为基准对齐，不同地图、不同瓦片之间的单元边界一致。
+    票数相同时取调色板下标较大的类型，保证结果确定。
+    """
+    if not len(types):
+        return positions, types
+
+    cell_size = np.asarray(cell_size, dtype=np.int64)
+    cells = np.floor_divide(positions, cell_size)
+
+    # 每个单元编号，再统计 (单元, 类型) 的出现次数
+    unique_cells, cell_ids = np.unique(cells, axis=0, return_inverse=True)
+    cell_ids = cell_ids.reshape(-1)
+    type_count = int(types.max()) + 1
+    pairs, votes = np.unique(cell_ids * type_count + types, return_counts=True)
+    pair_cells = pairs // type_count
+    pair_types = pairs % type_count
+
+    # 按 (单元, 票数) 排序后每个单元的最后一项即多数类型
+    order = np.lexsort((pair_types, votes, pair_cells))
+    last_of_cell = np.r_[pair_cells[order][1:] != pair_cells[order][:-1], True]
+    winners = order[last_of_cell]
+
+    return unique_cells[pair_cells[winners]] * cell_size, pair_types[winners]
+
+
+def _compact_palette(types: np.ndarray, palette: List[Tuple[str, int]]):
+    """去掉降采样后不再出现的类型"""
+    used = np.unique(types)
+    remap = np.zeros(len(palette), dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return remap[types], [palette[i] for i in used]
+
+
+def build_lod_pyramid(store, factors=LOD_FACTORS) -> Dict:
+    """
+    生成LOD各级数据和索引
+
+    先写入临时目录，完成后替换正式目录。
+    """
+    meta = store.meta
+    step = [meta.get('sample_rate', 1), meta.get('height_sample_rate', 1), meta.get('sample_rate', 1)]
+
+    ensure_binary_artifact(store)
+    positions, types, palette = load_block_arrays(store)
+
+    # 每次生成使用独立的临时目录，并发生成时互不影响
+    lod_dir = store.artifact_path(LOD_DIR)
+    tmp_dir = tempfile.mkdtemp(dir=store.path, prefix=f"{LOD_DIR}.", suffix='.partial')
+
+    try:
+        levels = []
+        for factor in sorted(factors):
+            cell_size = [axis_step * factor for axis_step in step]
+
+            if factor == 1:
+                block_count = len(types)
+                size = os.path.getsize(level_path(store, 1))
+            else:
+                level_positions, level_types = downsample(positions, types, cell_size)
+                level_types, level_palette = _compact_palette(level_types, palette)
+                data = encode_arrays(level_positions, level_types, level_palette)
+                with open(os.path.join(tmp_dir, level_filename(factor)), 'wb') as f:
+                    f.write(data)
+                block_count = len(level_types)
+                size = len(data)
+
+            levels.append({'factor': factor, 'cell_size': cell_size, 'block_count': block_count, 'size': size})
+
+        index = {'levels': levels}
+        with open(os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+
+        replace_directory(tmp_dir, lod_dir)
+
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"LOD金字塔生成完成: map_{store.map_data_id}, " +
+                ", ".join(f"{level['factor']}x={level['block_count']}" for level in levels))
+    return index
+
+
+def load_lod_index(store) -> Optional[Dict]:
+    """读取LOD索引，尚未生成时返回None"""
+    path = index_path(store)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ensure_lod_pyramid(store) -> Dict:
+    """确保LOD金字塔已生成（兼容后处理阶段之前解析的地图），返回索引"""
+    index = load_lod_index(store)
+    if index is None:
+        index = build_lod_pyramid(store)
+    return index
+
+
+def find_level(index: Dict, factor: int) -> Optional[Dict]:
+    for level in index.get('levels', []):
+        if level['factor'] == factor:
+            return level
+    return None
+
+
+def select_level(index: Dict, max_blocks: int) -> Dict:
+    """选择方块数不超过上限的最精细一级，都超过时返回最粗的一级"""
+    levels = sorted(index['levels'], key=lambda level: level['factor'])
+    for level in levels:
+        if level['block_count'] <= max_blocks:
+            return level
+    return levels[-1]
+
+
+def read_level_blocks(store, factor: int) -> List[Dict]:
+    """解码某一级数据为方块字典列表"""
+    with open(level_path(store, factor), 'rb') as f:
+        decoded = decode_blocks(f.read())
+
+    blocks = []
+    for entry in decoded['palette']:
+        for x, y, z in entry['positions'].tolist():
+            blocks.append({
+                'x': x,
+                'y': y,
+                'z': z,
+                'block_type': entry['block_type'],
+                'block_id': entry['block_id']
+            })
+    return blocks
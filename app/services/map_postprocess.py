@@ -0,0 +1,48 @@
+"""
+地图解析后处理
+
+方块存储写入完成后依次生成派生产物（二进制方块数据、外表面集合、分块瓦片、LOD金字塔、方块计数前缀和等），
+产物与方块存储位于同一地图目录，重新解析时一并清空。
+单个阶段失败只记录日志，不影响解析结果，缺失的产物由接口按需补生成。
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.services.block_codec import ensure_binary_artifact
+from app.services.block_store import BlockStore
+from app.services.map_shell import build_shell, ensure_shell_binary
+from app.services.map_tiles import build_tiles
+from app.services.map_lod import build_lod_pyramid
+from app.services.volume_counts import build_volume_counts
+
+logger = logging.getLogger(__name__)
+
+# (阶段名, 处理函数)，按顺序执行，处理函数接收 BlockStore
+POST_PARSE_STAGES: List[Tuple[str, Callable[[BlockStore], object]]] = [
+    ('blocks.bin', ensure_binary_artifact),
+    ('shell', build_shell),
+    ('shell.bin', ensure_shell_binary),
+    ('tiles', build_tiles),
+    ('lod', build_lod_pyramid),
+    ('volume_counts', build_volume_counts),
+]
+
+
+def run_post_parse_stages(store: BlockStore) -> Dict:
+    """执行所有后处理阶段，返回 {'completed': [...], 'failed': {阶段名: 错误}}"""
+    completed = []
+    failed = {}
+
+    for name, stage in POST_PARSE_STAGES:
+        start_time = time.time()
+        try:
+            stage(store)
+            completed.append(name)
+            logger.info(f"后处理阶段完成: map_{store.map_data_id} {name}, 耗时 {time.time() - start_time:.2f}s")
+        except Exception as e:
+            failed[name] = str(e)
+            logger.error(f"后处理阶段失败: map_{store.map_data_id} {name}: {e}")
+
+    return {'completed': completed, 'failed': failed}
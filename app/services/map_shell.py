@@ -0,0 +1,105 @@
+"""
+地图外表面（shell）提取
+
+逐区块构建带邻居边框的体素网格，用三维错位比较找出至少有一个面朝向空气或透明方块的方块，
+结果作为单独的 ``shell`` 方块集合写入同一地图目录。
+内部方块永远不可见，查看器和预览接口默认使用 shell 集合，需要完整数据时再读取完整集合。
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict
+
+import numpy as np
+
+from app.services.block_codec import ensure_binary_artifact
+from app.services.block_store import BlockStore
+from app.services.voxel_grid import block_cells, build_chunk_grid, grid_shape
+
+logger = logging.getLogger(__name__)
+
+SHELL_SET = 'shell'
+
+# 接口 blocks 参数可选的方块集合
+BLOCK_SET_SHELL = 'shell'
+BLOCK_SET_ALL = 'all'
+
+
+def shell_store(store: BlockStore) -> BlockStore:
+    return store.sibling(SHELL_SET)
+
+
+def preview_store(store: BlockStore, block_set: str = BLOCK_SET_SHELL) -> BlockStore:
+    """查看器和预览使用的方块集合：默认 shell，尚未生成 shell 时退回完整集合"""
+    if block_set == BLOCK_SET_ALL:
+        return store
+    shell = shell_store(store)
+    return shell if shell.exists() else store
+
+
+def binary_artifact_name(source: BlockStore) -> str:
+    """方块集合对应的二进制产物文件名：blocks.bin / shell.bin"""
+    return f"{source.block_set}.bin"
+
+
+def ensure_shell_binary(store: BlockStore) -> str:
+    """生成 shell 集合的二进制产物"""
+    shell = shell_store(store)
+    return ensure_binary_artifact(shell, binary_artifact_name(shell))
+
+
+def build_shell(store: BlockStore) -> Dict:
+    """
+    生成 shell 方块集合，返回其元信息
+
+    区块按 (cx, cz) 顺序处理，只在内存中保留相邻三列区块。
+    """
+    meta = store.meta
+    step, _, min_height = grid_shape(meta)
+
+    columns = defaultdict(list)
+    for chunk_x, chunk_z, _, _, _ in store.chunk_entries():
+        columns[chunk_x].append((chunk_x, chunk_z))
+
+    loaded = {}
+    loaded_columns = set()
+
+    def load_column(chunk_x):
+        if chunk_x in columns and chunk_x not in loaded_columns:
+            for cx, cz, blocks in store.iter_chunks(columns[chunk_x]):
+                loaded[(cx, cz)] = blocks
+            loaded_columns.add(chunk_x)
+
+    writer = shell_store(store).open_writer(reset=False)
+    try:
+        for chunk_x in sorted(columns):
+            for column in (chunk_x - 1, chunk_x, chunk_x + 1):
+                load_column(column)
+            for key in [key for key in loaded if key[0] < chunk_x - 1]:
+                del loaded[key]
+
+            for _, chunk_z in columns[chunk_x]:
+                blocks = loaded[(chunk_x, chunk_z)]
+                grid = build_chunk_grid(meta, chunk_x, chunk_z, loaded)
+                exposed = grid.exposed_mask()
+
+                # 超出网格高度范围的方块无法判断，保守地保留
+                cells = block_cells(blocks, chunk_x, chunk_z, step, min_height) - 1
+                inside = np.all((cells >= 0) & (cells < np.asarray(exposed.shape)), axis=1)
+                keep = ~inside
+                keep[inside] = exposed[cells[inside, 0], cells[inside, 1], cells[inside, 2]]
+
+                writer.write_chunk(chunk_x, chunk_z, [block for block, kept in zip(blocks, keep) if kept])
+
+        full_count = meta.get('block_count', 0)
+        writer.finalize(meta=dict(meta, source_block_count=full_count))
+
+    except Exception:
+        writer.abort()
+        raise
+
+    shell_meta = shell_store(store).meta
+    ratio = shell_meta['block_count'] / full_count if full_count else 0
+    logger.info(f"外表面提取完成: map_{store.map_data_id}, "
+                f"{shell_meta['block_count']}/{full_count} 个方块 ({ratio:.1%})")
+    return shell_meta
@@ -0,0 +1,141 @@
+"""
+地图分块瓦片服务
+
+解析完成后把方块存储按 TILE_SIZE x TILE_SIZE 个区块切分为瓦片，
+每个瓦片编码为 block_codec 二进制格式，写入 ``map_{id}/tiles/<tx>_<tz>.bin``。
+``tiles/manifest.json`` 记录每个瓦片的坐标、包围盒、方块数量和内容哈希（ETag），
+查看器先读取清单，再按与相机的距离逐个加载瓦片。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from typing import Dict, Optional
+
+from app.services.block_codec import encode_blocks
+from app.services.block_store import replace_directory
+from app.services.map_shell import preview_store
+
+logger = logging.getLogger(__name__)
+
+# 每个瓦片的边长（区块数）
+TILE_SIZE = 4
+CHUNK_SIZE = 16
+
+TILES_DIR = 'tiles'
+MANIFEST_FILE = 'manifest.json'
+
+
+def tile_coords(chunk_x: int, chunk_z: int, tile_size: int = TILE_SIZE):
+    """区块坐标所属的瓦片坐标"""
+    return chunk_x // tile_size, chunk_z // tile_size
+
+
+def tile_filename(tile_x: int, tile_z: int) -> str:
+    return f"{tile_x}_{tile_z}.bin"
+
+
+def tile_path(store, tile_x: int, tile_z: int) -> str:
+    return store.artifact_path(TILES_DIR, tile_filename(tile_x, tile_z))
+
+
+def manifest_path(store) -> str:
+    return store.artifact_path(TILES_DIR, MANIFEST_FILE)
+
+
+def build_tiles(store, tile_size: int = TILE_SIZE) -> Dict:
+    """
+    从方块存储生成全部瓦片和清单
+
+    瓦片使用查看器默认的方块集合（有 shell 时只含外表面方块）。
+    先写入临时目录，完成后替换正式目录，读取方不会看到写了一半的瓦片。
+    """
+    source = preview_store(store)
+    groups = defaultdict(list)
+    for chunk_x, chunk_z, _, _, _ in source.chunk_entries():
+        groups[tile_coords(chunk_x, chunk_z, tile_size)].append((chunk_x, chunk_z))
+
+    # 每次生成使用独立的临时目录，并发生成时互不影响
+    tiles_dir = store.artifact_path(TILES_DIR)
+    tmp_dir = tempfile.mkdtemp(dir=store.path, prefix=f"{TILES_DIR}.", suffix='.partial')
+
+    tiles = []
+    total_blocks = 0
+    overall_min = None
+    overall_max = None
+
+    try:
+        for (tile_x, tile_z), chunks in sorted(groups.items()):
+            blocks = [block for _, _, chunk_blocks in source.iter_chunks(chunks) for block in chunk_blocks]
+            if not blocks:
+                continue
+
+            data = encode_blocks(blocks)
+            with open(os.path.join(tmp_dir, tile_filename(tile_x, tile_z)), 'wb') as f:
+                f.write(data)
+
+            bounds_min = [min(block[axis] for block in blocks) for axis in ('x', 'y', 'z')]
+            bounds_max = [max(block[axis] for block in blocks) for axis in ('x', 'y', 'z')]
+            overall_min = bounds_min if overall_min is None else [min(a, b) for a, b in zip(overall_min, bounds_min)]
+            overall_max = bounds_max if overall_max is None else [max(a, b) for a, b in zip(overall_max, bounds_max)]
+
+            tiles.append({
+                'tx': tile_x,
+                'tz': tile_z,
+                'chunk_count': len(chunks),
+                'block_count': len(blocks),
+                'bounds': {'min': bounds_min, 'max': bounds_max},
+                'size': len(data),
+                'etag': hashlib.sha1(data).hexdigest()
+            })
+            total_blocks += len(blocks)
+
+        manifest = {
+            'tile_size': tile_size,
+            'chunk_size': CHUNK_SIZE,
+            'block_set': source.block_set,
+            'tile_count': len(tiles),
+            'block_count': total_blocks,
+            'bounds': {'min': overall_min, 'max': overall_max} if tiles else None,
+            'tiles': tiles
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+
+        replace_directory(tmp_dir, tiles_dir)
+
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"瓦片生成完成: map_{store.map_data_id}, {len(tiles)} 个瓦片, {total_blocks} 个方块")
+    return manifest
+
+
+def load_manifest(store) -> Optional[Dict]:
+    """读取瓦片清单，尚未生成时返回None"""
+    path = manifest_path(store)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ensure_tiles(store) -> Dict:
+    """确保瓦片已生成（兼容后处理阶段之前解析的地图），返回清单"""
+    manifest = load_manifest(store)
+    if manifest is None:
+        manifest = build_tiles(store)
+    return manifest
+
+
+def find_tile(manifest: Dict, tile_x: int, tile_z: int) -> Optional[Dict]:
+    """在清单中查找瓦片条目"""
+    for tile in manifest.get('tiles', []):
+        if tile['tx'] == tile_x and tile['tz'] == tile_z:
+            return tile
+    return None
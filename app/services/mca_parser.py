@@ -13,6 +13,10 @@ from collections import Counter
 from dataclasses import dataclass
 import time
 from mca import Region
+from app.services.block_store import BlockStore
+from app.services.map_postprocess import run_post_parse_stages
+from app.services import map_lod
+from app.services import map_shell
 
 # 导入配置
 try:
@@ -30,6 +34,8 @@ except ImportError:
         SKIP_AIR_BLOCKS = True
         MAX_BLOCKS_PER_CHUNK = 1000
         PREVIEW_BLOCK_LIMIT = 1000
+        LOD_FACTORS = (1, 2, 4, 8)
+        THREEJS_BLOCK_LIMIT = 50000
         COMPATIBILITY_CHUNK_STEP = 4
         COMPATIBILITY_BLOCK_STEP = 8
 
@@ -137,6 +143,7 @@ class MCAParser:
         self.max_height = config.get('max_height', MCAParserConfig.MAX_HEIGHT)
         self.skip_air_blocks = config.get('skip_air_blocks', MCAParserConfig.SKIP_AIR_BLOCKS)
         self.max_blocks_per_chunk = config.get('max_blocks_per_chunk', MCAParserConfig.MAX_BLOCKS_PER_CHUNK)
+        self.threejs_block_limit = config.get('threejs_block_limit', MCAParserConfig.THREEJS_BLOCK_LIMIT)
 
         # 创建内存缓冲区
         buffer_size = config.get('memory_buffer_size', MCAParserConfig.MEMORY_BUFFER_SIZE)
@@ -170,6 +177,7 @@ class MCAParser:
         """
         多线程解析MCA文件
         """
+        store_writer = None
         try:
             logger.info(f"开始多线程解析MCA文件: {file_path}")
             start_time = time.time()
@@ -197,6 +205,9 @@ class MCAParser:
             total_block_types = Counter()
             processed_chunks = 0
 
+            # 按区块写入方块存储，供流式接口和后处理阶段使用
+            store_writer = BlockStore(map_data_id).open_writer()
+
             with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 # 提交所有批处理任务
                 future_to_batch = {
@@ -211,6 +222,9 @@ class MCAParser:
                         if batch_result:
                             processed_chunks += len(batch_result.get('chunks', []))
 
+                            for chunk_x, chunk_z, chunk_blocks in batch_result.get('chunk_blocks', []):
+                                store_writer.write_chunk(chunk_x, chunk_z, chunk_blocks)
+
                             # 将数据添加到内存缓冲区
                             batch_blocks = batch_result.get('blocks', [])
                             buffer_data = self.memory_buffer.add_blocks(batch_blocks)
@@ -237,6 +251,17 @@ class MCAParser:
             if remaining_data:
                 self._write_to_cache_async(map_data_id, remaining_data)
 
+            store_writer.finalize(meta={
+                'sample_rate': self.sample_rate,
+                'height_sample_rate': self.height_sample_rate,
+                'min_height': self.min_height,
+                'max_height': self.max_height
+            }, publish=False)
+
+            # 在临时目录中由方块存储生成二进制数据、瓦片等派生产物，再连同方块存储一起替换正式目录
+            post_parse = run_post_parse_stages(store_writer.staged_store)
+            store_writer.publish()
+
             # 生成Three.js数据
             threejs_result = self._generate_threejs_data_async(map_data_id)
 
@@ -250,11 +275,14 @@ class MCAParser:
                 'block_types': dict(total_block_types),
                 'blocks': all_blocks[:1000],  # 只返回前1000个用于预览
                 'threejs_success': threejs_result.get('success', False),
+                'artifacts': post_parse['completed'],
                 'processing_time': end_time - start_time
             }
 
         except Exception as e:
             logger.error(f"MCA文件解析失败: {file_path}, 错误: {str(e)}")
+            if store_writer is not None:
+                store_writer.abort()
             return {
                 'success': False,
                 'error': str(e),
@@ -296,6 +324,7 @@ class MCAParser:
             batch_blocks = []
             batch_block_types = Counter()
             processed_chunks = []
+            chunk_blocks_list = []
 
             for chunk_x, chunk_z in chunk_coords:
                 try:
@@ -309,6 +338,7 @@ class MCAParser:
                     if chunk_blocks:
                         batch_blocks.extend(chunk_blocks)
                         processed_chunks.append((chunk_x, chunk_z))
+                        chunk_blocks_list.append((chunk_x, chunk_z, chunk_blocks))
 
                         # 统计方块类型
                         for block in chunk_blocks:
@@ -321,6 +351,7 @@ class MCAParser:
 
             return {
                 'chunks': processed_chunks,
+                'chunk_blocks': chunk_blocks_list,
                 'blocks': batch_blocks,
                 'block_types': dict(batch_block_types)
             }
@@ -545,40 +576,98 @@ class MCAParser:
             logger.error(f"保存��存失败: {str(e)}")
             return False
 
-    def generate_threejs_data(self, file_path: str, map_data_id: int) -> Dict:
-        """生成Three.js格式数据（简化版本）"""
-        try:
-            cache_file = os.path.join('instance', 'cache', f'map_{map_data_id}_blocks.json')
-
-            if not os.path.exists(cache_file):
-                return {'success': False, 'error': 'Cache file not found'}
-
-            # 读取缓存数据
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                blocks_data = json.load(f)
+    def generate_threejs_data(self, file_path: str, map_data_id: int,
+                              output_dir: str = 'models_cache') -> Dict:
+        """
+        生成Three.js格式数据（简化版本），写入查看器和OBJ导出读取的 threejs_data_{id}.json
 
-            # 简化的Three.js数据生成
+        方块数量受 THREEJS_BLOCK_LIMIT 限制：外表面集合不超过上限时直接使用，
+        否则选择不超过上限的最精细LOD级别，覆盖整张地图；只有旧版缓存文件时按固定步长均匀抽样。
+        """
+        try:
             threejs_data = {
                 'geometries': [],
-                'materials': [],
+                'materials': {},
                 'blocks': []
             }
 
-            # 只处理前1000个方块以避免内存问题
-            for block in blocks_data[:1000]:
-                threejs_data['blocks'].append({
-                    'position': [block['x'], block['y'], block['z']],
-                    'type': block['block_type'],
-                    'id': block['block_id']
-                })
-
-            # 保存Three.js数据
-            threejs_cache_file = os.path.join('instance', 'cache', f'map_{map_data_id}_threejs.json')
-            with open(threejs_cache_file, 'w', encoding='utf-8') as f:
+            store = BlockStore(map_data_id)
+            shell = map_shell.shell_store(store)
+            if shell.exists() and shell.meta.get('block_count', 0) <= self.threejs_block_limit:
+                threejs_data['blocks'] = [
+                    {key: block[key] for key in ('x', 'y', 'z', 'block_type', 'block_id')}
+                    for block in shell.iter_blocks()
+                ]
+                threejs_data['block_set'] = shell.block_set
+            elif store.exists():
+                level = map_lod.select_level(map_lod.ensure_lod_pyramid(store), self.threejs_block_limit)
+                threejs_data['blocks'] = map_lod.read_level_blocks(store, level['factor'])
+                threejs_data['lod'] = level
+            else:
+                cache_file = os.path.join('instance', 'cache', f'map_{map_data_id}_blocks.json')
+
+                if not os.path.exists(cache_file):
+                    return {'success': False, 'error': 'Cache file not found'}
+
+                # 读取缓存数据
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    blocks_data = json.load(f)
+
+                step = max(1, -(-len(blocks_data) // self.threejs_block_limit))
+                for block in blocks_data[::step]:
+                    threejs_data['blocks'].append({
+                        'x': block['x'],
+                        'y': block['y'],
+                        'z': block['z'],
+                        'block_type': block['block_type'],
+                        'block_id': block['block_id']
+                    })
+
+            # 保存Three.js数据（先写临时文件再替换，避免读到半截文件）
+            os.makedirs(output_dir, exist_ok=True)
+            threejs_cache_file = os.path.join(output_dir, f'threejs_data_{map_data_id}.json')
+            tmp_file = f"{threejs_cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(threejs_data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_file, threejs_cache_file)
 
             return {'success': True, 'data': threejs_data}
 
         except Exception as e:
             logger.error(f"生成Three.js数据失败: {str(e)}")
             return {'success': False, 'error': str(e)}
+
+    def get_map_stats(self, map_data_id: int) -> Dict:
+        """根据解析缓存计算地图统计信息"""
+        cache_file = os.path.join('instance', 'cache', f'map_{map_data_id}_blocks.json')
+
+        if not os.path.exists(cache_file):
+            raise FileNotFoundError(f"解析缓存不存在: {cache_file}")
+
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            blocks_data = json.load(f)
+
+        block_types = Counter()
+        height_distribution = Counter()
+        min_coords = [None, None, None]
+        max_coords = [None, None, None]
+
+        for block in blocks_data:
+            block_types[block['block_type']] += 1
+            height_distribution[block['y']] += 1
+            for axis, value in enumerate((block['x'], block['y'], block['z'])):
+                if min_coords[axis] is None or value < min_coords[axis]:
+                    min_coords[axis] = value
+                if max_coords[axis] is None or value > max_coords[axis]:
+                    max_coords[axis] = value
+
+        return {
+            'block_count': len(blocks_data),
+            'unique_block_types': len(block_types),
+            'block_types': dict(block_types.most_common()),
+            'height_distribution': {str(y): count for y, count in sorted(height_distribution.items())},
+            'bounds': {
+                'min': min_coords,
+                'max': max_coords
+            }
+        }
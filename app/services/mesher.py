@@ -0,0 +1,291 @@
+"""
+贪心网格化服务
+
+从方块存储读取区块（含相邻区块的边界），只为朝向空气或透明方块的面生成四边形，
+并把同一平面上相邻的同材质面合并为尽可能大的矩形（greedy meshing）。
+每个体素是一个采样格，世界尺寸为采样步长，因此网格覆盖整个区域而不是一个个小方块。
+
+网格以二进制格式缓存在 ``map_{id}/meshes/``，重新解析时随方块存储一起清空。
+格式（小端序）::
+
+    头部（16字节）
+      0   char[4]  magic          固定为 b'CNEM'
+      4   uint16   version        当前为 1
+      6   uint16   material_count 材质数量
+      8   uint32   vertex_count   顶点数（每个四边形4个）
+      12  uint32   index_count    索引数（每个四边形6个）
+
+    材质表（material_count 项）
+      uint16   name_length
+      uint8[]  name          UTF-8 方块名
+      uint16   block_id
+      uint32   index_start   该材质在索引数组中的起始位置
+      uint32   index_count   该材质的索引数量
+      整个材质表末尾补零对齐到4字节
+
+    Float32[vertex_count * 3]  顶点坐标（世界坐标）
+    Int8[vertex_count * 3]     法线，末尾补零对齐到4字节
+    Uint16[vertex_count]       顶点材质下标，末尾补零对齐到4字节
+    Uint32[index_count]        三角形索引，按材质分段连续排列
+"""
+
+import os
+import struct
+import tempfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.voxel_grid import load_chunk_grid
+
+MAGIC = b'CNEM'
+VERSION = 1
+HEADER_FORMAT = '<4sHHII'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CONTENT_TYPE = 'application/octet-stream'
+
+MESHES_DIR = 'meshes'
+
+# 每个四边形两个三角形的顶点顺序
+QUAD_INDICES = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+
+
+def _pad4(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def _greedy_rectangles(mask: np.ndarray) -> List[Tuple[int, int, int, int, int]]:
+    """在二维材质掩码上合并相同材质的矩形，返回 [(i, j, h, w, material)]"""
+    mask = mask.copy()
+    rows, cols = mask.shape
+    rects = []
+
+    for i, j in zip(*np.nonzero(mask)):
+        material = mask[i, j]
+        if material == 0:
+            continue
+
+        width = 1
+        while j + width < cols and mask[i, j + width] == material:
+            width += 1
+
+        height = 1
+        while i + height < rows and np.all(mask[i + height, j:j + width] == material):
+            height += 1
+
+        mask[i:i + height, j:j + width] = 0
+        rects.append((int(i), int(j), height, width, int(material)))
+
+    return rects
+
+
+def mesh_chunk(store, chunk_x: int, chunk_z: int) -> Dict:
+    """
+    对单个区块做贪心网格化
+
+    Returns:
+        {'positions': (Q, 4, 3) float32, 'normals': (Q, 3) int8, 'materials': (Q,) 材质下标,
+         'palette': [(方块名, 数值ID), ...]}
+    """
+    grid = load_chunk_grid(store, chunk_x, chunk_z)
+    types = grid.types
+    opaque = grid.opaque_mask()
+    inner = types[grid.inner]
+    size = inner.shape
+    origin = np.asarray(grid.origin, dtype=np.float32)
+    step = np.asarray(grid.step, dtype=np.float32)
+
+    quads = []
+    normals = []
+    materials = []
+
+    for axis in range(3):
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+        for direction in (1, -1):
+            # 相邻体素：沿 axis 平移一格，其余两轴取内部
+            shifted = [slice(1, -1)] * 3
+            shifted[axis] = slice(1 + direction, size[axis] + 1 + direction)
+            neighbour = types[tuple(shifted)]
+            neighbour_opaque = opaque[tuple(shifted)]
+
+            # 邻居不是不透明方块、且不是同种（透明）方块时该面可见
+            visible = (inner > 0) & ~neighbour_opaque & (inner != neighbour)
+            faces = np.transpose(np.where(visible, inner, 0), (axis, u, v))
+
+            normal = [0, 0, 0]
+            normal[axis] = direction
+
+            for layer in np.nonzero(faces.reshape(size[axis], -1).any(axis=1))[0]:
+                plane = layer + (1 if direction > 0 else 0)
+                for i, j, height, width, material in _greedy_rectangles(faces[layer]):
+                    corners = np.zeros((4, 3), dtype=np.float32)
+                    corners[:, axis] = plane
+                    if direction > 0:
+                        corners[:, u] = (i, i + height, i + height, i)
+                        corners[:, v] = (j, j, j + width, j + width)
+                    else:
+                        corners[:, u] = (i, i, i + height, i + height)
+                        corners[:, v] = (j, j + width, j + width, j)
+                    quads.append(origin + corners * step)
+                    normals.append(normal)
+                    materials.append(material - 1)
+
+    return {
+        'positions': np.asarray(quads, dtype=np.float32).reshape(-1, 4, 3),
+        'normals': np.asarray(normals, dtype=np.int8).reshape(-1, 3),
+        'materials': np.asarray(materials, dtype=np.int64),
+        'palette': grid.palette
+    }
+
+
+def merge_meshes(meshes: List[Dict]) -> Dict:
+    """合并多个网格，材质按方块名统一编号"""
+    palette_index: Dict[str, int] = {}
+    palette: List[Tuple[str, int]] = []
+    positions, normals, materials = [], [], []
+
+    for mesh in meshes:
+        remap = []
+        for name, block_id in mesh['palette']:
+            if name not in palette_index:
+                palette_index[name] = len(palette)
+                palette.append((name, block_id))
+            remap.append(palette_index[name])
+
+        positions.append(mesh['positions'])
+        normals.append(mesh['normals'])
+        materials.append(np.asarray(remap, dtype=np.int64)[mesh['materials']] if remap else mesh['materials'])
+
+    if not meshes:
+        return {'positions': np.zeros((0, 4, 3), dtype=np.float32), 'normals': np.zeros((0, 3), dtype=np.int8),
+                'materials': np.zeros(0, dtype=np.int64), 'palette': []}
+
+    return {
+        'positions': np.concatenate(positions),
+        'normals': np.concatenate(normals),
+        'materials': np.concatenate(materials),
+        'palette': palette
+    }
+
+
+def encode_mesh(mesh: Dict) -> bytes:
+    """编码网格，四边形按材质排序使每种材质的索引连续"""
+    palette = mesh['palette']
+    order = np.argsort(mesh['materials'], kind='stable')
+    quad_materials = mesh['materials'][order]
+    positions = mesh['positions'][order]
+    quad_count = len(quad_materials)
+
+    counts = np.bincount(quad_materials, minlength=len(palette)) if quad_count else np.zeros(len(palette), dtype=np.int64)
+    used = [index for index in range(len(palette)) if counts[index]]
+    remap = np.zeros(len(palette), dtype=np.uint16)
+    remap[used] = np.arange(len(used), dtype=np.uint16)
+
+    vertex_normals = np.repeat(mesh['normals'][order], 4, axis=0).astype('<i1')
+    vertex_materials = np.repeat(remap[quad_materials] if quad_count else quad_materials, 4).astype('<u2')
+    indices = (np.arange(quad_count, dtype=np.uint32)[:, None] * 4 + QUAD_INDICES).reshape(-1).astype('<u4')
+
+    parts = [struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(used), quad_count * 4, quad_count * 6)]
+
+    table = bytearray()
+    start = 0
+    for index in range(len(palette)):
+        if not counts[index]:
+            continue
+        name, block_id = palette[index]
+        encoded_name = name.encode('utf-8')
+        index_count = int(counts[index]) * 6
+        table += struct.pack('<H', len(encoded_name)) + encoded_name
+        table += struct.pack('<HII', block_id, start, index_count)
+        start += index_count
+    table += b'\0' * _pad4(len(table))
+    parts.append(bytes(table))
+
+    for array in (positions.reshape(-1, 3).astype('<f4'), vertex_normals, vertex_materials, indices):
+        data = array.tobytes()
+        parts.append(data + b'\0' * _pad4(len(data)))
+
+    return b''.join(parts)
+
+
+def decode_mesh(data: bytes) -> Dict:
+    """解码网格为 mesh_chunk 返回的结构"""
+    magic, version, material_count, vertex_count, index_count = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC:
+        raise ValueError('不是有效的CraftNE网格数据')
+    if version != VERSION:
+        raise ValueError(f'不支持的网格数据版本: {version}')
+
+    offset = HEADER_SIZE
+    palette = []
+    for _ in range(material_count):
+        (name_length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        block_id, _, _ = struct.unpack_from('<HII', data, offset)
+        offset += 10
+        palette.append((name, block_id))
+    offset += _pad4(offset - HEADER_SIZE)
+
+    positions = np.frombuffer(data, dtype='<f4', count=vertex_count * 3, offset=offset)
+    offset += vertex_count * 12
+    normals = np.frombuffer(data, dtype='<i1', count=vertex_count * 3, offset=offset)
+    offset += vertex_count * 3 + _pad4(vertex_count * 3)
+    materials = np.frombuffer(data, dtype='<u2', count=vertex_count, offset=offset)
+
+    return {
+        'positions': positions.reshape(-1, 4, 3).copy(),
+        'normals': normals.reshape(-1, 4, 3)[:, 0].copy(),
+        'materials': materials[::4].astype(np.int64),
+        'palette': palette
+    }
+
+
+def _write_atomic(path: str, data: bytes):
+    """写入临时文件后替换，并发生成同一网格时互不影响"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.partial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def chunk_mesh_path(store, chunk_x: int, chunk_z: int) -> str:
+    return store.artifact_path(MESHES_DIR, f"chunk_{chunk_x}_{chunk_z}.bin")
+
+
+def tile_mesh_path(store, tile_x: int, tile_z: int) -> str:
+    return store.artifact_path(MESHES_DIR, f"tile_{tile_x}_{tile_z}.bin")
+
+
+def ensure_chunk_mesh(store, chunk_x: int, chunk_z: int) -> str:
+    """返回区块网格缓存路径，不存在时生成"""
+    path = chunk_mesh_path(store, chunk_x, chunk_z)
+    if not os.path.exists(path):
+        _write_atomic(path, encode_mesh(mesh_chunk(store, chunk_x, chunk_z)))
+    return path
+
+
+def ensure_tile_mesh(store, tile_x: int, tile_z: int, tile_size: int) -> str:
+    """返回瓦片（tile_size x tile_size 个区块）网格缓存路径，由各区块网格合并生成"""
+    path = tile_mesh_path(store, tile_x, tile_z)
+    if os.path.exists(path):
+        return path
+
+    chunk_range_x = range(tile_x * tile_size, (tile_x + 1) * tile_size)
+    chunk_range_z = range(tile_z * tile_size, (tile_z + 1) * tile_size)
+    meshes = []
+    for chunk_x, chunk_z, _, _, _ in store.chunk_entries():
+        if chunk_x in chunk_range_x and chunk_z in chunk_range_z:
+            with open(ensure_chunk_mesh(store, chunk_x, chunk_z), 'rb') as f:
+                meshes.append(decode_mesh(f.read()))
+
+    _write_atomic(path, encode_mesh(merge_meshes(meshes)))
+    return path
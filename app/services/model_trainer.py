@@ -16,6 +16,8 @@ from app import db
 from app.models.training_job import TrainingJob
 from app.models.map_data import MapData
 from app.models.annotation import Annotation
+from app.services.block_store import BlockStore
+from app.services import spatial_service
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +66,11 @@ class ModelTrainer:
             training_samples = []
 
             for map_data in map_data_list:
+                store = BlockStore(map_data.id)
+                if store.exists():
+                    training_samples.extend(self._extract_samples_from_store(store, map_data))
+                    continue
+
                 annotations = Annotation.query.filter_by(map_data_id=map_data.id).all()
 
                 for annotation in annotations:
@@ -115,26 +122,64 @@ class ModelTrainer:
                     annotation.min_z <= block['z'] <= annotation.max_z):
                     region_blocks.append(block)
 
-            if not region_blocks:
-                return None
-
-            # 转换为3D张量格式
-            voxel_data = self._blocks_to_voxel(region_blocks, annotation)
-
-            return {
-                'voxel_data': voxel_data.tolist(),
-                'label': annotation.label,
-                'description': annotation.description,
-                'bbox': {
-                    'min': [annotation.min_x, annotation.min_y, annotation.min_z],
-                    'max': [annotation.max_x, annotation.max_y, annotation.max_z]
-                }
-            }
+            return self._build_sample(region_blocks, annotation)
 
         except Exception as e:
             logger.error(f"Failed to extract training sample: {e}")
             return None
 
+    def _extract_samples_from_store(self, store: BlockStore, map_data: MapData) -> List[Dict]:
+        """
+        从区块存储提取整张地图的训练样本
+
+        先用空间索引找出与每个区块相交的标注，只读取有标注的区块，每个区块解析一次后分配给相交的各个标注。
+        """
+        chunks = [(entry[0], entry[1]) for entry in store.chunk_entries()]
+        hits = spatial_service.annotations_by_chunk(map_data.id, chunks)
+        if not hits:
+            return []
+
+        annotations = {}
+        region_blocks = {}
+        for chunk_x, chunk_z, blocks in store.iter_chunks(list(hits)):
+            for annotation in hits[(chunk_x, chunk_z)]:
+                annotations[annotation.id] = annotation
+                region_blocks.setdefault(annotation.id, []).extend(
+                    block for block in blocks
+                    if annotation.min_x <= block['x'] <= annotation.max_x
+                    and annotation.min_y <= block['y'] <= annotation.max_y
+                    and annotation.min_z <= block['z'] <= annotation.max_z
+                )
+
+        samples = []
+        for annotation_id in sorted(annotations):
+            try:
+                sample = self._build_sample(region_blocks[annotation_id], annotations[annotation_id])
+            except Exception as e:
+                logger.error(f"Failed to extract training sample: {e}")
+                continue
+            if sample:
+                samples.append(sample)
+        return samples
+
+    def _build_sample(self, region_blocks: List[Dict], annotation: Annotation) -> Optional[Dict]:
+        """由标注区域内的方块构造训练样本"""
+        if not region_blocks:
+            return None
+
+        # 转换为3D张量格式
+        voxel_data = self._blocks_to_voxel(region_blocks, annotation)
+
+        return {
+            'voxel_data': voxel_data.tolist(),
+            'label': annotation.label,
+            'description': annotation.description,
+            'bbox': {
+                'min': [annotation.min_x, annotation.min_y, annotation.min_z],
+                'max': [annotation.max_x, annotation.max_y, annotation.max_z]
+            }
+        }
+
     @staticmethod
     def _blocks_to_voxel(blocks: List[Dict], annotation: Annotation) -> np.ndarray:
         """将方块数据转换为体素张量"""
@@ -153,7 +198,7 @@ class ModelTrainer:
             z = block['z'] - annotation.min_z
 
             if 0 <= x < width and 0 <= y < height and 0 <= z < depth:
-                voxel[x, y, z] = block['numeric_id']
+                voxel[x, y, z] = block.get('numeric_id', block.get('block_id', 0))
 
         return voxel
 
@@ -7,10 +7,17 @@ import os
 import json
 import logging
 from typing import Dict, List, Tuple
+from flask import current_app
 from app.models.map_data import MapData
 
 logger = logging.getLogger(__name__)
 
+
+def _model_cache_dir() -> str:
+    """Three.js数据所在目录，与解析器、缓存预热使用同一配置项"""
+    return current_app.config.get('MODEL_CACHE_DIR', 'models_cache')
+
+
 class OBJExporter:
     """OBJ模型导出器"""
 
@@ -38,7 +45,7 @@ class OBJExporter:
             self.vertex_index = 1
 
             # 读取Three.js缓存数据
-            threejs_cache_path = os.path.join('models_cache', f'threejs_data_{map_data.id}.json')
+            threejs_cache_path = os.path.join(_model_cache_dir(), f'threejs_data_{map_data.id}.json')
 
             if not os.path.exists(threejs_cache_path):
                 logger.error(f"Three.js缓存文件不存在: {threejs_cache_path}")
@@ -230,7 +237,7 @@ class OBJExporter:
         """
         try:
             # 读取Three.js缓存数据
-            threejs_cache_path = os.path.join('models_cache', f'threejs_data_{map_data.id}.json')
+            threejs_cache_path = os.path.join(_model_cache_dir(), f'threejs_data_{map_data.id}.json')
 
             if not os.path.exists(threejs_cache_path):
                 return None
@@ -262,7 +269,7 @@ class OBJExporter:
             }
 
             # 临时保存区域数据
-            temp_cache_path = os.path.join('models_cache', f'temp_region_{map_data.id}.json')
+            temp_cache_path = os.path.join(_model_cache_dir(), f'temp_region_{map_data.id}.json')
             with open(temp_cache_path, 'w') as f:
                 json.dump(region_data, f)
 
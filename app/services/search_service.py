@@ -0,0 +1,159 @@
+"""
+全文搜索服务
+在 FTS5 索引中按 bm25 排序检索地图和标注，索引不可用时退回 LIKE 查询。
+unicode61 分词器把连续的中日韩文字整体作为一个词，前缀查询只能匹配词首，
+因此搜索词含中日韩文字时也使用 LIKE 子串匹配。
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, column, text
+
+from app import db
+from app.models.annotation import Annotation
+from app.models.map_data import MapData
+from app.models.search_index import (
+    ANNOTATION_SEARCH_TABLE, MAP_SEARCH_TABLE, ensure_search_index
+)
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TYPES = ('maps', 'annotations')
+
+# bm25 列权重：标题匹配比正文更重要
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+_CJK_PATTERN = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def _needs_substring_match(query: str) -> bool:
+    """搜索词含中日韩文字时，全文索引无法做词中匹配"""
+    return bool(_CJK_PATTERN.search(query or ''))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """把用户输入转换为 FTS5 查询：每个词按前缀匹配，词之间为 AND"""
+    tokens = _TOKEN_PATTERN.findall(query or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _index_available() -> bool:
+    return ensure_search_index(db.session.connection())
+
+
+def _search_maps(match: str, limit: int) -> List[Dict]:
+    rows = db.session.execute(text(
+        f"SELECT rowid, title, body, bm25({MAP_SEARCH_TABLE}, :title_weight, :body_weight) AS score "
+        f"FROM {MAP_SEARCH_TABLE} WHERE {MAP_SEARCH_TABLE} MATCH :match ORDER BY score LIMIT :limit"
+    ), {'match': match, 'limit': limit, 'title_weight': TITLE_WEIGHT, 'body_weight': BODY_WEIGHT})
+
+    return [{
+        'type': 'map',
+        'id': row.rowid,
+        'map_data_id': row.rowid,
+        'title': row.title,
+        'body': row.body,
+        'score': round(-row.score, 4)
+    } for row in rows]
+
+
+def _search_annotations(match: str, limit: int, map_id: Optional[int]) -> List[Dict]:
+    map_filter = 'AND map_data_id = :map_id' if map_id is not None else ''
+    rows = db.session.execute(text(
+        f"SELECT rowid, title, body, map_data_id, "
+        f"bm25({ANNOTATION_SEARCH_TABLE}, :title_weight, :body_weight) AS score "
+        f"FROM {ANNOTATION_SEARCH_TABLE} WHERE {ANNOTATION_SEARCH_TABLE} MATCH :match {map_filter} "
+        f"ORDER BY score LIMIT :limit"
+    ), {'match': match, 'limit': limit, 'map_id': map_id,
+        'title_weight': TITLE_WEIGHT, 'body_weight': BODY_WEIGHT})
+
+    return [{
+        'type': 'annotation',
+        'id': row.rowid,
+        'map_data_id': int(row.map_data_id),
+        'title': row.title,
+        'body': row.body,
+        'score': round(-row.score, 4)
+    } for row in rows]
+
+
+def _like_search(query: str, types, limit: int, map_id: Optional[int]) -> List[Dict]:
+    """索引不可用时的退化实现"""
+    pattern = f'%{query}%'
+    results = []
+
+    if 'maps' in types:
+        maps = MapData.query.filter(db.or_(
+            MapData.original_filename.ilike(pattern), MapData.world_name.ilike(pattern)
+        )).limit(limit).all()
+        results.extend({
+            'type': 'map', 'id': m.id, 'map_data_id': m.id,
+            'title': m.original_filename, 'body': m.world_name or '', 'score': 0
+        } for m in maps)
+
+    if 'annotations' in types:
+        annotation_query = Annotation.query.filter(db.or_(
+            Annotation.label.ilike(pattern), Annotation.description.ilike(pattern)
+        ))
+        if map_id is not None:
+            annotation_query = annotation_query.filter(Annotation.map_data_id == map_id)
+        results.extend({
+            'type': 'annotation', 'id': a.id, 'map_data_id': a.map_data_id,
+            'title': a.label, 'body': a.description or '', 'score': 0
+        } for a in annotation_query.limit(limit).all())
+
+    return results[:limit]
+
+
+def search(query: str, types=SEARCH_TYPES, limit: int = 20, map_id: Optional[int] = None) -> Dict:
+    """
+    搜索地图和标注
+
+    Args:
+        query: 用户输入
+        types: 要搜索的类型，'maps' / 'annotations'
+        limit: 返回的最大条数
+        map_id: 只搜索指定地图的标注
+
+    Returns:
+        {'query': ..., 'engine': 'fts5' | 'like', 'results': [...]}
+    """
+    match = build_match_query(query)
+    if match is None:
+        return {'query': query, 'engine': 'fts5', 'results': []}
+
+    if _needs_substring_match(query) or not _index_available():
+        return {'query': query, 'engine': 'like', 'results': _like_search(query, types, limit, map_id)}
+
+    results = []
+    if 'maps' in types and map_id is None:
+        results.extend(_search_maps(match, limit))
+    if 'annotations' in types:
+        results.extend(_search_annotations(match, limit, map_id))
+
+    results.sort(key=lambda item: item['score'], reverse=True)
+    return {'query': query, 'engine': 'fts5', 'results': results[:limit]}
+
+
+def filter_maps(query, search: str):
+    """
+    按文件名、世界名过滤地图查询
+
+    索引可用时以 ``id IN (SELECT rowid ... MATCH)`` 子查询过滤，匹配的ID不经过Python，
+    也不受绑定参数数量限制；否则退回 LIKE 子串匹配。
+    """
+    match = build_match_query(search)
+    if match is not None and not _needs_substring_match(search) and _index_available():
+        matched_ids = text(
+            f"SELECT rowid FROM {MAP_SEARCH_TABLE} WHERE {MAP_SEARCH_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(column('rowid', Integer))
+        return query.filter(MapData.id.in_(matched_ids))
+
+    pattern = f'%{search}%'
+    return query.filter(db.or_(MapData.original_filename.ilike(pattern), MapData.world_name.ilike(pattern)))
@@ -0,0 +1,141 @@
+"""
+标注空间查询服务
+相交、包含和最近邻查询先在 R*Tree 索引中按包围盒筛选，索引不可用时退回对标注列的范围条件
+"""
+
+import logging
+import math
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import case
+
+from app import db
+from app.models.annotation import Annotation
+from app.models.spatial_index import annotation_rtree, ensure_spatial_index
+
+logger = logging.getLogger(__name__)
+
+# 包围盒：(min_x, min_y, min_z, max_x, max_y, max_z)，与标注一样是闭区间
+Box = Tuple[int, int, int, int, int, int]
+
+CHUNK_SIZE = 16
+WORLD_MIN_Y, WORLD_MAX_Y = -64, 319
+
+# 最近邻查询依次在这些半径（方块）的立方体内查找，都不够时对整张地图排序
+NEAREST_SEARCH_RADII = (64, 512, 4096)
+
+
+def normalize_box(values: Sequence[int]) -> Box:
+    """两个角点按轴排序为 (min..., max...)"""
+    x1, y1, z1, x2, y2, z2 = values
+    return min(x1, x2), min(y1, y2), min(z1, z2), max(x1, x2), max(y1, y2), max(z1, z2)
+
+
+def _box_query(map_id: int, lower: Box, upper: Box):
+    """
+    lower / upper 分别约束标注 max_* / min_* 的范围：
+    标注满足 max_* >= lower[*] 且 min_* <= upper[*]（相交）；包含查询时再加条件
+    """
+    query = Annotation.query
+    if ensure_spatial_index(db.session.connection()):
+        r = annotation_rtree.c
+        return query.join(annotation_rtree, r.id == Annotation.id).filter(
+            r.min_map <= map_id, r.max_map >= map_id,
+            r.max_x >= lower[0], r.min_x <= upper[0],
+            r.max_y >= lower[1], r.min_y <= upper[1],
+            r.max_z >= lower[2], r.min_z <= upper[2]
+        ), r
+
+    return query.filter(
+        Annotation.map_data_id == map_id,
+        Annotation.max_x >= lower[0], Annotation.min_x <= upper[0],
+        Annotation.max_y >= lower[1], Annotation.min_y <= upper[1],
+        Annotation.max_z >= lower[2], Annotation.min_z <= upper[2]
+    ), Annotation
+
+
+def intersecting(map_id: int, box: Box, limit: int = None) -> List[Annotation]:
+    """与包围盒相交的标注"""
+    query, _ = _box_query(map_id, box[:3], box[3:])
+    query = query.order_by(Annotation.id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def containing(map_id: int, box: Box, limit: int = None) -> List[Annotation]:
+    """完全包含包围盒（单个方块时即包含该点）的标注"""
+    query, columns = _box_query(map_id, box[3:], box[:3])
+    query = query.filter(
+        columns.min_x <= box[0], columns.max_x >= box[3],
+        columns.min_y <= box[1], columns.max_y >= box[4],
+        columns.min_z <= box[2], columns.max_z >= box[5]
+    ).order_by(Annotation.id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def _distance_squared(point: Sequence[int]):
+    """点到标注包围盒的欧氏距离平方（SQL表达式），点在盒内时为0"""
+    total = None
+    for axis, value in zip('xyz', point):
+        low, high = getattr(Annotation, f'min_{axis}'), getattr(Annotation, f'max_{axis}')
+        delta = case((low > value, low - value), (high < value, value - high), else_=0)
+        total = delta * delta if total is None else total + delta * delta
+    return total
+
+
+def nearest(map_id: int, point: Sequence[int], k: int = 10) -> List[Tuple[Annotation, float]]:
+    """
+    距离点最近的 k 个标注
+
+    距离在SQL中计算并排序，只取前 k 行。依次在以点为中心、半径取自 NEAREST_SEARCH_RADII 的立方体内
+    （走空间索引）查询：若已有 k 个结果且第 k 个的距离不超过半径，立方体外的标注必然更远，结果即为答案；
+    都不满足时对整张地图的标注排序一次。
+    """
+    if k <= 0:
+        return []
+
+    distance = _distance_squared(point).label('distance_squared')
+
+    def ranked(query):
+        rows = query.add_columns(distance).order_by(distance, Annotation.id).limit(k).all()
+        return [(annotation, math.sqrt(distance_squared)) for annotation, distance_squared in rows]
+
+    for radius in NEAREST_SEARCH_RADII:
+        query, _ = _box_query(map_id, tuple(value - radius for value in point),
+                              tuple(value + radius for value in point))
+        results = ranked(query)
+        if len(results) == k and results[-1][1] <= radius:
+            return results
+
+    return ranked(Annotation.query.filter(Annotation.map_data_id == map_id))
+
+
+def annotations_by_chunk(map_id: int, chunks: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], List[Annotation]]:
+    """
+    按区块查找与之相交的标注
+
+    对所有区块的外包范围只做一次相交查询，再按每个标注覆盖的区块范围在内存中分组。
+
+    Returns:
+        {(cx, cz): [标注]}，只包含有标注的区块；跨区块的标注在各区块中是同一个对象
+    """
+    wanted = set(map(tuple, chunks))
+    if not wanted:
+        return {}
+
+    xs = [cx for cx, _ in wanted]
+    zs = [cz for _, cz in wanted]
+    bounds = (min(xs) * CHUNK_SIZE, WORLD_MIN_Y, min(zs) * CHUNK_SIZE,
+              max(xs) * CHUNK_SIZE + CHUNK_SIZE - 1, WORLD_MAX_Y, max(zs) * CHUNK_SIZE + CHUNK_SIZE - 1)
+
+    result = {}
+    for annotation in intersecting(map_id, bounds):
+        x_range = range(annotation.min_x // CHUNK_SIZE, annotation.max_x // CHUNK_SIZE + 1)
+        z_range = range(annotation.min_z // CHUNK_SIZE, annotation.max_z // CHUNK_SIZE + 1)
+        # 覆盖范围比区块集合大时反过来遍历区块集合
+        if len(x_range) * len(z_range) > len(wanted):
+            covered = [chunk for chunk in wanted if chunk[0] in x_range and chunk[1] in z_range]
+        else:
+            covered = [(cx, cz) for cx in x_range for cz in z_range if (cx, cz) in wanted]
+        for chunk in covered:
+            result.setdefault(chunk, []).append(annotation)
+    return result
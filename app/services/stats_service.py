@@ -0,0 +1,115 @@
+"""
+系统统计服务
+
+每张表只用一次分组查询统计各状态数量，结果写入 stats_counters 单行表；
+之后由模型事件在业务事务中增减计数，日常读取只查这一行。
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.annotation import Annotation
+from app.models.map_data import MapData
+from app.models.stats_counter import (
+    COUNTER_ROW_ID, StatsCounter, job_counter_fields, map_counter_fields
+)
+from app.models.training_job import TrainingJob
+from app.utils.database import database_settings
+
+logger = logging.getLogger(__name__)
+
+
+def compute_counters() -> Dict[str, int]:
+    """用分组查询重新统计全部计数（每张表一次查询）"""
+    counters = {field: 0 for field in StatsCounter.COUNTER_FIELDS}
+
+    map_rows = db.session.query(
+        MapData.parse_status, MapData.is_parsed, db.func.count(MapData.id)
+    ).group_by(MapData.parse_status, MapData.is_parsed).all()
+    for parse_status, is_parsed, count in map_rows:
+        for field in map_counter_fields(parse_status, is_parsed):
+            counters[field] += count
+
+    counters['annotations_total'] = db.session.query(db.func.count(Annotation.id)).scalar() or 0
+
+    job_rows = db.session.query(
+        TrainingJob.status, db.func.count(TrainingJob.id)
+    ).group_by(TrainingJob.status).all()
+    for status, count in job_rows:
+        for field in job_counter_fields(status):
+            counters[field] += count
+
+    return counters
+
+
+def rebuild_counters() -> StatsCounter:
+    """重建计数行，用于首次使用或计数出现偏差时校正"""
+    counters = compute_counters()
+    row = db.session.get(StatsCounter, COUNTER_ROW_ID)
+
+    if row is None:
+        row = StatsCounter(id=COUNTER_ROW_ID)
+        db.session.add(row)
+    for field, value in counters.items():
+        setattr(row, field, value)
+    row.rebuilt_at = datetime.now(timezone.utc)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发请求已插入计数行，直接使用对方的结果
+        db.session.rollback()
+        row = db.session.get(StatsCounter, COUNTER_ROW_ID)
+
+    logger.info(f"统计计数已重建: {counters}")
+    return row
+
+
+def get_counters() -> Dict[str, int]:
+    """读取计数行，不存在时重建"""
+    row = db.session.get(StatsCounter, COUNTER_ROW_ID)
+    if row is None:
+        row = rebuild_counters()
+    return row.to_dict()
+
+
+def get_system_stats() -> Dict:
+    """系统统计接口使用的结构"""
+    counters = get_counters()
+    return {
+        'maps': {
+            'total': counters['maps_total'],
+            'parsed': counters['maps_parsed'],
+            'pending': counters['maps_pending'],
+            'parsing': counters['maps_parsing'],
+            'completed': counters['maps_completed'],
+            'error': counters['maps_failed']
+        },
+        'annotations': {
+            'total': counters['annotations_total']
+        },
+        'training_jobs': {
+            'total': counters['jobs_total'],
+            'pending': counters['jobs_pending'],
+            'running': counters['jobs_running'],
+            'completed': counters['jobs_completed'],
+            'failed': counters['jobs_failed'],
+            'stopped': counters['jobs_stopped']
+        },
+        'database': database_settings(db.session.connection())
+    }
+
+
+def get_dashboard_stats() -> Dict:
+    """仪表板和 /api/stats 使用的结构"""
+    counters = get_counters()
+    return {
+        'total_maps': counters['maps_total'],
+        'parsed_maps': counters['maps_parsed'],
+        'pending_maps': counters['maps_total'] - counters['maps_parsed'],
+        'total_annotations': counters['annotations_total']
+    }
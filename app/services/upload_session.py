@@ -0,0 +1,303 @@
+"""
+可续传分片上传
+
+上传分三步：创建会话 -> 按 Content-Range 顺序追加分片 -> 完成。
+分片直接追加写入 ``{UPLOAD_FOLDER}/.partial/<upload_id>.part``，会话状态保存在同目录的 JSON 文件中，
+连接中断后客户端查询已接收字节数，从该位置继续上传。
+收到前 8KB 后立即校验区域文件头，无效文件在传输剩余部分之前就被拒绝。
+SHA-256 随写入增量计算；会话被其他进程续传过时，完成阶段再从磁盘重新计算。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.utils.validators import REGION_HEADER_SIZE, allowed_file, validate_region_header
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DIR = '.partial'
+READ_BLOCK_SIZE = 64 * 1024
+
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 进程内的增量哈希：{upload_id: (已哈希字节数, hasher)}
+_hashers: Dict[str, Tuple[int, 'hashlib._Hash']] = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadSessionError(Exception):
+    """上传会话错误，附带HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _partial_dir() -> str:
+    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def parse_content_range(header: Optional[str], content_length: Optional[int]) -> Tuple[int, int, int]:
+    """
+    解析 ``Content-Range: bytes <start>-<end>/<total>``
+
+    Returns:
+        (start, length, total)
+    """
+    match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', (header or '').strip())
+    if not match:
+        raise UploadSessionError('缺少或无效的 Content-Range 请求头，格式: bytes <start>-<end>/<total>')
+
+    start, end, total = (int(value) for value in match.groups())
+    if end < start:
+        raise UploadSessionError(f'无效的字节范围: {start}-{end}', 416)
+
+    length = end - start + 1
+    if content_length is not None and content_length != length:
+        raise UploadSessionError(f'Content-Length ({content_length}) 与字节范围长度 ({length}) 不一致')
+    return start, length, total
+
+
+class UploadSession:
+    """单个分片上传会话"""
+
+    def __init__(self, upload_id: str, state: Dict):
+        self.upload_id = upload_id
+        self.state = state
+
+    # ---- 会话管理 ----
+
+    @classmethod
+    def create(cls, filename: str, total_size: int, sha256: Optional[str] = None) -> 'UploadSession':
+        """创建上传会话，文件名、大小不合法时抛出 UploadSessionError"""
+        if not filename or not allowed_file(filename):
+            raise UploadSessionError('Invalid file type')
+
+        max_size = current_app.config.get('MAX_UPLOAD_SIZE', 500 * 1024 * 1024)
+        if total_size > max_size:
+            raise UploadSessionError(f'文件过大: {total_size} 字节，上限 {max_size} 字节', 413)
+        if total_size < REGION_HEADER_SIZE:
+            raise UploadSessionError('文件小于区域文件头大小（8KB），不是有效的区域文件', 422)
+
+        cls.cleanup_expired()
+
+        now = time.time()
+        session = cls(uuid.uuid4().hex, {
+            'original_filename': filename,
+            'total_size': total_size,
+            'received': 0,
+            'expected_sha256': sha256.lower() if sha256 else None,
+            'header_valid': False,
+            'chunk_count': None,
+            'created_at': now,
+            'updated_at': now
+        })
+        open(session.data_path, 'wb').close()
+        session.save()
+        logger.info(f"创建上传会话: {session.upload_id} {filename} ({total_size} 字节)")
+        return session
+
+    @classmethod
+    def load(cls, upload_id: str) -> Optional['UploadSession']:
+        if not _UPLOAD_ID_PATTERN.match(upload_id or ''):
+            return None
+        session = cls(upload_id, {})
+        try:
+            with open(session.state_path, 'r', encoding='utf-8') as f:
+                session.state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return session
+
+    @classmethod
+    def cleanup_expired(cls):
+        """删除超过保留时间仍未完成的会话"""
+        ttl = current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+        directory = _partial_dir()
+        cutoff = time.time() - ttl
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(_partial_dir(), f"{self.upload_id}.part")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(_partial_dir(), f"{self.upload_id}.json")
+
+    @property
+    def received(self) -> int:
+        return self.state['received']
+
+    @property
+    def total_size(self) -> int:
+        return self.state['total_size']
+
+    def save(self):
+        """原子写入会话状态"""
+        self.state['updated_at'] = time.time()
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def abort(self):
+        """放弃上传，删除已接收的数据"""
+        with _hashers_lock:
+            _hashers.pop(self.upload_id, None)
+        for path in (self.data_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def to_dict(self) -> Dict:
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.state['original_filename'],
+            'total_size': self.total_size,
+            'received': self.received,
+            'complete': self.received == self.total_size,
+            'header_valid': self.state['header_valid'],
+            'chunk_count': self.state['chunk_count']
+        }
+
+    # ---- 写入 ----
+
+    def _take_hasher(self):
+        """取出与已接收字节数一致的增量哈希，不一致时返回None（完成时重新计算）"""
+        with _hashers_lock:
+            entry = _hashers.pop(self.upload_id, None)
+        if entry is not None and entry[0] == self.received:
+            return entry[1]
+        if self.received == 0:
+            return hashlib.sha256()
+        return None
+
+    def _check_header(self):
+        with open(self.data_path, 'rb') as f:
+            header = f.read(REGION_HEADER_SIZE)
+        is_valid, error, chunk_count = validate_region_header(header, self.total_size)
+        if not is_valid:
+            logger.warning(f"上传文件头无效，终止上传: {self.upload_id} {error}")
+            self.abort()
+            raise UploadSessionError(f'无效的区域文件: {error}', 422)
+        self.state['header_valid'] = True
+        self.state['chunk_count'] = chunk_count
+
+    def append(self, start: int, stream, length: int, total: int):
+        """
+        追加一个分片
+
+        分片必须从已接收位置开始；与已接收部分重叠的前缀（客户端重试）会被跳过。
+        传输中断时保留已写入的部分，客户端从新的 received 继续。
+        """
+        if total != self.total_size:
+            raise UploadSessionError(f'文件总大小不一致: {total} != {self.total_size}')
+        if start > self.received:
+            raise UploadSessionError(f'分片不连续，请从第 {self.received} 字节继续上传', 409)
+        if start + length > self.total_size:
+            raise UploadSessionError('分片超出文件大小', 416)
+
+        skip = self.received - start
+        if skip >= length:
+            return
+
+        hasher = self._take_hasher()
+        remaining = length
+        try:
+            with open(self.data_path, 'r+b') as f:
+                # 丢弃上次中断时可能残留的未记录数据
+                f.seek(self.received)
+                f.truncate()
+
+                while remaining > 0:
+                    piece = stream.read(min(READ_BLOCK_SIZE, remaining))
+                    if not piece:
+                        break
+                    remaining -= len(piece)
+
+                    if skip:
+                        dropped = min(skip, len(piece))
+                        piece = piece[dropped:]
+                        skip -= dropped
+                        if not piece:
+                            continue
+
+                    f.write(piece)
+                    if hasher is not None:
+                        hasher.update(piece)
+                    self.state['received'] += len(piece)
+
+                    if not self.state['header_valid'] and self.received >= REGION_HEADER_SIZE:
+                        f.flush()
+                        self._check_header()
+        finally:
+            if os.path.exists(self.state_path):
+                self.save()
+                if hasher is not None:
+                    with _hashers_lock:
+                        _hashers[self.upload_id] = (self.received, hasher)
+
+        if remaining > 0:
+            raise UploadSessionError(f'分片传输中断，已接收 {self.received} 字节，请继续上传', 400)
+
+    # ---- 完成 ----
+
+    def _file_sha256(self) -> str:
+        hasher = hashlib.sha256()
+        with open(self.data_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def finish(self) -> Dict:
+        """
+        完成上传：校验长度和哈希，移动到上传目录
+
+        Returns:
+            {'filename', 'original_filename', 'file_path', 'file_size', 'sha256', 'chunk_count'}
+        """
+        if self.received != self.total_size:
+            raise UploadSessionError(f'上传未完成: {self.received}/{self.total_size} 字节', 409)
+
+        hasher = self._take_hasher()
+        sha256 = hasher.hexdigest() if hasher is not None else self._file_sha256()
+
+        expected = self.state.get('expected_sha256')
+        if expected and expected != sha256:
+            self.abort()
+            raise UploadSessionError(f'SHA-256 校验失败: 期望 {expected}，实际 {sha256}', 422)
+
+        original_filename = self.state['original_filename']
+        filename = str(uuid.uuid4()) + '_' + secure_filename(original_filename)
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        os.replace(self.data_path, file_path)
+        os.remove(self.state_path)
+
+        logger.info(f"上传完成: {self.upload_id} -> {filename} ({self.total_size} 字节, sha256={sha256})")
+        return {
+            'filename': filename,
+            'original_filename': original_filename,
+            'file_path': file_path,
+            'file_size': self.total_size,
+            'sha256': sha256,
+            'chunk_count': self.state['chunk_count']
+        }
@@ -0,0 +1,214 @@
+"""
+方块计数的三维前缀和（summed-volume table）
+
+把方块存储的采样点落到网格上，为非空气方块总数和出现最多的若干方块类型各生成一张三维前缀和表
+P[i, j, k] = 网格 [0, i) x [0, j) x [0, k) 内的方块数。任意轴对齐包围盒内的数量由 8 个角点
+按容斥原理相加得到，与包围盒大小无关。
+
+网格单元默认等于解析采样步长（每个单元恰好一个采样点），此时结果精确；表的总单元数超过
+VOLUME_MAX_CELLS 时按 2 的幂合并单元，包围盒按单元最小角是否落在盒内取舍，结果为近似值。
+所有表保存在 ``map_{id}/volume_counts.npz``，重新解析时随地图目录一起清空。
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.map_lod import load_block_arrays
+
+try:
+    from config.mca_parser_config import MCAParserConfig
+    VOLUME_TOP_TYPES = MCAParserConfig.VOLUME_TOP_TYPES
+    VOLUME_MAX_CELLS = MCAParserConfig.VOLUME_MAX_CELLS
+except (ImportError, AttributeError):
+    VOLUME_TOP_TYPES = 8
+    VOLUME_MAX_CELLS = 16_000_000
+
+logger = logging.getLogger(__name__)
+
+VOLUME_FILE = 'volume_counts.npz'
+AIR_TYPES = frozenset(('minecraft:air', 'minecraft:cave_air', 'minecraft:void_air'))
+
+# 已加载的前缀和表，键为 (地图ID, 文件修改时间)，重新生成后自然失效
+_LOADED_VOLUMES = OrderedDict()
+_LOADED_VOLUMES_SIZE = 8
+_loaded_volumes_lock = threading.Lock()
+
+
+def volume_path(store) -> str:
+    return store.artifact_path(VOLUME_FILE)
+
+
+def _prefix_sum(cell_ids: np.ndarray, dims: np.ndarray, dtype) -> np.ndarray:
+    """统计每个单元的方块数并沿三个轴累加，各轴前面补一层0"""
+    grid = np.bincount(cell_ids, minlength=int(np.prod(dims))).reshape(dims)
+    table = np.zeros(tuple(dims + 1), dtype=dtype)
+    table[1:, 1:, 1:] = grid.cumsum(0).cumsum(1).cumsum(2)
+    return table
+
+
+def build_volume_counts(store, top_types: int = VOLUME_TOP_TYPES, max_cells: int = VOLUME_MAX_CELLS) -> Dict:
+    """
+    生成前缀和表并写入地图目录
+
+    Returns:
+        摘要：统计的方块类型、单元尺寸、网格大小、是否精确
+    """
+    meta = store.meta
+    step = np.array([meta.get('sample_rate', 1), meta.get('height_sample_rate', 1), meta.get('sample_rate', 1)],
+                    dtype=np.int64)
+
+    positions, types, palette = load_block_arrays(store)
+    solid = ~np.isin(types, [index for index, (name, _) in enumerate(palette) if name in AIR_TYPES])
+    positions, types = positions[solid], types[solid]
+
+    # 出现最多的类型，数量相同时按调色板顺序
+    type_counts = np.bincount(types, minlength=len(palette))
+    tracked = [int(index) for index in np.argsort(-type_counts, kind='stable')[:top_types] if type_counts[index]]
+
+    if len(types):
+        origin = positions.min(axis=0)
+        extent = positions.max(axis=0) - origin
+    else:
+        origin = extent = np.zeros(3, dtype=np.int64)
+
+    # 单元数超过上限时逐级合并
+    factor = 1
+    while True:
+        cell_size = step * factor
+        dims = extent // cell_size + 1
+        if int(np.prod(dims)) * (len(tracked) + 1) <= max_cells or factor >= 1 << 16:
+            break
+        factor *= 2
+
+    cells = (positions - origin) // cell_size
+    cell_ids = np.ravel_multi_index(cells.T, dims) if len(types) else np.zeros(0, dtype=np.int64)
+    dtype = np.uint32 if len(types) < 2 ** 32 else np.uint64
+
+    tables = np.empty((len(tracked) + 1,) + tuple(dims + 1), dtype=dtype)
+    tables[0] = _prefix_sum(cell_ids, dims, dtype)
+    for channel, index in enumerate(tracked, 1):
+        tables[channel] = _prefix_sum(cell_ids[types == index], dims, dtype)
+
+    # 每次生成使用独立的临时文件，按需生成与后处理并发时互不影响
+    path = volume_path(store)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                tables=tables,
+                origin=origin,
+                cell_size=cell_size,
+                sample_step=step,
+                type_names=np.array([palette[index][0] for index in tracked], dtype=str),
+                type_ids=np.array([palette[index][1] for index in tracked], dtype=np.int64),
+            )
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    summary = {
+        'types': [palette[index][0] for index in tracked],
+        'cell_size': cell_size.tolist(),
+        'dims': dims.tolist(),
+        'exact': factor == 1,
+        'size': os.path.getsize(path)
+    }
+    logger.info(f"方块计数前缀和生成完成: map_{store.map_data_id}, 网格 {summary['dims']}, "
+                f"{len(tracked)} 种方块, {summary['size']} 字节")
+    return summary
+
+
+def load_volume_counts(store) -> Optional[Dict]:
+    """读取前缀和表（进程内缓存），尚未生成时返回None"""
+    path = volume_path(store)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    key = (store.map_data_id, mtime)
+    with _loaded_volumes_lock:
+        volume = _LOADED_VOLUMES.get(key)
+        if volume is not None:
+            _LOADED_VOLUMES.move_to_end(key)
+            return volume
+
+    with np.load(path) as data:
+        volume = {name: data[name] for name in data.files}
+    volume['type_names'] = volume['type_names'].tolist()
+    volume['type_ids'] = volume['type_ids'].tolist()
+
+    with _loaded_volumes_lock:
+        _LOADED_VOLUMES[key] = volume
+        if len(_LOADED_VOLUMES) > _LOADED_VOLUMES_SIZE:
+            _LOADED_VOLUMES.popitem(last=False)
+    return volume
+
+
+def ensure_volume_counts(store) -> Dict:
+    """确保前缀和表已生成（兼容后处理阶段之前解析的地图），返回已加载的表"""
+    volume = load_volume_counts(store)
+    if volume is None:
+        build_volume_counts(store)
+        volume = load_volume_counts(store)
+    return volume
+
+
+# 8 个角点的容斥符号，顺序与 count_boxes 中的角点坐标一致
+_CORNER_SIGNS = np.array([1, -1, -1, -1, 1, 1, 1, -1], dtype=np.int64)
+
+
+def count_boxes(volume: Dict, boxes: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    统计多个包围盒内的方块数
+
+    Args:
+        volume: load_volume_counts 的返回值
+        boxes: [(min_x, min_y, min_z, max_x, max_y, max_z), ...]，闭区间
+
+    Returns:
+        形状为 (包围盒数, 1 + 类型数) 的 int64 数组，第0列为非空气方块总数，其余列对应 type_names
+    """
+    tables = volume['tables']
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 6)
+    origin, cell_size = volume['origin'], volume['cell_size']
+    dims = np.array(tables.shape[1:]) - 1
+
+    # 采样点位于单元最小角：盒内的单元下标范围是 [ceil((min - origin) / size), floor((max - origin) / size)]
+    low = np.clip(-((origin - boxes[:, :3]) // cell_size), 0, dims)
+    high = np.clip((boxes[:, 3:] - origin) // cell_size + 1, 0, dims)
+    high = np.maximum(high, low)
+
+    x0, y0, z0 = low.T
+    x1, y1, z1 = high.T
+    xs = np.stack([x1, x0, x1, x1, x0, x0, x1, x0], axis=1)
+    ys = np.stack([y1, y1, y0, y1, y0, y1, y0, y0], axis=1)
+    zs = np.stack([z1, z1, z1, z0, z1, z0, z0, z0], axis=1)
+
+    # (通道, 包围盒, 角点)，无符号整数先转为 int64 再做容斥
+    corners = tables[:, xs, ys, zs].astype(np.int64)
+    return (corners @ _CORNER_SIGNS).T
+
+
+def describe_counts(volume: Dict, boxes: Sequence[Sequence[int]]) -> List[Dict]:
+    """包围盒计数结果转为接口返回的结构：总数、各统计类型的数量（省略0）和其余类型的合计"""
+    counts = count_boxes(volume, boxes)
+    results = []
+    for box, row in zip(boxes, counts.tolist()):
+        total, per_type = row[0], row[1:]
+        results.append({
+            'bbox': {'min': list(box[:3]), 'max': list(box[3:])},
+            'total': total,
+            'counts': {name: count for name, count in zip(volume['type_names'], per_type) if count},
+            'other': total - sum(per_type)
+        })
+    return results
@@ -0,0 +1,162 @@
+"""
+区块体素网格
+
+把方块存储中的单个区块展开为稠密三维数组，供网格化、表面提取等按邻居比较的处理使用。
+数组下标是采样格坐标（x、z 方向步长为 sample_rate，y 方向为 height_sample_rate），
+四周各留一格边框，填入相邻区块的边界方块，处理区块边界时不需要再单独读取邻居。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+CHUNK_SIZE = 16
+
+# 透明或不完整的方块：与它们相邻的面仍然可见
+TRANSPARENT_BLOCKS = frozenset({
+    'minecraft:water', 'minecraft:lava', 'minecraft:ice', 'minecraft:glass', 'minecraft:glass_pane',
+    'minecraft:oak_leaves', 'minecraft:spruce_leaves', 'minecraft:birch_leaves', 'minecraft:jungle_leaves',
+    'minecraft:acacia_leaves', 'minecraft:dark_oak_leaves', 'minecraft:mangrove_leaves',
+    'minecraft:azalea_leaves', 'minecraft:flowering_azalea_leaves', 'minecraft:cherry_leaves',
+    'minecraft:grass', 'minecraft:short_grass', 'minecraft:tall_grass', 'minecraft:fern', 'minecraft:large_fern',
+    'minecraft:seagrass', 'minecraft:tall_seagrass', 'minecraft:kelp', 'minecraft:kelp_plant',
+    'minecraft:snow', 'minecraft:vine', 'minecraft:torch', 'minecraft:wall_torch', 'minecraft:bubble_column',
+})
+
+# 名称中包含这些片段的方块同样视为透明（各色玻璃、花、树苗等）
+TRANSPARENT_NAME_PARTS = ('glass', 'leaves', 'flower', 'sapling', 'tulip', 'door', 'fence', 'rail', 'carpet')
+
+
+def is_transparent_block(block_type: str) -> bool:
+    """方块是否透明（不遮挡相邻方块的面）"""
+    if block_type in TRANSPARENT_BLOCKS:
+        return True
+    name = block_type.split(':', 1)[-1]
+    return any(part in name for part in TRANSPARENT_NAME_PARTS)
+
+
+@dataclass
+class ChunkGrid:
+    """单个区块的稠密体素网格（含一格边框）"""
+    chunk_x: int
+    chunk_z: int
+    step: Tuple[int, int, int]
+    min_height: int
+    types: np.ndarray               # (X+2, Y+2, Z+2)，0 为空气，其余为 palette 下标 + 1
+    palette: List[Tuple[str, int]]  # [(方块名, 数值ID), ...]
+
+    @property
+    def origin(self) -> Tuple[int, int, int]:
+        """内部第一个体素的世界坐标"""
+        return self.chunk_x * CHUNK_SIZE, self.min_height, self.chunk_z * CHUNK_SIZE
+
+    @property
+    def inner(self) -> Tuple[slice, slice, slice]:
+        """去掉边框的下标切片"""
+        return slice(1, -1), slice(1, -1), slice(1, -1)
+
+    def lookup(self, table: np.ndarray) -> np.ndarray:
+        """按类型查表，table 按 palette 顺序给出每种类型的值，空气对应默认值0"""
+        return np.concatenate([np.zeros(1, dtype=table.dtype), table])[self.types]
+
+    def transparent_table(self) -> np.ndarray:
+        return np.array([is_transparent_block(name) for name, _ in self.palette], dtype=bool)
+
+    def opaque_mask(self) -> np.ndarray:
+        """实心且不透明的体素"""
+        return (self.types > 0) & ~self.lookup(self.transparent_table())
+
+    def exposed_mask(self) -> np.ndarray:
+        """
+        内部体素中至少有一个面可见的方块（不含边框）
+
+        某个方向的邻居不是不透明方块、且与自身不是同种方块时，该面可见，
+        因此水下、玻璃后的方块会保留，连成一片的水体内部不会保留。
+        """
+        inner = self.types[self.inner]
+        opaque = self.opaque_mask()
+        size = inner.shape
+        exposed = np.zeros(size, dtype=bool)
+
+        for axis in range(3):
+            for direction in (1, -1):
+                shifted = [slice(1, -1)] * 3
+                shifted[axis] = slice(1 + direction, size[axis] + 1 + direction)
+                shifted = tuple(shifted)
+                exposed |= ~opaque[shifted] & (inner != self.types[shifted])
+
+        return exposed & (inner > 0)
+
+
+def grid_shape(meta: Dict) -> Tuple[Tuple[int, int, int], Tuple[int, int, int], int]:
+    """根据方块存储元信息计算 (采样步长, 内部尺寸, 最低高度)"""
+    sample_rate = max(1, int(meta.get('sample_rate', 1)))
+    height_step = max(1, int(meta.get('height_sample_rate', 1)))
+    min_height = int(meta.get('min_height', 0))
+    max_height = int(meta.get('max_height', 384))
+
+    step = (sample_rate, height_step, sample_rate)
+    size = (
+        -(-CHUNK_SIZE // sample_rate),
+        max(1, -(-(max_height - min_height) // height_step)),
+        -(-CHUNK_SIZE // sample_rate),
+    )
+    return step, size, min_height
+
+
+def neighbour_chunks(chunk_x: int, chunk_z: int) -> List[Tuple[int, int]]:
+    """区块自身及共享一个面的四个相邻区块"""
+    return [(chunk_x, chunk_z), (chunk_x - 1, chunk_z), (chunk_x + 1, chunk_z),
+            (chunk_x, chunk_z - 1), (chunk_x, chunk_z + 1)]
+
+
+def block_cells(blocks: List[Dict], chunk_x: int, chunk_z: int, step, min_height: int) -> np.ndarray:
+    """方块在区块网格中的下标（含边框偏移1）"""
+    positions = np.asarray([(block['x'], block['y'], block['z']) for block in blocks], dtype=np.int64).reshape(-1, 3)
+    origin = np.array([chunk_x * CHUNK_SIZE, min_height, chunk_z * CHUNK_SIZE], dtype=np.int64)
+    return np.floor_divide(positions - origin, np.asarray(step, dtype=np.int64)) + 1
+
+
+def load_chunk_grid(store, chunk_x: int, chunk_z: int) -> ChunkGrid:
+    """读取区块及其四个相邻区块，构建带边框的体素网格"""
+    chunks = {(cx, cz): blocks for cx, cz, blocks in store.iter_chunks(neighbour_chunks(chunk_x, chunk_z))}
+    return build_chunk_grid(store.meta, chunk_x, chunk_z, chunks)
+
+
+def build_chunk_grid(meta: Dict, chunk_x: int, chunk_z: int, chunks: Dict[Tuple[int, int], List[Dict]]) -> ChunkGrid:
+    """
+    用已读取的区块构建带边框的体素网格
+
+    Args:
+        meta: 方块存储元信息（采样步长、高度范围）
+        chunks: {(cx, cz): blocks}，至少包含区块自身，缺少的相邻区块视为空气
+    """
+    step, size, min_height = grid_shape(meta)
+    types = np.zeros((size[0] + 2, size[1] + 2, size[2] + 2), dtype=np.int32)
+
+    palette_index: Dict[str, int] = {}
+    palette: List[Tuple[str, int]] = []
+    blocks_in_grid: List[Dict] = []
+    values: List[int] = []
+
+    for key in neighbour_chunks(chunk_x, chunk_z):
+        for block in chunks.get(key, ()):
+            block_type = block['block_type']
+            index = palette_index.get(block_type)
+            if index is None:
+                index = palette_index[block_type] = len(palette)
+                palette.append((block_type, block.get('block_id', 0) or 0))
+            values.append(index + 1)
+            blocks_in_grid.append(block)
+
+    if values:
+        cells = block_cells(blocks_in_grid, chunk_x, chunk_z, step, min_height)
+
+        # 只保留落在网格（含边框）内的方块，相邻区块只会留下边界一层
+        upper = np.asarray(types.shape, dtype=np.int64)
+        keep = np.all((cells >= 0) & (cells < upper), axis=1)
+        cells = cells[keep]
+        types[cells[:, 0], cells[:, 1], cells[:, 2]] = np.asarray(values, dtype=np.int32)[keep]
+
+    return ChunkGrid(chunk_x, chunk_z, step, min_height, types, palette)
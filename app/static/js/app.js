@@ -232,6 +232,66 @@ window.CraftNE = {
         }
     },
 
+    // 任务进度订阅：优先使用SSE长连接，不可用时退回轮询状态接口
+    progress: {
+        pollInterval: 3000,
+
+        watch: function(eventsUrl, handlers, pollUrl = null) {
+            let source = null;
+            let timer = null;
+            let stopped = false;
+
+            const stop = () => {
+                stopped = true;
+                if (source) source.close();
+                if (timer) clearInterval(timer);
+            };
+
+            const startPolling = () => {
+                if (!pollUrl || timer || stopped) return;
+                if (source) source.close();
+                timer = setInterval(() => {
+                    fetch(pollUrl).then(r => r.json()).then(status => {
+                        if (handlers.status) handlers.status(status);
+                        const state = status.parse_status || status.status;
+                        if (state === 'completed' || state === 'failed') {
+                            stop();
+                            if (handlers[state]) handlers[state](status);
+                        }
+                    }).catch(() => {});
+                }, this.pollInterval);
+            };
+
+            if (!window.EventSource) {
+                startPolling();
+                return { close: stop };
+            }
+
+            // 断线时 EventSource 会自动重连并携带 Last-Event-ID
+            source = new EventSource(eventsUrl);
+            source.addEventListener('status', e => {
+                const data = JSON.parse(e.data);
+                if (handlers.status) handlers.status(data);
+                if ((data.state === 'completed' || data.state === 'failed') && handlers[data.state]) {
+                    stop();
+                    handlers[data.state](data);
+                }
+            });
+            source.addEventListener('progress', e => {
+                if (handlers.progress) handlers.progress(JSON.parse(e.data));
+            });
+            ['completed', 'failed'].forEach(name => {
+                source.addEventListener(name, e => {
+                    stop();
+                    if (handlers[name]) handlers[name](JSON.parse(e.data));
+                });
+            });
+            source.addEventListener('unavailable', startPolling);
+
+            return { close: stop };
+        }
+    },
+
     // 本地存储管理
     storage: {
         set: function(key, value) {
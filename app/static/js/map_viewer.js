@@ -14,6 +14,17 @@ class MapViewer {
         this.blockMeshes = [];
         this.annotations = [];
         
+        // 瓦片渐进加载状态
+        this.tileManifest = null;
+        this.tileStates = new Map();
+        this.tileQueue = [];
+        this.activeTileLoads = 0;
+        this.maxConcurrentTiles = 4;
+        this.tileLoadRadius = 128;
+        this.tileUpdateTimer = null;
+        // 瓦片优先使用服务端贪心网格（只含可见面），否则逐方块实例化
+        this.useMeshes = true;
+        
         this.init();
     }
     
@@ -42,6 +53,7 @@ class MapViewer {
         this.controls = new THREE.OrbitControls(this.camera, this.renderer.domElement);
         this.controls.enableDamping = true;
         this.controls.dampingFactor = 0.05;
+        this.controls.addEventListener('change', () => this.scheduleTileUpdate());
         
         // 添加光源
         this.setupLighting();
@@ -83,8 +95,11 @@ class MapViewer {
             
             this.mapData = mapData;
             
-            // 加载方块数据
-            await this.loadBlocks(mapId);
+            // 优先按瓦片渐进加载，不支持时整体加载方块数据
+            const tiled = await this.loadTiles(mapId);
+            if (!tiled) {
+                await this.loadBlocks(mapId);
+            }
             
             // 加载标注数据
             await this.loadAnnotations(mapId);
@@ -94,6 +109,11 @@ class MapViewer {
             
             this.hideLoadingMessage();
             
+            // 从相机附近的瓦片开始加载
+            if (tiled) {
+                this.updateVisibleTiles();
+            }
+            
         } catch (error) {
             console.error('Error loading map:', error);
             this.showMessage('Failed to load map', 'error');
@@ -102,65 +122,311 @@ class MapViewer {
     
     async loadBlocks(mapId) {
         try {
-            const response = await fetch(`/api/maps/${mapId}/blocks`);
-            const blocks = await response.json();
+            const response = await fetch(`/api/maps/${mapId}/blocks?format=binary`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const payload = MapViewer.decodeBlocks(await response.arrayBuffer());
             
-            this.showLoadingMessage(`Loading ${blocks.length} blocks...`);
+            this.showLoadingMessage(`Loading ${payload.blockCount} blocks...`);
             
             // 清除现有方块
             this.clearBlocks();
             
-            // 创建方块材质
-            const materials = this.createBlockMaterials();
+            // 批量创建实例化网格
+            this.addBlockPayload(payload);
+
+        } catch (error) {
+            console.error('Error loading blocks:', error);
+            this.showMessage('Failed to load blocks', 'error');
+        }
+    }
+    
+    /**
+     * 为解码后的方块数据创建实例化网格（每种方块类型一个），返回创建的网格
+     */
+    addBlockPayload(payload) {
+        if (!this.blockMaterials) {
+            this.blockMaterials = this.createBlockMaterials();
+            this.blockGeometry = new THREE.BoxGeometry(1, 1, 1);
+        }
+        
+        const [ox, oy, oz] = payload.origin;
+        const meshes = [];
+        
+        // 数量直接取自调色板
+        payload.palette.forEach(entry => {
+            if (entry.count === 0) {
+                return;
+            }
             
-            // 批量创建方块（优化性能）
-            const instancedMeshes = new Map();
+            const material = this.blockMaterials.get(entry.blockType) || this.blockMaterials.get('default');
+            const instancedMesh = new THREE.InstancedMesh(this.blockGeometry, material, entry.count);
+            instancedMesh.castShadow = true;
+            instancedMesh.receiveShadow = true;
             
-            blocks.forEach((block, index) => {
-                if (index % 1000 === 0) {
-                    this.showLoadingMessage(`Loading blocks: ${index}/${blocks.length}`);
-                }
-                
-                const blockType = block.block_type;
-                
-                if (!instancedMeshes.has(blockType)) {
-                    // 创建实例化几何体
-                    const geometry = new THREE.BoxGeometry(1, 1, 1);
-                    const material = materials.get(blockType) || materials.get('default');
-                    
-                    // 估算该类型方块数量
-                    const count = blocks.filter(b => b.block_type === blockType).length;
-                    const instancedMesh = new THREE.InstancedMesh(geometry, material, count);
-                    instancedMesh.castShadow = true;
-                    instancedMesh.receiveShadow = true;
-                    
-                    instancedMeshes.set(blockType, {
-                        mesh: instancedMesh,
-                        index: 0
-                    });
-                    
-                    this.scene.add(instancedMesh);
-                }
-                
-                // 设置实例位置
-                const instance = instancedMeshes.get(blockType);
-                const matrix = new THREE.Matrix4();
-                matrix.setPosition(block.x, block.y, block.z);
-                instance.mesh.setMatrixAt(instance.index, matrix);
-                instance.index++;
-            });
+            // 直接写入实例矩阵的平移分量（单位矩阵 + 平移）
+            const matrices = instancedMesh.instanceMatrix.array;
+            const positions = entry.positions;
+            for (let i = 0; i < entry.count; i++) {
+                const m = i * 16;
+                const p = i * 3;
+                matrices[m] = 1;
+                matrices[m + 5] = 1;
+                matrices[m + 10] = 1;
+                matrices[m + 12] = positions[p] + ox;
+                matrices[m + 13] = positions[p + 1] + oy;
+                matrices[m + 14] = positions[p + 2] + oz;
+                matrices[m + 15] = 1;
+            }
+            instancedMesh.instanceMatrix.needsUpdate = true;
             
-            // 更新实例化网格
-            instancedMeshes.forEach(instance => {
-                instance.mesh.instanceMatrix.needsUpdate = true;
+            this.scene.add(instancedMesh);
+            this.blockMeshes.push(instancedMesh);
+            meshes.push(instancedMesh);
+        });
+        
+        return meshes;
+    }
+    
+    /**
+     * 为解码后的网格数据创建一个网格对象，每种材质一个绘制分组
+     */
+    addMeshPayload(payload) {
+        if (!this.blockMaterials) {
+            this.blockMaterials = this.createBlockMaterials();
+            this.blockGeometry = new THREE.BoxGeometry(1, 1, 1);
+        }
+        if (payload.indices.length === 0) {
+            return [];
+        }
+        
+        const geometry = new THREE.BufferGeometry();
+        geometry.setAttribute('position', new THREE.BufferAttribute(payload.positions, 3));
+        geometry.setAttribute('normal', new THREE.BufferAttribute(payload.normals, 3, true));
+        geometry.setIndex(new THREE.BufferAttribute(payload.indices, 1));
+        
+        const materials = payload.materials.map((entry, index) => {
+            geometry.addGroup(entry.indexStart, entry.indexCount, index);
+            return this.blockMaterials.get(entry.blockType) || this.blockMaterials.get('default');
+        });
+        
+        const mesh = new THREE.Mesh(geometry, materials);
+        mesh.castShadow = true;
+        mesh.receiveShadow = true;
+        
+        this.scene.add(mesh);
+        this.blockMeshes.push(mesh);
+        return [mesh];
+    }
+    
+    /**
+     * 解码网格数据，格式见 app/services/mesher.py
+     */
+    static decodeMesh(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(
+            view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+        );
+        if (magic !== 'CNEM') {
+            throw new Error('Invalid mesh payload');
+        }
+        
+        const version = view.getUint16(4, true);
+        if (version !== 1) {
+            throw new Error(`Unsupported mesh payload version: ${version}`);
+        }
+        
+        const materialCount = view.getUint16(6, true);
+        const vertexCount = view.getUint32(8, true);
+        const indexCount = view.getUint32(12, true);
+        
+        const decoder = new TextDecoder();
+        const materials = [];
+        let offset = 16;
+        for (let i = 0; i < materialCount; i++) {
+            const nameLength = view.getUint16(offset, true);
+            offset += 2;
+            const blockType = decoder.decode(new Uint8Array(buffer, offset, nameLength));
+            offset += nameLength;
+            materials.push({
+                blockType,
+                blockId: view.getUint16(offset, true),
+                indexStart: view.getUint32(offset + 2, true),
+                indexCount: view.getUint32(offset + 6, true)
             });
+            offset += 10;
+        }
+        offset += (4 - (offset - 16) % 4) % 4;
+        
+        const pad4 = length => length + (4 - length % 4) % 4;
+        const positions = new Float32Array(buffer, offset, vertexCount * 3);
+        offset += vertexCount * 12;
+        const normals = new Int8Array(buffer, offset, vertexCount * 3);
+        offset += pad4(vertexCount * 3);
+        const vertexMaterials = new Uint16Array(buffer, offset, vertexCount);
+        offset += pad4(vertexCount * 2);
+        const indices = new Uint32Array(buffer, offset, indexCount);
+        
+        return { materials, positions, normals, vertexMaterials, indices };
+    }
+    
+    /**
+     * 读取瓦片清单，成功返回 true；地图没有瓦片时返回 false 由调用方整体加载
+     */
+    async loadTiles(mapId) {
+        try {
+            const response = await fetch(`/api/maps/${mapId}/tiles`);
+            if (!response.ok) {
+                return false;
+            }
+            
+            const result = await response.json();
+            if (!result.success || !result.data || !result.data.tile_count) {
+                return false;
+            }
+            
+            this.clearBlocks();
+            this.tileManifest = result.data;
+            this.showLoadingMessage(`Loading ${this.tileManifest.block_count} blocks in ${this.tileManifest.tile_count} tiles...`);
+            return true;
             
-            this.blockMeshes = Array.from(instancedMeshes.values()).map(instance => instance.mesh);
-
         } catch (error) {
-            console.error('Error loading blocks:', error);
-            this.showMessage('Failed to load blocks', 'error');
+            console.error('Error loading tile manifest:', error);
+            return false;
+        }
+    }
+    
+    scheduleTileUpdate() {
+        if (!this.tileManifest || this.tileUpdateTimer) {
+            return;
+        }
+        // 相机移动时合并更新，避免每帧重新排序
+        this.tileUpdateTimer = setTimeout(() => {
+            this.tileUpdateTimer = null;
+            this.updateVisibleTiles();
+        }, 200);
+    }
+    
+    /**
+     * 按与相机目标点的距离排序，加载范围内尚未加载的瓦片
+     */
+    updateVisibleTiles() {
+        if (!this.tileManifest) {
+            return;
+        }
+        
+        const target = this.controls.target;
+        // 相机拉远时扩大加载范围
+        const radius = Math.max(this.tileLoadRadius, this.camera.position.distanceTo(target));
+        
+        this.tileQueue = this.tileManifest.tiles
+            .filter(tile => !this.tileStates.has(`${tile.tx}_${tile.tz}`))
+            .map(tile => {
+                const { min, max } = tile.bounds;
+                const dx = (min[0] + max[0]) / 2 - target.x;
+                const dz = (min[2] + max[2]) / 2 - target.z;
+                return { tile, distance: Math.sqrt(dx * dx + dz * dz) };
+            })
+            .filter(item => item.distance <= radius)
+            .sort((a, b) => a.distance - b.distance)
+            .map(item => item.tile);
+        
+        this.pumpTileQueue();
+    }
+    
+    pumpTileQueue() {
+        while (this.activeTileLoads < this.maxConcurrentTiles && this.tileQueue.length) {
+            const tile = this.tileQueue.shift();
+            const key = `${tile.tx}_${tile.tz}`;
+            if (!this.tileStates.has(key)) {
+                this.loadTile(tile, key);
+            }
+        }
+    }
+    
+    async loadTile(tile, key) {
+        const manifest = this.tileManifest;
+        this.tileStates.set(key, 'loading');
+        this.activeTileLoads++;
+        
+        try {
+            const useMesh = this.useMeshes && manifest.mesh_url_template;
+            const template = useMesh ? manifest.mesh_url_template : manifest.url_template;
+            const url = template.replace('{tx}', tile.tx).replace('{tz}', tile.tz);
+            const response = await fetch(url);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const buffer = await response.arrayBuffer();
+            
+            // 加载期间切换了地图时丢弃结果
+            if (manifest === this.tileManifest) {
+                const meshes = useMesh
+                    ? this.addMeshPayload(MapViewer.decodeMesh(buffer))
+                    : this.addBlockPayload(MapViewer.decodeBlocks(buffer));
+                this.tileStates.set(key, meshes);
+            }
+            
+        } catch (error) {
+            console.error(`Error loading tile ${key}:`, error);
+            // 允许下次相机移动时重试
+            if (manifest === this.tileManifest) {
+                this.tileStates.delete(key);
+            }
+        } finally {
+            this.activeTileLoads--;
+            this.pumpTileQueue();
+        }
+    }
+    
+    /**
+     * 解码二进制方块数据，格式见 app/services/block_codec.py
+     * 坐标数组是响应缓冲区上的 TypedArray 视图，不做拷贝
+     */
+    static decodeBlocks(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(
+            view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+        );
+        if (magic !== 'CNEB') {
+            throw new Error('Invalid block payload');
+        }
+        
+        const version = view.getUint16(4, true);
+        if (version !== 1) {
+            throw new Error(`Unsupported block payload version: ${version}`);
         }
+        
+        const flags = view.getUint16(6, true);
+        const paletteSize = view.getUint32(8, true);
+        const blockCount = view.getUint32(12, true);
+        const origin = [view.getInt32(16, true), view.getInt32(20, true), view.getInt32(24, true)];
+        const ArrayType = (flags & 0x1) ? Int32Array : Int16Array;
+        
+        const decoder = new TextDecoder();
+        const palette = [];
+        let offset = 28;
+        for (let i = 0; i < paletteSize; i++) {
+            const nameLength = view.getUint16(offset, true);
+            offset += 2;
+            const blockType = decoder.decode(new Uint8Array(buffer, offset, nameLength));
+            offset += nameLength;
+            const blockId = view.getUint16(offset, true);
+            const count = view.getUint32(offset + 2, true);
+            offset += 6;
+            palette.push({ blockType, blockId, count, positions: null });
+        }
+        offset += (4 - (offset - 28) % 4) % 4;
+        
+        palette.forEach(entry => {
+            const length = entry.count * 3;
+            entry.positions = new ArrayType(buffer, offset, length);
+            const bytes = length * ArrayType.BYTES_PER_ELEMENT;
+            offset += bytes + (4 - bytes % 4) % 4;
+        });
+        
+        return { blockCount, origin, palette };
     }
     
     createBlockMaterials() {
@@ -250,19 +516,33 @@ class MapViewer {
         this.blockMeshes.forEach(mesh => {
             this.scene.remove(mesh);
             mesh.geometry.dispose();
-            mesh.material.dispose();
+            // 网格化的瓦片使用材质数组
+            [].concat(mesh.material).forEach(material => material.dispose());
         });
         this.blockMeshes = [];
+        this.tileManifest = null;
+        this.tileStates.clear();
+        this.tileQueue = [];
     }
     
     fitCameraToMap() {
-        if (!this.mapData || !this.blockMeshes.length) return;
+        if (!this.mapData) return;
 
-        // 计算场景边界
+        // 计算场景边界，瓦片模式下使用清单中的包围盒（此时瓦片可能尚未加载）
         const box = new THREE.Box3();
-        this.blockMeshes.forEach(mesh => {
-            box.expandByObject(mesh);
-        });
+        if (this.tileManifest && this.tileManifest.bounds) {
+            const { min, max } = this.tileManifest.bounds;
+            box.set(
+                new THREE.Vector3(min[0], min[1], min[2]),
+                new THREE.Vector3(max[0] + 1, max[1] + 1, max[2] + 1)
+            );
+        } else if (this.blockMeshes.length) {
+            this.blockMeshes.forEach(mesh => {
+                box.expandByObject(mesh);
+            });
+        } else {
+            return;
+        }
 
         const center = box.getCenter(new THREE.Vector3());
         const size = box.getSize(new THREE.Vector3());
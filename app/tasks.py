@@ -10,6 +10,15 @@ from datetime import datetime, timezone
 # 获取当前的Celery实例
 celery = current_app
 
+
+def _report_progress(task, kind, job_id, meta, event='progress'):
+    """更新Celery任务状态，并通过Redis发布进度事件供SSE接口转发"""
+    from app.utils.progress import publish_progress
+
+    if event == 'progress':
+        task.update_state(state='PROGRESS', meta=meta)
+    publish_progress(kind, job_id, event, meta)
+
 @celery.task(bind=True)
 def parse_mca_file_task(self, map_data_id):
     """异步解析MCA文件任务"""
@@ -18,9 +27,10 @@ def parse_mca_file_task(self, map_data_id):
         from app.models.map_data import MapData
         from app.services.mca_parser import MCAParser
         from app.utils.logging_config import log_info, log_error
+        from app.utils.cache import invalidate_map_cache
 
         # 更新任务状态
-        self.update_state(state='PROGRESS', meta={'step': '开始解析', 'progress': 0})
+        _report_progress(self, 'map', map_data_id, {'step': '开始解析', 'progress': 0})
 
         # 获取地图数据
         map_data = MapData.query.get(map_data_id)
@@ -31,12 +41,14 @@ def parse_mca_file_task(self, map_data_id):
         map_data.parse_status = 'parsing'
         map_data.parse_progress = 0.0
         db.session.commit()
+        # 重新解析会替换方块存储和派生产物，旧版本的缓存和ETag不能再用于条件请求
+        invalidate_map_cache(map_data_id)
 
         # 创建��析器
         parser = MCAParser()
 
         # 更新进度
-        self.update_state(state='PROGRESS', meta={'step': '开始解析MCA文件', 'progress': 20})
+        _report_progress(self, 'map', map_data_id, {'step': '开始解析MCA文件', 'progress': 20})
 
         # 解析文件
         result = parser.parse_file(map_data.file_path, map_data_id)
@@ -55,8 +67,16 @@ def parse_mca_file_task(self, map_data_id):
                 map_data.statistics = result['statistics']
 
             db.session.commit()
+            invalidate_map_cache(map_data_id)
 
             log_info(f"MCA文件解析完成: {map_data.filename}")
+            _report_progress(self, 'map', map_data_id, {'step': '解析完成', 'progress': 100}, event='completed')
+
+            # 排队缓存预热，让第一次打开地图直接命中缓存
+            try:
+                warm_map_cache_task.delay(map_data_id)
+            except Exception as e:
+                log_error(e, context=f"缓存预热任务排队失败: {map_data_id}")
 
             return {
                 'success': True,
@@ -71,6 +91,7 @@ def parse_mca_file_task(self, map_data_id):
             error_msg = result.get('error', '未知错误')
             map_data.error_message = error_msg
             db.session.commit()
+            invalidate_map_cache(map_data_id)
 
             log_error(f"MCA文件解析失败: {map_data.filename}, 错误: {error_msg}")
 
@@ -85,11 +106,13 @@ def parse_mca_file_task(self, map_data_id):
                 map_data.parse_progress = 0.0
                 map_data.error_message = str(e)
                 db.session.commit()
+                invalidate_map_cache(map_data_id)
         except:
             pass
 
         error_msg = f"解析任务异常: {str(e)}"
         log_error(f"{error_msg}\n{traceback.format_exc()}")
+        _report_progress(self, 'map', map_data_id, {'error': error_msg}, event='failed')
 
         # 更新任务状态
         self.update_state(
@@ -103,6 +126,30 @@ def parse_mca_file_task(self, map_data_id):
         raise Exception(error_msg)
 
 
+@celery.task(bind=True)
+def warm_map_cache_task(self, map_data_id):
+    """解析完成后预热地图缓存任务"""
+    try:
+        from app.services.cache_warmer import CacheWarmer
+        from app.utils.logging_config import log_info, log_error
+
+        self.update_state(state='PROGRESS', meta={'step': '开始预热缓存', 'progress': 0})
+
+        result = CacheWarmer().warm(map_data_id)
+
+        log_info(f"地图缓存预热完成: {map_data_id}", {
+            'warmed': result.get('warmed', []),
+            'errors': result.get('errors', [])
+        })
+
+        return result
+
+    except Exception as e:
+        error_msg = f"缓存预热任务异常: {str(e)}"
+        log_error(f"{error_msg}\n{traceback.format_exc()}")
+        raise Exception(error_msg)
+
+
 @celery.task(bind=True)
 def train_model_task(self, training_job_id):
     """异步训练模型任务"""
@@ -113,7 +160,7 @@ def train_model_task(self, training_job_id):
         from app.utils.logging_config import log_info, log_error
 
         # 更新任务状态
-        self.update_state(state='PROGRESS', meta={'step': '开始训练', 'progress': 0})
+        _report_progress(self, 'training', training_job_id, {'step': '开始训练', 'progress': 0})
 
         # 获取训练任务
         training_job = TrainingJob.query.get(training_job_id)
@@ -139,7 +186,7 @@ def train_model_task(self, training_job_id):
             if loss is not None:
                 meta['loss'] = loss
 
-            self.update_state(state='PROGRESS', meta=meta)
+            _report_progress(self, 'training', training_job_id, meta)
 
             # 更新数据库中的进度
             training_job.progress = progress
@@ -164,6 +211,9 @@ def train_model_task(self, training_job_id):
             db.session.commit()
 
             log_info(f"模型训练完成: 任务ID {training_job_id}")
+            _report_progress(self, 'training', training_job_id, {
+                'step': '训练完成', 'progress': 100, 'final_loss': result.get('final_loss', 0.0)
+            }, event='completed')
 
             return {
                 'success': True,
@@ -198,6 +248,7 @@ def train_model_task(self, training_job_id):
 
         error_msg = f"训练任务异常: {str(e)}"
         log_error(f"{error_msg}\n{traceback.format_exc()}")
+        _report_progress(self, 'training', training_job_id, {'error': error_msg}, event='failed')
 
         # 更新任务状态
         self.update_state(
@@ -219,7 +270,7 @@ def generate_map_task(self, prompt, parameters=None):
         from app.utils.logging_config import log_info, log_error
 
         # 更新任务状态
-        self.update_state(state='PROGRESS', meta={'step': '开始生成', 'progress': 0})
+        _report_progress(self, 'task', self.request.id, {'step': '开始生成', 'progress': 0})
 
         # 创建地图生成器
         generator = MapGenerator()
@@ -231,7 +282,7 @@ def generate_map_task(self, prompt, parameters=None):
                 'step': current_step_name or f'生成步骤 {step}/{total_steps}',
                 'progress': progress
             }
-            self.update_state(state='PROGRESS', meta=meta)
+            _report_progress(self, 'task', self.request.id, meta)
 
         # 开始生成
         result = generator.generate(
@@ -242,6 +293,9 @@ def generate_map_task(self, prompt, parameters=None):
 
         if result.get('success', False):
             log_info(f"地图生成完成: {prompt}")
+            _report_progress(self, 'task', self.request.id, {
+                'step': '生成完成', 'progress': 100, 'file_path': result.get('file_path', '')
+            }, event='completed')
 
             return {
                 'success': True,
@@ -257,6 +311,7 @@ def generate_map_task(self, prompt, parameters=None):
     except Exception as e:
         error_msg = f"生成任务异常: {str(e)}"
         log_error(f"{error_msg}\n{traceback.format_exc()}")
+        _report_progress(self, 'task', self.request.id, {'error': error_msg}, event='failed')
 
         # 更新任务状态
         self.update_state(
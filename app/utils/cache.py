@@ -7,19 +7,67 @@ import pickle
 import hashlib
 import os
 import shutil
-from datetime import datetime, timedelta
+import threading
+import time
+import weakref
 from functools import wraps
-from flask import current_app
+from urllib.parse import urlencode
+from flask import current_app, request, has_request_context
 import redis
+from app.utils.file_cache import FileCacheTier
+from app.utils.json_provider import RawJSON
 from typing import Any, Optional, Union
 
+class CacheLock:
+    """锁的统一封装，兼容Redis锁和threading.Lock"""
+
+    def __init__(self, lock, blocking_timeout: float = 10, is_local: bool = False):
+        self._lock = lock
+        self._blocking_timeout = blocking_timeout
+        self._is_local = is_local
+        self.acquired = False
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """获取锁，blocking=False时立即返回"""
+        try:
+            if self._is_local:
+                self.acquired = self._lock.acquire(blocking, self._blocking_timeout if blocking else -1)
+            else:
+                self.acquired = bool(self._lock.acquire(blocking=blocking))
+        except Exception:
+            self.acquired = False
+        return self.acquired
+
+    def release(self):
+        """释放锁（锁已过期时忽略）"""
+        if not self.acquired:
+            return
+        try:
+            self._lock.release()
+        except Exception:
+            pass
+        self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
 class CacheManager:
     """缓存管理器"""
 
+    # 标签集合的最短保留时间（秒），每次写入都会续期
+    TAG_TTL = 24 * 3600
+
     def __init__(self, app=None):
         self.app = app
         self.redis_client = None
         self.file_cache_dir = None
+        self.file_cache = None
+        self._local_locks = weakref.WeakValueDictionary()
+        self._local_locks_guard = threading.Lock()
 
         if app is not None:
             self.init_app(app)
@@ -39,9 +87,13 @@ class CacheManager:
             app.logger.warning(f"Redis连接失败，将使用文件缓存: {e}")
             self.redis_client = None
 
-        # 配置文件缓存
+        # 配置文件缓存（分片目录 + SQLite索引）
         self.file_cache_dir = os.path.join(app.instance_path, 'cache')
-        os.makedirs(self.file_cache_dir, exist_ok=True)
+        self.file_cache = FileCacheTier(
+            self.file_cache_dir,
+            max_bytes=app.config.get('FILE_CACHE_MAX_BYTES', 1024 * 1024 * 1024),
+            shard_depth=app.config.get('FILE_CACHE_SHARD_DEPTH', 2)
+        )
 
     def _get_cache_key(self, key: str, prefix: str = "craftne") -> str:
         """生成缓存键"""
@@ -67,20 +119,59 @@ class CacheManager:
             except Exception:
                 return data
 
-    def set(self, key: str, value: Any, expire: int = 3600) -> bool:
-        """设置缓存"""
+    def _get_tag_key(self, tag: str) -> str:
+        """生成标签集合键"""
+        return self._get_cache_key(tag, prefix="craftne:tag")
+
+    def set(self, key: str, value: Any, expire: int = 3600, tags=None) -> bool:
+        """设置缓存，tags中的每个标签都会记录该键以便按标签失效"""
         cache_key = self._get_cache_key(key)
         serialized_value = self._serialize_data(value)
 
         # 优先使用Redis
         if self.redis_client:
             try:
-                return self.redis_client.setex(cache_key, expire, serialized_value)
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.setex(cache_key, expire, serialized_value)
+                for tag in tags or ():
+                    tag_key = self._get_tag_key(tag)
+                    pipe.sadd(tag_key, cache_key)
+                    pipe.expire(tag_key, max(expire, self.TAG_TTL))
+                return bool(pipe.execute()[0])
             except Exception as e:
                 current_app.logger.warning(f"Redis设置缓存失败: {e}")
 
         # 降级到文件缓存
-        return self._set_file_cache(cache_key, serialized_value, expire)
+        return self._set_file_cache(cache_key, serialized_value, expire, tags)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """删除登记在这些标签下的所有缓存，不做键空间扫描"""
+        if not tags:
+            return 0
+
+        deleted = 0
+        if self.redis_client:
+            try:
+                tag_keys = [self._get_tag_key(tag) for tag in tags]
+
+                pipe = self.redis_client.pipeline(transaction=False)
+                for tag_key in tag_keys:
+                    pipe.smembers(tag_key)
+                members = set().union(*pipe.execute())
+
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.unlink(*members, *tag_keys)
+                deleted += pipe.execute()[0]
+            except Exception as e:
+                current_app.logger.warning(f"Redis按标签失效缓存失败: {e}")
+
+        if self.file_cache is not None:
+            try:
+                deleted += self.file_cache.delete_tags(tags)
+            except Exception as e:
+                current_app.logger.warning(f"文件缓存按标签失效失败: {e}")
+
+        return deleted
 
     def get(self, key: str) -> Optional[Any]:
         """获取缓存"""
@@ -130,142 +221,189 @@ class CacheManager:
         # 文件缓存检查
         return self._exists_file_cache(cache_key)
 
-    def _set_file_cache(self, key: str, value: str, expire: int) -> bool:
-        """设置文件缓存"""
-        try:
-            cache_file = os.path.join(self.file_cache_dir, f"{hashlib.md5(key.encode()).hexdigest()}.cache")
-            cache_data = {
-                'value': value,
-                'expire_time': (datetime.now() + timedelta(seconds=expire)).timestamp()
-            }
+    def lock(self, name: str, timeout: int = 30, blocking_timeout: float = 10) -> 'CacheLock':
+        """获取分布式锁（Redis不可用时退化为进程内锁）"""
+        lock_key = self._get_cache_key(name, prefix="craftne:lock")
+
+        if self.redis_client:
+            try:
+                return CacheLock(
+                    self.redis_client.lock(lock_key, timeout=timeout, blocking_timeout=blocking_timeout),
+                    blocking_timeout
+                )
+            except Exception as e:
+                current_app.logger.warning(f"Redis锁创建失败: {e}")
 
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f)
+        with self._local_locks_guard:
+            local_lock = self._local_locks.get(lock_key)
+            if local_lock is None:
+                local_lock = threading.Lock()
+                self._local_locks[lock_key] = local_lock
+        return CacheLock(local_lock, blocking_timeout, is_local=True)
 
-            return True
-        except Exception as e:
-            current_app.logger.warning(f"文件缓存设置失败: {e}")
+    def _set_file_cache(self, key: str, value: str, expire: int, tags=None) -> bool:
+        """设置文件缓存"""
+        if self.file_cache is None:
             return False
+        return self.file_cache.set(key, value, expire, tags)
 
     def _get_file_cache(self, key: str) -> Optional[Any]:
         """获取文件缓存"""
-        try:
-            cache_file = os.path.join(self.file_cache_dir, f"{hashlib.md5(key.encode()).hexdigest()}.cache")
-
-            if not os.path.exists(cache_file):
-                return None
-
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-
-            # 检查是否过期
-            if datetime.now().timestamp() > cache_data['expire_time']:
-                os.remove(cache_file)
-                return None
-
-            return self._deserialize_data(cache_data['value'])
-
-        except Exception as e:
-            current_app.logger.warning(f"文件缓存获取失败: {e}")
+        if self.file_cache is None:
+            return None
+        value = self.file_cache.get(key)
+        if value is None:
             return None
+        return self._deserialize_data(value)
 
     def _delete_file_cache(self, key: str) -> bool:
         """删除文件缓存"""
-        try:
-            cache_file = os.path.join(self.file_cache_dir, f"{hashlib.md5(key.encode()).hexdigest()}.cache")
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-                return True
-        except Exception as e:
-            current_app.logger.warning(f"文件缓存删除失败: {e}")
-        return False
+        if self.file_cache is None:
+            return False
+        return self.file_cache.delete(key)
 
     def _exists_file_cache(self, key: str) -> bool:
         """检查文件缓存是否存在"""
-        try:
-            cache_file = os.path.join(self.file_cache_dir, f"{hashlib.md5(key.encode()).hexdigest()}.cache")
-
-            if not os.path.exists(cache_file):
-                return False
-
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-
-            # 检查是否过期
-            if datetime.now().timestamp() > cache_data['expire_time']:
-                os.remove(cache_file)
-                return False
-
-            return True
-
-        except Exception:
+        if self.file_cache is None:
             return False
+        return self.file_cache.exists(key)
 
     def clear_expired(self):
         """清理过期的文件缓存"""
+        if self.file_cache is None:
+            return
         try:
-            for filename in os.listdir(self.file_cache_dir):
-                if filename.endswith('.cache'):
-                    cache_file = os.path.join(self.file_cache_dir, filename)
-                    try:
-                        with open(cache_file, 'r', encoding='utf-8') as f:
-                            cache_data = json.load(f)
-
-                        if datetime.now().timestamp() > cache_data['expire_time']:
-                            os.remove(cache_file)
-                    except Exception:
-                        # 如果文件损坏，直接删除
-                        os.remove(cache_file)
+            removed = self.file_cache.clear_expired()
+            current_app.logger.info(f"已清理 {removed} 个过期文件缓存")
         except Exception as e:
             current_app.logger.warning(f"清理过期缓存失败: {e}")
 
-    def delete_map_cache(map_id: int):
-        """删除地图相关的所有缓存数据"""
-        try:
-            # 删除文件缓存
-            cache_dir = current_app.config.get('CACHE_DIR', 'instance/cache')
-            map_cache_dir = os.path.join(cache_dir, f'map_{map_id}')
-            if os.path.exists(map_cache_dir):
-                shutil.rmtree(map_cache_dir)
-                current_app.logger.info(f"已删除地图 {map_id} 的缓存目录: {map_cache_dir}")
-
-            # 删除Redis缓存（如果有）
-            try:
-                redis_url = current_app.config.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-                redis_client = redis.from_url(redis_url, decode_responses=True)
-
-                # 删除相关的缓存键
-                keys_to_delete = [
-                    f"craftne:map_{map_id}:*",
-                    f"craftne:blocks_{map_id}",
-                    f"craftne:stats_{map_id}",
-                    f"craftne:threejs_{map_id}"
-                ]
-
-                for pattern in keys_to_delete:
-                    if '*' in pattern:
-                        # 使用模式匹配删除
-                        keys = redis_client.keys(pattern)
-                        if keys:
-                            redis_client.delete(*keys)
-                    else:
-                        redis_client.delete(pattern)
-
-                current_app.logger.info(f"已删除地图 {map_id} 的Redis缓存")
-
-            except Exception as e:
-                current_app.logger.warning(f"删除Redis缓存失败: {str(e)}")
-
-        except Exception as e:
-            current_app.logger.error(f"删除地图缓存失败: {str(e)}")
-            raise
-
 
 # 全局缓存管理器实例
 cache_manager = CacheManager()
 
-def cache_result(key_func=None, expire=3600):
-    """缓存结果装饰器"""
+def map_cache_tags(map_id: int) -> list:
+    """地图变更时需要失效的标签：地图本身、地图列表和统计"""
+    return [f"map:{map_id}", "maps:list", "stats"]
+
+def invalidate_map_cache(map_id: int) -> int:
+    """地图状态、解析结果或标注变化后失效相关缓存"""
+    return cache_manager.invalidate_tags(*map_cache_tags(map_id))
+
+def delete_map_cache(map_id: int):
+    """删除地图相关的所有缓存数据"""
+    try:
+        # 删除地图的缓存目录
+        cache_dir = current_app.config.get('CACHE_DIR', 'instance/cache')
+        map_cache_dir = os.path.join(cache_dir, f'map_{map_id}')
+        if os.path.exists(map_cache_dir):
+            shutil.rmtree(map_cache_dir)
+            current_app.logger.info(f"已删除地图 {map_id} 的缓存目录: {map_cache_dir}")
+
+        deleted = invalidate_map_cache(map_id)
+        current_app.logger.info(f"已删除地图 {map_id} 的 {deleted} 个缓存条目")
+
+    except Exception as e:
+        current_app.logger.error(f"删除地图缓存失败: {str(e)}")
+        raise
+
+def make_cache_key(func_name: str, args=(), kwargs=None, path: str = None,
+                   query: str = None, vary_values=None) -> str:
+    """生成视图缓存键：函数名 + 参数 + 请求路径 + 规范化查询串 + Vary请求头"""
+    key_parts = [func_name]
+    key_parts.extend(str(arg) for arg in args)
+    key_parts.extend(f"{k}:{v}" for k, v in sorted((kwargs or {}).items()))
+
+    if path is not None:
+        key_parts.append(path)
+    if query:
+        key_parts.append(query)
+    if vary_values:
+        key_parts.extend(f"{name.lower()}={value}" for name, value in vary_values)
+
+    return f"{func_name}:{hashlib.md5(':'.join(key_parts).encode()).hexdigest()}"
+
+def normalize_query_string(args) -> str:
+    """规范化查询参数：按键和值排序，忽略空值"""
+    items = sorted((k, v) for k, v in args.items(multi=True) if v != '')
+    return urlencode(items)
+
+def _request_cache_key(func, args, kwargs, vary) -> str:
+    """根据当前请求生成缓存键"""
+    if not has_request_context():
+        return make_cache_key(func.__name__, args, kwargs)
+
+    vary_values = [(name, request.headers.get(name, '')) for name in (vary or ())]
+    return make_cache_key(
+        func.__name__, args, kwargs,
+        path=request.path,
+        query=normalize_query_string(request.args),
+        vary_values=vary_values
+    )
+
+def _is_cacheable(result) -> bool:
+    """
+    只缓存成功结果，(data, status_code) 形式的错误响应不缓存
+
+    data 为 RawJSON 的结果直接来自磁盘产物，本身已是缓存，再存一份只会多一次解码
+    """
+    if result is None or isinstance(result, tuple):
+        return False
+    if isinstance(result, dict) and result.get('success') is False:
+        return False
+    if isinstance(result, dict) and isinstance(result.get('data'), RawJSON):
+        return False
+    return True
+
+def _resolve_tags(tags, args, kwargs) -> list:
+    """展开标签模板，例如 'map:{map_id}' 使用视图参数填充"""
+    if callable(tags):
+        return list(tags(*args, **kwargs))
+    return [tag.format(*args, **kwargs) for tag in tags or ()]
+
+def _store_result(cache_key, result, expire, stale_ttl, tags=None):
+    """写入缓存，启用stale_ttl时包装新鲜期信息"""
+    if not _is_cacheable(result):
+        return
+    if stale_ttl:
+        envelope = {'__swr__': True, 'fresh_until': time.time() + expire, 'value': result}
+        cache_manager.set(cache_key, envelope, expire + stale_ttl, tags)
+    else:
+        cache_manager.set(cache_key, result, expire, tags)
+
+def _refresh_in_background(func, args, kwargs, cache_key, expire, stale_ttl, tags=None):
+    """在后台线程中重新计算过期条目，同一时间只有一个进程执行"""
+    refresh_lock = cache_manager.lock(f"refresh:{cache_key}", timeout=max(expire, 30))
+    if not refresh_lock.acquire(blocking=False):
+        return
+
+    app = current_app._get_current_object()
+    environ = dict(request.environ) if has_request_context() else None
+
+    def refresh():
+        ctx = app.request_context(environ) if environ is not None else app.app_context()
+        try:
+            with ctx:
+                _store_result(cache_key, func(*args, **kwargs), expire, stale_ttl, tags)
+        except Exception as e:
+            app.logger.warning(f"后台刷新缓存失败 {cache_key}: {e}")
+        finally:
+            refresh_lock.release()
+
+    threading.Thread(target=refresh, name=f"cache-refresh-{func.__name__}", daemon=True).start()
+
+def cache_result(key_func=None, expire=3600, vary=None, stale_ttl=0, lock_timeout=30, tags=None):
+    """
+    缓存结果装饰器
+
+    Args:
+        key_func: 自定义缓存键函数，提供时忽略请求信息
+        expire: 新鲜期（秒）
+        vary: 参与缓存键的请求头名称列表
+        stale_ttl: 过期后仍可返回旧值的时长（秒），期间由一个进程在后台刷新
+        lock_timeout: 单飞锁的超时时间（秒）
+        tags: 缓存标签模板（如 'map:{map_id}'）或返回标签列表的函数，用于按标签失效
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -273,21 +411,37 @@ def cache_result(key_func=None, expire=3600):
             if key_func:
                 cache_key = key_func(*args, **kwargs)
             else:
-                # 默认使用函数名和参数生成键
-                key_parts = [func.__name__]
-                key_parts.extend(str(arg) for arg in args)
-                key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
-                cache_key = hashlib.md5(":".join(key_parts).encode()).hexdigest()
+                cache_key = _request_cache_key(func, args, kwargs, vary)
+
+            cache_tags = _resolve_tags(tags, args, kwargs)
 
             # 尝试从缓存获取
             cached_result = cache_manager.get(cache_key)
             if cached_result is not None:
-                return cached_result
-
-            # 执行函数并缓存结果
-            result = func(*args, **kwargs)
-            cache_manager.set(cache_key, result, expire)
+                if not (isinstance(cached_result, dict) and cached_result.get('__swr__')):
+                    return cached_result
+                if time.time() >= cached_result['fresh_until']:
+                    _refresh_in_background(func, args, kwargs, cache_key, expire, stale_ttl, cache_tags)
+                return cached_result['value']
+
+            # 单飞：只有拿到锁的进程计算，其余进程等待后直接读缓存
+            with cache_manager.lock(f"fill:{cache_key}", timeout=lock_timeout,
+                                    blocking_timeout=lock_timeout) as fill_lock:
+                if fill_lock.acquired:
+                    cached_result = cache_manager.get(cache_key)
+                    if cached_result is not None:
+                        if isinstance(cached_result, dict) and cached_result.get('__swr__'):
+                            return cached_result['value']
+                        return cached_result
+
+                # 执行函数并缓存结果
+                result = func(*args, **kwargs)
+                _store_result(cache_key, result, expire, stale_ttl, cache_tags)
 
             return result
+
+        # functools.wraps 会把该属性复制到外层装饰器上，
+        # 预热等场景可以绕过日志/响应包装直接调用缓存层
+        wrapper.cached_view = wrapper
         return wrapper
     return decorator
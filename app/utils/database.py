@@ -0,0 +1,100 @@
+"""
+数据库连接配置模块
+SQLite：启用 WAL、synchronous=NORMAL、内存映射和忙等待，后台任务写入时 Web 请求仍可并发读取；
+服务器数据库（PostgreSQL / MySQL）：配置连接池大小、回收时间和取用前检测。
+"""
+
+import functools
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def is_sqlite(database_uri: str) -> bool:
+    return make_url(database_uri).get_backend_name() == 'sqlite'
+
+
+def _is_memory_database(database_uri: str) -> bool:
+    database = make_url(database_uri).database
+    return not database or database == ':memory:' or 'mode=memory' in database_uri
+
+
+def sqlite_pragmas(config) -> List[Tuple[str, object]]:
+    """每个新连接上执行的 PRAGMA（按顺序）"""
+    return [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT', 5000))),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('cache_size', int(config.get('SQLITE_CACHE_SIZE', -64000))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def engine_options(config) -> Dict:
+    """
+    生成 SQLALCHEMY_ENGINE_OPTIONS，已显式配置的项保持不变
+
+    Args:
+        config: 应用配置
+
+    Returns:
+        传给 create_engine 的参数
+    """
+    database_uri = config['SQLALCHEMY_DATABASE_URI']
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if is_sqlite(database_uri):
+        connect_args = dict(options.get('connect_args') or {})
+        # 驱动层的等待时间（秒），与 busy_timeout 一致
+        connect_args.setdefault('timeout', int(config.get('SQLITE_BUSY_TIMEOUT', 5000)) / 1000)
+        connect_args.setdefault('check_same_thread', False)
+        options['connect_args'] = connect_args
+    else:
+        options.setdefault('pool_size', int(config.get('DB_POOL_SIZE', 10)))
+        options.setdefault('max_overflow', int(config.get('DB_MAX_OVERFLOW', 20)))
+        options.setdefault('pool_timeout', int(config.get('DB_POOL_TIMEOUT', 30)))
+        options.setdefault('pool_recycle', int(config.get('DB_POOL_RECYCLE', 1800)))
+        options.setdefault('pool_pre_ping', True)
+
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record, pragmas, memory):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            # 内存数据库不支持 WAL
+            if memory and name in ('journal_mode', 'mmap_size'):
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_database(app, db):
+    """代替 db.init_app：先写入引擎参数，引擎创建后为 SQLite 连接注册 PRAGMA"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite':
+                continue
+            event.listen(engine, 'connect', functools.partial(
+                _apply_sqlite_pragmas, pragmas=pragmas, memory=_is_memory_database(str(engine.url))
+            ))
+
+
+def database_settings(connection) -> Dict:
+    """读取当前连接生效的设置，用于系统状态展示"""
+    if connection.dialect.name != 'sqlite':
+        pool = connection.engine.pool
+        return {'dialect': connection.dialect.name, 'pool': pool.status()}
+
+    settings = {'dialect': 'sqlite'}
+    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+        settings[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
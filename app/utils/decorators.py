@@ -3,34 +3,40 @@
 """
 
 import time
+import hmac
 import functools
 from flask import jsonify, request, current_app
 from app.utils.logging_config import log_performance, log_user_action, log_error
+from app.utils.metrics import metrics
 
 def monitor_performance(operation_name=None):
     """性能监控装饰器"""
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             operation = operation_name or f"{func.__module__}.{func.__name__}"
 
             try:
                 result = func(*args, **kwargs)
-                duration = time.time() - start_time
-
-                # 记录性能日志
-                extra_data = {
-                    'function': func.__name__,
-                    'args_count': len(args),
-                    'kwargs_count': len(kwargs)
-                }
-                log_performance(operation, duration, extra_data)
+                duration = time.perf_counter() - start_time
+                metrics.observe('craftne_operation_duration_seconds', duration, {'operation': operation})
+
+                # 逐次的性能日志默认关闭，耗时分布见 /metrics
+                if current_app.config.get('PERFORMANCE_LOG_ENABLED', False):
+                    extra_data = {
+                        'function': func.__name__,
+                        'args_count': len(args),
+                        'kwargs_count': len(kwargs)
+                    }
+                    log_performance(operation, duration, extra_data)
 
                 return result
 
             except Exception as e:
-                duration = time.time() - start_time
+                duration = time.perf_counter() - start_time
+                metrics.observe('craftne_operation_duration_seconds', duration, {'operation': operation})
+                metrics.inc('craftne_operation_errors_total', {'operation': operation})
                 log_error(e, context=f"性能监控中的错误 - 操作: {operation}, 耗时: {duration:.3f}s")
                 raise
 
@@ -208,3 +214,36 @@ def require_file_upload(allowed_extensions=None):
             return func(*args, **kwargs)
         return wrapper
     return decorator
+
+def has_admin_token():
+    """请求头 X-Admin-Token 与 ADMIN_TOKEN 配置一致；未配置 ADMIN_TOKEN 时只在调试模式下放行"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        return current_app.debug
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+def require_admin_token():
+    """管理接口验证装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not has_admin_token():
+                return jsonify({
+                    'success': False,
+                    'error': '需要管理员令牌',
+                    'code': 'ADMIN_REQUIRED'
+                }), 403
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def alternate_format(format_name, handler):
+    """按 ?format= 参数切换到其他处理函数（如流式输出），跳过内层的缓存和响应包装"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.args.get('format') == format_name:
+                return handler(*args, **kwargs)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,292 @@
+"""
+分片文件缓存层
+
+缓存条目按键哈希前缀分片存放在 ``<cache_dir>/ab/cd/<hash>.cache``，
+过期时间、大小和最近访问时间保存在 SQLite 索引中，
+因此检查过期、清理过期和按容量淘汰都不需要打开缓存文件。
+写入先落到同目录的临时文件再 ``os.replace``，并发进程不会读到半截文件。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FileCacheTier:
+    """基于分片目录和SQLite索引的文件缓存"""
+
+    INDEX_FILENAME = 'index.sqlite3'
+
+    # 访问时间的更新间隔（秒），避免每次读取都写索引
+    TOUCH_INTERVAL = 30
+
+    # 淘汰后保留的容量比例，避免每次写入都触发淘汰
+    EVICT_LOW_WATERMARK = 0.9
+
+    # 淘汰时每批从索引读取的条目数
+    EVICT_BATCH_SIZE = 256
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024, shard_depth: int = 2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.shard_depth = shard_depth
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILENAME)
+        self._local = threading.local()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._init_index()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的索引连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_index(self):
+        """创建索引表"""
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key_hash TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' expire_time REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_expire_time ON entries (expire_time)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tags ('
+            ' tag TEXT NOT NULL,'
+            ' key_hash TEXT NOT NULL,'
+            ' PRIMARY KEY (tag, key_hash))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_tags_key_hash ON tags (key_hash)')
+
+        # 缓存总字节数由触发器随 entries 的增删改维护，容量检查只读一行，不必对索引求和
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS usage ('
+                ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+                ' total_bytes INTEGER NOT NULL)'
+            )
+            conn.execute(
+                'INSERT OR IGNORE INTO usage (id, total_bytes) SELECT 1, COALESCE(SUM(size), 0) FROM entries'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS tr_entries_insert AFTER INSERT ON entries BEGIN'
+                ' UPDATE usage SET total_bytes = total_bytes + new.size WHERE id = 1; END'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS tr_entries_delete AFTER DELETE ON entries BEGIN'
+                ' UPDATE usage SET total_bytes = total_bytes - old.size WHERE id = 1; END'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS tr_entries_update AFTER UPDATE OF size ON entries BEGIN'
+                ' UPDATE usage SET total_bytes = total_bytes + new.size - old.size WHERE id = 1; END'
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _hash_key(key: str) -> str:
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def _path_for(self, key_hash: str) -> str:
+        """根据哈希前缀计算分片路径"""
+        shards = [key_hash[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.cache_dir, *shards, f"{key_hash}.cache")
+
+    def set(self, key: str, value: str, expire: int, tags=None) -> bool:
+        """原子写入缓存条目，可同时登记到若干标签下"""
+        key_hash = self._hash_key(key)
+        cache_file = self._path_for(key_hash)
+        data = value.encode('utf-8')
+
+        try:
+            shard_dir = os.path.dirname(cache_file)
+            os.makedirs(shard_dir, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(dir=shard_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, cache_file)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            now = time.time()
+            conn = self._connect()
+            # 用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 隐式删除旧行时不触发删除触发器
+            conn.execute(
+                'INSERT INTO entries (key_hash, size, expire_time, last_access) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (key_hash) DO UPDATE SET'
+                ' size = excluded.size, expire_time = excluded.expire_time, last_access = excluded.last_access',
+                (key_hash, len(data), now + expire, now)
+            )
+            if tags:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO tags (tag, key_hash) VALUES (?, ?)',
+                    [(tag, key_hash) for tag in tags]
+                )
+
+            self._evict_if_needed()
+            return True
+
+        except Exception as e:
+            logger.warning(f"文件缓存设置失败: {e}")
+            return False
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存条目，过期或不存在时返回None"""
+        key_hash = self._hash_key(key)
+
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT expire_time, last_access FROM entries WHERE key_hash = ?', (key_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            expire_time, last_access = row
+            if now > expire_time:
+                self._remove(key_hash)
+                return None
+
+            try:
+                with open(self._path_for(key_hash), 'rb') as f:
+                    value = f.read().decode('utf-8')
+            except FileNotFoundError:
+                # 索引与文件不一致时以文件为准
+                self._remove(key_hash)
+                return None
+
+            if now - last_access > self.TOUCH_INTERVAL:
+                conn.execute('UPDATE entries SET last_access = ? WHERE key_hash = ?', (now, key_hash))
+
+            return value
+
+        except Exception as e:
+            logger.warning(f"文件缓存获取失败: {e}")
+            return None
+
+    def delete(self, key: str) -> bool:
+        """删除缓存条目"""
+        try:
+            return self._remove(self._hash_key(key))
+        except Exception as e:
+            logger.warning(f"文件缓存删除失败: {e}")
+            return False
+
+    def delete_tags(self, tags) -> int:
+        """删除登记在任一标签下的所有条目，返回删除数量"""
+        tags = list(tags)
+        if not tags:
+            return 0
+
+        conn = self._connect()
+        placeholders = ','.join('?' * len(tags))
+        rows = conn.execute(
+            f'SELECT DISTINCT key_hash FROM tags WHERE tag IN ({placeholders})', tags
+        ).fetchall()
+
+        for (key_hash,) in rows:
+            self._remove(key_hash)
+        conn.execute(f'DELETE FROM tags WHERE tag IN ({placeholders})', tags)
+
+        return len(rows)
+
+    def exists(self, key: str) -> bool:
+        """检查缓存条目是否存在且未过期（只查索引）"""
+        try:
+            row = self._connect().execute(
+                'SELECT 1 FROM entries WHERE key_hash = ? AND expire_time >= ?',
+                (self._hash_key(key), time.time())
+            ).fetchone()
+            return row is not None
+        except Exception:
+            return False
+
+    def clear_expired(self) -> int:
+        """清理过期条目，返回清理数量"""
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT key_hash FROM entries WHERE expire_time < ?', (time.time(),)
+        ).fetchall()
+
+        for (key_hash,) in rows:
+            self._remove(key_hash)
+
+        self._remove_legacy_files()
+        return len(rows)
+
+    def total_size(self) -> int:
+        """索引中记录的缓存总字节数"""
+        row = self._connect().execute('SELECT total_bytes FROM usage WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+    def _remove(self, key_hash: str) -> bool:
+        """删除条目的文件和索引"""
+        conn = self._connect()
+        conn.execute('DELETE FROM entries WHERE key_hash = ?', (key_hash,))
+        conn.execute('DELETE FROM tags WHERE key_hash = ?', (key_hash,))
+        try:
+            os.remove(self._path_for(key_hash))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict_if_needed(self):
+        """超出容量预算时按最近最少使用淘汰"""
+        if not self.max_bytes:
+            return
+
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * self.EVICT_LOW_WATERMARK)
+        conn = self._connect()
+        evicted = 0
+
+        # 按 last_access 索引分批取最旧的条目，不把整个索引读入内存
+        while total > target:
+            batch = conn.execute(
+                'SELECT key_hash, size FROM entries ORDER BY last_access LIMIT ?', (self.EVICT_BATCH_SIZE,)
+            ).fetchall()
+            if not batch:
+                break
+            for key_hash, size in batch:
+                if total <= target:
+                    break
+                self._remove(key_hash)
+                total -= size
+                evicted += 1
+
+        logger.info(f"文件缓存超出容量预算，已淘汰 {evicted} 个条目")
+
+    def _remove_legacy_files(self):
+        """清理旧版平铺在缓存根目录下的 .cache 文件"""
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    continue
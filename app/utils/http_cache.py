@@ -0,0 +1,112 @@
+"""
+HTTP条件请求模块
+为地图相关接口生成强ETag并处理 If-None-Match，命中时直接返回304
+"""
+
+import functools
+import hashlib
+from typing import Dict, Optional
+
+from flask import request, make_response, current_app
+
+from app.utils.cache import cache_manager, normalize_query_string
+
+# 版本令牌缓存时间（秒），地图变化时通过 map:{id} 标签失效
+VERSION_TOKEN_EXPIRE = 24 * 3600
+
+# 各类接口的默认缓存策略
+CACHE_CONTROL_ARTIFACT = 'public, max-age=60, must-revalidate'
+CACHE_CONTROL_RECORD = 'private, no-cache'
+
+
+def _version_token_key(map_id: int) -> str:
+    return f"map_version:{map_id}"
+
+
+def map_version_token(map_id: int) -> Optional[Dict[str, str]]:
+    """
+    获取地图版本令牌
+
+    返回 {'artifact': ..., 'record': ...}：
+    artifact 只随解析产物变化（parsed_at、解析状态），
+    record 还包含 updated_at 和标注数量/最后修改时间。
+    令牌缓存在缓存层中，命中时不访问数据库。
+    """
+    cache_key = _version_token_key(map_id)
+    token = cache_manager.get(cache_key)
+    if token is not None:
+        return token
+
+    from app import db
+    from app.models.map_data import MapData
+    from app.models.annotation import Annotation
+
+    row = db.session.query(
+        MapData.parse_status, MapData.parsed_at, MapData.updated_at
+    ).filter(MapData.id == map_id).first()
+    if row is None:
+        return None
+
+    annotation_count, annotation_updated_at = db.session.query(
+        db.func.count(Annotation.id), db.func.max(Annotation.updated_at)
+    ).filter(Annotation.map_data_id == map_id).one()
+
+    parse_status, parsed_at, updated_at = row
+    artifact = f"{parse_status}:{parsed_at.isoformat() if parsed_at else ''}"
+    token = {
+        'artifact': artifact,
+        'record': (
+            f"{artifact}:{updated_at.isoformat() if updated_at else ''}:"
+            f"{annotation_count}:{annotation_updated_at.isoformat() if annotation_updated_at else ''}"
+        )
+    }
+
+    cache_manager.set(cache_key, token, VERSION_TOKEN_EXPIRE, tags=[f"map:{map_id}"])
+    return token
+
+
+def build_etag(endpoint: str, map_id: int, version: str) -> str:
+    """由端点、地图ID、其余路由参数、版本和规范化查询串生成强ETag"""
+    view_args = sorted((key, value) for key, value in (request.view_args or {}).items() if key != 'map_id')
+    raw = f"{endpoint}:{map_id}:{view_args}:{version}:{normalize_query_string(request.args)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional_map_response(scope: str = 'record', cache_control: str = CACHE_CONTROL_RECORD):
+    """
+    地图接口条件请求装饰器，需放在最外层
+
+    Args:
+        scope: 'artifact' 只随解析产物变化，'record' 还随地图记录和标注变化
+        cache_control: 响应的 Cache-Control 策略
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            map_id = kwargs.get('map_id')
+
+            try:
+                token = map_version_token(map_id)
+            except Exception as e:
+                current_app.logger.warning(f"获取地图版本令牌失败: {e}")
+                token = None
+
+            # 地图不存在或令牌不可用时交给视图处理
+            if token is None:
+                return func(*args, **kwargs)
+
+            etag = build_etag(request.endpoint, map_id, token[scope])
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = cache_control
+                return response
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+JSON序列化模块
+安装了 orjson 时用它编码响应（比标准库快数倍），否则退回 Flask 默认实现。
+RawJSON 包装已编码好的JSON字节（例如磁盘上缓存的产物），编码时原样拼接到输出中，
+不需要先解码再重新编码。
+"""
+
+import json
+import uuid
+from typing import Any, Dict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时使用标准库
+    orjson = None
+
+
+class RawJSON:
+    """已编码的JSON片段，序列化时原样输出"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data if isinstance(data, bytes) else data.encode('utf-8')
+
+    @classmethod
+    def from_file(cls, path: str) -> 'RawJSON':
+        with open(path, 'rb') as f:
+            return cls(f.read().strip())
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'<RawJSON {len(self.data)} bytes>'
+
+
+class _RawSplicer:
+    """把 RawJSON 替换为唯一占位字符串，编码完成后再换回原始字节"""
+
+    def __init__(self):
+        self.prefix = f"__rawjson_{uuid.uuid4().hex}_"
+        self.fragments: Dict[bytes, bytes] = {}
+
+    def placeholder(self, raw: RawJSON) -> str:
+        token = f"{self.prefix}{len(self.fragments)}__"
+        self.fragments[json.dumps(token).encode('ascii')] = raw.data
+        return token
+
+    def splice(self, encoded: bytes) -> bytes:
+        for token, data in self.fragments.items():
+            encoded = encoded.replace(token, data, 1)
+        return encoded
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider
+
+    与默认实现保持相同的输出约定（键排序、日期为HTTP日期格式），只替换编码器；
+    orjson 无法处理的对象（超出64位的整数等）退回标准库。
+    """
+
+    def __init__(self, app, backend: str = 'auto'):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and backend in ('auto', 'orjson')
+        if backend == 'orjson' and orjson is None:
+            app.logger.warning("JSON_BACKEND=orjson 但未安装 orjson，使用标准库编码")
+
+    @property
+    def backend(self) -> str:
+        return 'orjson' if self.use_orjson else 'stdlib'
+
+    def _orjson_options(self, indent: bool) -> int:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        """编码为UTF-8字节，RawJSON 片段原样拼接"""
+        splicer = _RawSplicer()
+
+        def default(value):
+            if isinstance(value, RawJSON):
+                return splicer.placeholder(value)
+            return self.default(value)
+
+        encoded = None
+        if self.use_orjson:
+            try:
+                encoded = orjson.dumps(obj, default=default, option=self._orjson_options(indent))
+            except TypeError:
+                encoded = None
+                splicer.fragments.clear()
+
+        if encoded is None:
+            encoded = json.dumps(
+                obj, default=default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+                indent=2 if indent else None, separators=None if indent else (',', ':')
+            ).encode('utf-8')
+
+        return splicer.splice(encoded) if splicer.fragments else encoded
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # 调用方指定了编码参数时按标准库语义处理
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
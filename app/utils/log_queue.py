@@ -0,0 +1,201 @@
+"""
+异步日志管道
+请求线程和任务线程只把日志记录放入内存队列，由后台监听线程批量格式化并写入文件。
+队列满时按策略丢弃（drop）或等待（block），丢弃的记录数计入指标并定期写一条警告。
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import List, Optional
+
+from app.utils.metrics import metrics
+
+QUEUE_POLICIES = ('drop', 'block')
+
+# 这些类型的参数可以安全地延迟到监听线程格式化
+_LAZY_ARG_TYPES = (str, int, float, bool, type(None))
+
+
+class StructuredMessage:
+    """结构化日志消息，在监听线程中才序列化为JSON"""
+
+    __slots__ = ('prefix', 'data', 'indent')
+
+    def __init__(self, prefix: str, data: dict, indent: Optional[int] = None):
+        self.prefix = prefix
+        self.data = data
+        self.indent = indent
+
+    def __str__(self):
+        return self.prefix + json.dumps(self.data, ensure_ascii=False, indent=self.indent, default=str)
+
+
+class BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """支持一次写入一批记录的 RotatingFileHandler"""
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        lines = []
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+
+        data = ''.join(lines)
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() > 0 and self.stream.tell() + len(data) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(data)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    只入队、不格式化的 QueueHandler
+
+    标准 QueueHandler 在调用线程中格式化消息；这里只有参数不是简单类型时才提前格式化，
+    异常堆栈也在调用线程中展开（traceback 对象不宜跨线程持有）。
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = 'drop', block_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.policy = policy if policy in QUEUE_POLICIES else 'drop'
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not all(isinstance(arg, _LAZY_ARG_TYPES) for arg in record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            # 错误日志即使在 drop 策略下也等待一段时间，尽量不丢
+            if self.policy == 'block' or record.levelno >= logging.ERROR:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                self._unreported += 1
+            metrics.inc('craftne_log_records_dropped_total', {'level': record.levelname})
+
+    def take_unreported(self) -> int:
+        with self._dropped_lock:
+            count, self._unreported = self._unreported, 0
+        return count
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """每次从队列取出最多 batch_size 条记录，交给各处理器批量写入"""
+
+    def __init__(self, log_queue: queue.Queue, *handlers, batch_size: int = 256,
+                 queue_handler: Optional[DeferredQueueHandler] = None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+        self.queue_handler = queue_handler
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        dropped = self.queue_handler.take_unreported() if self.queue_handler else 0
+        if dropped:
+            records = records + [logging.makeLogRecord({
+                'name': 'app.log_queue', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"日志队列已满，丢弃了 {dropped} 条日志（累计 {self.queue_handler.dropped} 条）"
+            })]
+
+        for handler in self.handlers:
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(records)
+                continue
+            for record in records:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            record = self.dequeue(True)
+            batch = []
+            stopping = False
+            while True:
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = log_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.handle_batch(batch)
+                except Exception:
+                    pass
+            for _ in range(len(batch) + stopping):
+                log_queue.task_done()
+            if stopping:
+                break
+
+    def enqueue_sentinel(self):
+        # 队列满时等待监听线程腾出位置，不能丢弃结束标记
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        """写完队列中剩余的记录后停止（可重复调用）"""
+        if self._thread is not None:
+            super().stop()
+
+    def restart_after_fork(self, maxsize: int):
+        """fork 后子进程没有监听线程，换一个新队列重新启动"""
+        self.queue = queue.Queue(maxsize)
+        if self.queue_handler is not None:
+            self.queue_handler.queue = self.queue
+        self._thread = None
+        self.start()
+
+
+def start_queue_logging(logger: logging.Logger, handlers, maxsize: int = 10000, policy: str = 'drop',
+                        block_timeout: float = 1.0, batch_size: int = 256) -> BatchQueueListener:
+    """
+    把 handlers 挂到后台监听线程上，logger 只保留一个入队处理器
+
+    Returns:
+        已启动的 BatchQueueListener，进程退出前调用 stop() 写完剩余记录
+    """
+    log_queue = queue.Queue(maxsize)
+    queue_handler = DeferredQueueHandler(log_queue, policy, block_timeout)
+    queue_handler.setLevel(min(handler.level for handler in handlers))
+    logger.addHandler(queue_handler)
+
+    listener = BatchQueueListener(log_queue, *handlers, batch_size=batch_size, queue_handler=queue_handler)
+    listener.start()
+
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: listener.restart_after_fork(maxsize))
+    return listener
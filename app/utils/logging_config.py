@@ -2,13 +2,14 @@
 日志配置模块
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
 from datetime import datetime
 from flask import current_app, request, g
-import json
 import traceback
+from app.utils.log_queue import BatchRotatingFileHandler, StructuredMessage, start_queue_logging
 
 def setup_logging(app):
     """设置应用日志配置"""
@@ -24,7 +25,7 @@ def setup_logging(app):
 
     # 应用日志处理器
     app_log_file = os.path.join(log_dir, 'app.log')
-    app_handler = logging.handlers.RotatingFileHandler(
+    app_handler = BatchRotatingFileHandler(
         app_log_file, maxBytes=10240000, backupCount=10, encoding='utf-8'
     )
     app_handler.setFormatter(formatter)
@@ -32,7 +33,7 @@ def setup_logging(app):
 
     # 错误日志处理器
     error_log_file = os.path.join(log_dir, 'error.log')
-    error_handler = logging.handlers.RotatingFileHandler(
+    error_handler = BatchRotatingFileHandler(
         error_log_file, maxBytes=10240000, backupCount=10, encoding='utf-8'
     )
     error_handler.setFormatter(formatter)
@@ -41,16 +42,29 @@ def setup_logging(app):
     # 调试日志处理器（仅在调试模式下）
     if app.debug:
         debug_log_file = os.path.join(log_dir, 'debug.log')
-        debug_handler = logging.handlers.RotatingFileHandler(
+        debug_handler = BatchRotatingFileHandler(
             debug_log_file, maxBytes=10240000, backupCount=5, encoding='utf-8'
         )
         debug_handler.setFormatter(formatter)
         debug_handler.setLevel(logging.DEBUG)
-        app.logger.addHandler(debug_handler)
-
-    # 添加处理器到应用日志器
-    app.logger.addHandler(app_handler)
-    app.logger.addHandler(error_handler)
+        handlers = [debug_handler, app_handler, error_handler]
+    else:
+        handlers = [app_handler, error_handler]
+
+    if app.config.get('LOG_QUEUE_ENABLED', True):
+        # 请求线程只入队，格式化和文件写入在后台线程中批量完成
+        listener = start_queue_logging(
+            app.logger, handlers,
+            maxsize=app.config.get('LOG_QUEUE_SIZE', 10000),
+            policy=app.config.get('LOG_QUEUE_POLICY', 'drop'),
+            block_timeout=app.config.get('LOG_QUEUE_BLOCK_TIMEOUT', 1.0),
+            batch_size=app.config.get('LOG_BATCH_SIZE', 256)
+        )
+        app.extensions['log_listener'] = listener
+        atexit.register(listener.stop)
+    else:
+        for handler in handlers:
+            app.logger.addHandler(handler)
 
     # 设置日志级别
     app.logger.setLevel(logging.DEBUG if app.debug else logging.INFO)
@@ -81,7 +95,7 @@ def log_error(error, context=None, extra_data=None):
         if extra_data:
             error_info['extra_data'] = extra_data
 
-        current_app.logger.error(f"错误详情: {json.dumps(error_info, ensure_ascii=False, indent=2)}")
+        current_app.logger.error(StructuredMessage("错误详情: ", error_info, indent=2))
 
     except Exception as log_error:
         # 如果日志记录本身出错，使用基本的日志记录
@@ -98,7 +112,7 @@ def log_info(message, extra_data=None):
         if extra_data:
             log_data['data'] = extra_data
 
-        current_app.logger.info(json.dumps(log_data, ensure_ascii=False))
+        current_app.logger.info(StructuredMessage("", log_data))
 
     except Exception as e:
         current_app.logger.info(f"日志数据序列化失败: {str(e)} | 消息: {message}")
@@ -116,7 +130,7 @@ def log_performance(operation, duration, extra_data=None):
         if extra_data:
             perf_data['data'] = extra_data
 
-        current_app.logger.info(f"性能: {json.dumps(perf_data, ensure_ascii=False)}")
+        current_app.logger.info(StructuredMessage("性能: ", perf_data))
 
     except Exception as e:
         current_app.logger.info(f"性能日志记录失败: {str(e)} | 操作: {operation}")
@@ -135,7 +149,7 @@ def log_user_action(action, user_id=None, extra_data=None):
         if extra_data:
             action_data['data'] = extra_data
 
-        current_app.logger.info(f"用户操作: {json.dumps(action_data, ensure_ascii=False)}")
+        current_app.logger.info(StructuredMessage("用户操作: ", action_data))
 
     except Exception as e:
         current_app.logger.info(f"用户操作日志记录失败: {str(e)} | 操作: {action}")
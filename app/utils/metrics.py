@@ -0,0 +1,213 @@
+"""
+指标统计模块
+进程内累计计数器和固定分桶的耗时直方图，定期把本进程的累计值写入指标目录下的 ``<pid>.json``，
+/metrics 接口读取目录中所有进程的文件求和后按 Prometheus 文本格式输出，
+gunicorn 多个 worker 的数据因此可以汇总，而记录一次指标只是一次加锁的内存操作。
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# 耗时直方图分桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 指标说明：名称 -> (类型, 说明)
+METRIC_HELP = {
+    'craftne_http_requests_total': ('counter', 'HTTP请求数'),
+    'craftne_http_request_duration_seconds': ('histogram', 'HTTP请求耗时'),
+    'craftne_operation_duration_seconds': ('histogram', 'monitor_performance 监控的操作耗时'),
+    'craftne_operation_errors_total': ('counter', 'monitor_performance 监控的操作异常次数'),
+    'craftne_log_records_dropped_total': ('counter', '日志队列已满时丢弃的日志记录数'),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict]) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.directory: Optional[str] = None
+        self.flush_interval = 10.0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        # 直方图：{名称: {标签: [各分桶计数..., +Inf计数, 总和]}}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._last_flush = time.time()
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        """从应用配置读取指标目录和写盘间隔"""
+        self.directory = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+        self.flush_interval = float(app.config.get('METRICS_FLUSH_INTERVAL', 10))
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def _check_fork(self):
+        """fork 出的子进程不继承父进程的累计值（父进程自己的文件已经记录）"""
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._counters = {}
+            self._histograms = {}
+            self._last_flush = time.time()
+
+    # ---- 记录 ----
+
+    def inc(self, name: str, labels: Optional[Dict] = None, value: float = 1):
+        """计数器加 value"""
+        key = _label_key(labels)
+        with self._lock:
+            self._check_fork()
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, labels: Optional[Dict] = None):
+        """直方图记录一次观测值"""
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._check_fork()
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+        self._maybe_flush()
+
+    # ---- 持久化 ----
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _maybe_flush(self):
+        if self.directory and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._check_fork()
+            return {
+                'buckets': list(self.buckets),
+                'counters': {name: [[list(key), value] for key, value in series.items()]
+                             for name, series in self._counters.items()},
+                'histograms': {name: [[list(key), list(counts)] for key, counts in series.items()]
+                               for name, series in self._histograms.items()}
+            }
+
+    def flush(self):
+        """把本进程的累计值写入指标目录"""
+        if not self.directory:
+            return
+        self._last_flush = time.time()
+        data = self.snapshot()
+        path = self._path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def collect(self) -> Dict:
+        """汇总所有进程的指标：{'counters': {...}, 'histograms': {...}}"""
+        snapshots = []
+        if self.directory and os.path.isdir(self.directory):
+            self.flush()
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        else:
+            snapshots.append(self.snapshot())
+
+        counters: Dict[str, Dict[LabelKey, float]] = {}
+        histograms: Dict[str, Dict[LabelKey, list]] = {}
+        for data in snapshots:
+            if data.get('buckets') != list(self.buckets):
+                continue
+            for name, series in data['counters'].items():
+                merged = counters.setdefault(name, {})
+                for labels, value in series:
+                    key = tuple(tuple(pair) for pair in labels)
+                    merged[key] = merged.get(key, 0) + value
+            for name, series in data['histograms'].items():
+                merged = histograms.setdefault(name, {})
+                for labels, counts in series:
+                    key = tuple(tuple(pair) for pair in labels)
+                    if key in merged:
+                        merged[key] = [a + b for a, b in zip(merged[key], counts)]
+                    else:
+                        merged[key] = list(counts)
+
+        return {'counters': counters, 'histograms': histograms}
+
+    def render_prometheus(self) -> str:
+        """输出 Prometheus 文本格式"""
+        data = self.collect()
+        lines = []
+
+        def header(name, default_type):
+            metric_type, help_text = METRIC_HELP.get(name, (default_type, name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name in sorted(data['counters']):
+            header(name, 'counter')
+            for key, value in sorted(data['counters'][name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name in sorted(data['histograms']):
+            header(name, 'histogram')
+            for key, counts in sorted(data['histograms'][name].items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', repr(bound)),))} {int(cumulative)}")
+                total = cumulative + counts[len(self.buckets)]
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {int(total)}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(counts[-1])}")
+                lines.append(f"{name}_count{_format_labels(key)} {int(total)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
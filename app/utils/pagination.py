@@ -0,0 +1,92 @@
+"""
+游标（keyset）分页模块
+按 (created_at, id) 倒序翻页，用上一页边界记录作为条件代替 OFFSET，
+配合 (…, created_at, id) 复合索引，任意深度的页面查询代价相同
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import tuple_
+
+DIRECTION_NEXT = 'next'
+DIRECTION_PREV = 'prev'
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析"""
+
+
+def cursor_requested(args) -> bool:
+    """请求是否要求游标分页（传入 cursor 或 mode=cursor），否则沿用 OFFSET 分页"""
+    return 'cursor' in args or args.get('mode') == 'cursor'
+
+
+def encode_cursor(record, direction: str) -> str:
+    """把边界记录编码为不透明游标"""
+    payload = {
+        'c': record.created_at.isoformat() if record.created_at else None,
+        'i': record.id,
+        'd': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """解析游标，返回 {'created_at': datetime, 'id': int, 'direction': str}"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        direction = payload['d']
+        if direction not in (DIRECTION_NEXT, DIRECTION_PREV):
+            raise ValueError(direction)
+        return {
+            'created_at': datetime.fromisoformat(payload['c']) if payload['c'] else None,
+            'id': int(payload['i']),
+            'direction': direction
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f'无效的分页游标: {cursor}') from e
+
+
+def keyset_paginate(query, model, cursor: Optional[str], per_page: int) -> Dict:
+    """
+    按 (created_at, id) 倒序做游标分页
+
+    Args:
+        query: 已加好过滤条件、未排序的查询
+        model: 带 created_at 和 id 列的模型
+        cursor: 上一次响应中的 next_cursor / prev_cursor，为空时取第一页
+        per_page: 每页数量
+
+    Returns:
+        {'items': [...], 'next_cursor': str|None, 'prev_cursor': str|None}
+    """
+    key = tuple_(model.created_at, model.id)
+    position = decode_cursor(cursor) if cursor else None
+
+    if position is None:
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        has_next, has_prev = has_more, False
+    elif position['direction'] == DIRECTION_NEXT:
+        rows = query.filter(key < (position['created_at'], position['id'])) \
+            .order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_next, has_prev = len(rows) > per_page, True
+    else:
+        # 向前翻页时正序取紧邻游标的记录，再翻转回倒序
+        rows = query.filter(key > (position['created_at'], position['id'])) \
+            .order_by(model.created_at.asc(), model.id.asc()).limit(per_page + 1).all()
+        items = list(reversed(rows[:per_page]))
+        has_next, has_prev = True, len(rows) > per_page
+
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(items[-1], DIRECTION_NEXT) if items and has_next else None,
+        'prev_cursor': encode_cursor(items[0], DIRECTION_PREV) if items and has_prev else None
+    }
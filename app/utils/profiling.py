@@ -0,0 +1,239 @@
+"""
+性能剖析模块
+按比例抽样请求和后台任务进行剖析，耗时超过阈值的保存到 ``instance/profiles``：
+- sampler：后台线程定时采集目标线程的调用栈，输出 collapsed stacks（可直接生成火焰图），开销低
+- cprofile：cProfile 确定性剖析，输出 pstats 文件，开销较大，适合低抽样率
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+PROFILE_MODES = ('sampler', 'cprofile')
+MAX_STACK_DEPTH = 128
+
+_PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-(request|task)-[0-9a-f]{8}$')
+
+
+class StackSampler:
+    """统计采样器：定时读取目标线程的当前栈并计数"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """flamegraph.pl / speedscope 可读取的 collapsed stacks 格式"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """一次剖析：start -> stop -> （超过阈值时）save"""
+
+    def __init__(self, kind: str, name: str, mode: str, interval: float, forced: bool = False):
+        self.kind = kind
+        self.name = name
+        self.mode = mode if mode in PROFILE_MODES else 'sampler'
+        self.interval = interval
+        self.forced = forced
+        self.duration = 0.0
+        self._profiler = None
+        self._sampler = None
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> float:
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None and self._sampler._thread.is_alive():
+            self._sampler.stop()
+        self.duration = time.perf_counter() - self._started
+        return self.duration
+
+    def save(self, extra: Optional[Dict] = None) -> str:
+        """保存剖析结果和元数据，返回剖析ID"""
+        directory = profile_dir()
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.kind}-{uuid.uuid4().hex[:8]}"
+
+        if self._profiler is not None:
+            filename = f"{profile_id}.prof"
+            self._profiler.dump_stats(os.path.join(directory, filename))
+            samples = None
+        else:
+            filename = f"{profile_id}.collapsed"
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+                f.write(self._sampler.collapsed())
+            samples = self._sampler.samples
+
+        meta = {
+            'id': profile_id,
+            'kind': self.kind,
+            'name': self.name,
+            'mode': self.mode,
+            'file': filename,
+            'duration_ms': round(self.duration * 1000, 2),
+            'samples': samples,
+            'forced': self.forced,
+            'created_at': time.time()
+        }
+        if extra:
+            meta.update(extra)
+        with open(os.path.join(directory, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        _prune(directory, current_app.config.get('PROFILE_MAX_FILES', 200))
+        return profile_id
+
+
+def profile_dir() -> str:
+    directory = current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _prune(directory: str, max_files: int):
+    """只保留最近的 max_files 份剖析"""
+    metas = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in metas[:max(0, len(metas) - max_files)]:
+        profile_id = name[:-len('.json')]
+        for suffix in ('.json', '.prof', '.collapsed'):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except OSError:
+                continue
+
+
+def start_profile(kind: str, name: str, forced: bool = False) -> Optional[ProfileSession]:
+    """
+    按配置决定是否剖析本次请求/任务
+
+    Args:
+        kind: 'request' 或 'task'
+        name: 端点名或任务名
+        forced: 强制剖析（忽略抽样率，结束时无论耗时都保存）
+
+    Returns:
+        已开始的 ProfileSession，不剖析时返回None
+    """
+    config = current_app.config
+    if not config.get('PROFILING_ENABLED', False):
+        return None
+    if not forced and random.random() >= config.get('PROFILE_SAMPLE_RATE', 0.01):
+        return None
+
+    return ProfileSession(
+        kind, name, config.get('PROFILE_MODE', 'sampler'),
+        config.get('PROFILE_SAMPLE_INTERVAL', 0.005), forced
+    ).start()
+
+
+def finish_profile(session: Optional[ProfileSession], extra: Optional[Dict] = None) -> Optional[str]:
+    """结束剖析，超过慢阈值（或强制剖析）时保存，返回剖析ID"""
+    if session is None:
+        return None
+    duration = session.stop()
+    if not session.forced and duration < current_app.config.get('PROFILE_SLOW_THRESHOLD', 1.0):
+        return None
+    try:
+        profile_id = session.save(extra)
+    except OSError as e:
+        current_app.logger.warning(f"保存剖析结果失败 {session.kind}:{session.name}: {e}")
+        return None
+    current_app.logger.info(
+        f"已保存慢{session.kind}剖析: {session.name} 耗时 {duration:.3f}s [剖析ID: {profile_id}]"
+    )
+    return profile_id
+
+
+@contextmanager
+def profile_task(name: str, task_id: Optional[str] = None):
+    """Celery 任务剖析，需在应用上下文中使用"""
+    session = start_profile('task', name)
+    status = 'failed'
+    try:
+        yield
+        status = 'completed'
+    finally:
+        finish_profile(session, {'task_id': task_id, 'status': status})
+
+
+def list_profiles() -> List[Dict]:
+    """按时间倒序列出已保存的剖析"""
+    directory = profile_dir()
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda meta: meta.get('created_at', 0), reverse=True)
+    return profiles
+
+
+def get_profile_file(profile_id: str) -> Optional[str]:
+    """返回剖析结果文件路径，不存在时返回None"""
+    if not _PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    directory = profile_dir()
+    for suffix in ('.prof', '.collapsed'):
+        path = os.path.join(directory, profile_id + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def render_pstats(path: str, limit: int = 50, sort: str = 'cumulative') -> str:
+    """把 pstats 文件渲染为文本"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
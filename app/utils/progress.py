@@ -0,0 +1,147 @@
+"""
+任务进度事件模块
+后台任务通过 Redis 发布进度事件，Web 端以 Server-Sent Events 转发给浏览器。
+每个任务保留最近的事件列表，客户端断线重连时按 Last-Event-ID 补发错过的事件。
+"""
+
+import json
+import time
+from typing import Dict, Iterator, Optional
+
+from flask import current_app
+
+from app.utils.cache import cache_manager
+
+# 每个任务保留的历史事件数量和保留时间
+HISTORY_LENGTH = 100
+HISTORY_TTL = 3600
+
+# 心跳间隔与单个连接的最长时长（秒），超时后客户端带 Last-Event-ID 自动重连
+HEARTBEAT_INTERVAL = 15
+STREAM_MAX_DURATION = 600
+
+# 收到后即结束流的事件
+TERMINAL_EVENTS = ('completed', 'failed')
+
+# 浏览器重连间隔（毫秒）
+RETRY_MS = 3000
+
+
+def _channel(kind: str, job_id) -> str:
+    return f"craftne:progress:{kind}:{job_id}"
+
+
+def publish_progress(kind: str, job_id, event: str, data: Dict) -> Optional[int]:
+    """
+    发布进度事件
+
+    Args:
+        kind: 任务类别（map / training / task）
+        job_id: 任务标识
+        event: 事件名（progress / completed / failed）
+        data: 事件数据
+
+    Returns:
+        事件ID，Redis 不可用时返回None
+    """
+    client = cache_manager.redis_client
+    if client is None:
+        return None
+
+    channel = _channel(kind, job_id)
+    try:
+        event_id = client.incr(f"{channel}:seq")
+        message = json.dumps({'id': event_id, 'event': event, 'data': data}, ensure_ascii=False, default=str)
+
+        pipe = client.pipeline(transaction=False)
+        pipe.expire(f"{channel}:seq", HISTORY_TTL)
+        pipe.rpush(f"{channel}:history", message)
+        pipe.ltrim(f"{channel}:history", -HISTORY_LENGTH, -1)
+        pipe.expire(f"{channel}:history", HISTORY_TTL)
+        pipe.publish(channel, message)
+        pipe.execute()
+        return event_id
+    except Exception as e:
+        current_app.logger.warning(f"进度事件发布失败 {channel}: {e}")
+        return None
+
+
+def format_sse(data: Dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """格式化为一条SSE消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def progress_stream(kind: str, job_id, last_event_id: Optional[int] = None,
+                    snapshot: Optional[Dict] = None) -> Iterator[str]:
+    """
+    生成SSE消息流
+
+    先发送当前状态快照（snapshot），再补发 last_event_id 之后的历史事件，然后转发实时事件。
+    空闲时发送心跳注释，收到结束事件或超过最长时长后关闭。
+    Redis 不可用时只发送快照和 unavailable 事件，客户端应退回轮询状态接口。
+    """
+    yield f"retry: {RETRY_MS}\n\n"
+
+    if snapshot is not None:
+        yield format_sse(snapshot, event='status')
+        if snapshot.get('state') in TERMINAL_EVENTS:
+            return
+
+    client = cache_manager.redis_client
+    if client is None:
+        yield format_sse({'reason': '实时进度不可用，请使用状态接口轮询'}, event='unavailable')
+        return
+
+    channel = _channel(kind, job_id)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        # 先订阅再读历史，避免两步之间发布的事件丢失；重复的由事件ID去重
+        pubsub.subscribe(channel)
+        last_sent = last_event_id or 0
+
+        for raw in client.lrange(f"{channel}:history", 0, -1):
+            message = json.loads(raw)
+            if message['id'] <= last_sent:
+                continue
+            last_sent = message['id']
+            yield format_sse(message['data'], event=message['event'], event_id=message['id'])
+            if message['event'] in TERMINAL_EVENTS:
+                return
+
+        started = time.time()
+        last_activity = started
+        while time.time() - started < STREAM_MAX_DURATION:
+            item = pubsub.get_message(timeout=1.0)
+            if item is None:
+                if time.time() - last_activity >= HEARTBEAT_INTERVAL:
+                    last_activity = time.time()
+                    yield ": heartbeat\n\n"
+                continue
+
+            message = json.loads(item['data'])
+            if message['id'] <= last_sent:
+                continue
+            last_sent = message['id']
+            last_activity = time.time()
+            yield format_sse(message['data'], event=message['event'], event_id=message['id'])
+            if message['event'] in TERMINAL_EVENTS:
+                return
+    finally:
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """解析 Last-Event-ID 请求头（或 last_event_id 查询参数）"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
@@ -2,9 +2,9 @@
 API响应统一处理模块
 """
 
-from flask import jsonify, request
+from flask import jsonify, request, Response
 from datetime import datetime
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterable, Optional, Union
 import uuid
 
 class APIResponse:
@@ -12,7 +12,7 @@ class APIResponse:
 
     @staticmethod
     def success(data: Any = None, message: str = "操作成功", code: str = "SUCCESS") -> Dict:
-        """成功响应"""
+        """成功响应，data 可以是 RawJSON（已编码的产物字节），编码时原样拼接"""
         response = {
             "success": True,
             "code": code,
@@ -60,6 +60,25 @@ class APIResponse:
             }
         }, message)
 
+    @staticmethod
+    def cursor_paginated(data: list, per_page: int, next_cursor: Optional[str], prev_cursor: Optional[str],
+                         total: Optional[int] = None, message: str = "获取成功") -> Dict:
+        """游标分页响应，total 仅在请求计数时返回"""
+        pagination = {
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            "has_next": next_cursor is not None,
+            "has_prev": prev_cursor is not None
+        }
+        if total is not None:
+            pagination["total"] = total
+
+        return APIResponse.success({
+            "items": data,
+            "pagination": pagination
+        }, message)
+
     @staticmethod
     def created(data: Any = None, message: str = "创建成功") -> tuple:
         """创建成功响应"""
@@ -92,3 +111,18 @@ def make_json_response(data_or_response, status_code=200):
         return jsonify(data), status_code
     else:
         return jsonify(data_or_response), status_code
+
+def ndjson_response(lines: Iterable[bytes], status_code: int = 200) -> Response:
+    """创建NDJSON流式响应，lines中的每一项是一行已编码的JSON（含换行符）"""
+    response = Response(lines, status=status_code, mimetype='application/x-ndjson')
+    # 关闭反向代理缓冲，保证首字节尽快到达客户端
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """创建Server-Sent Events流式响应，events中的每一项是一条已格式化的SSE消息"""
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,8 +1,15 @@
 """
 文件类型校验工具
 """
+import struct
+
 from flask import current_app
 
+# 区域文件头：1024 个区块位置项（各4字节）+ 1024 个时间戳（各4字节）
+REGION_SECTOR_SIZE = 4096
+REGION_HEADER_SIZE = 2 * REGION_SECTOR_SIZE
+REGION_CHUNK_SLOTS = 1024
+
 def allowed_file(filename):
     """判断文件扩展名是否允许"""
     if '.' not in filename:
@@ -11,3 +18,44 @@ def allowed_file(filename):
     allowed = current_app.config.get('ALLOWED_EXTENSIONS', {'mca', 'mcr'})
     return ext in allowed
 
+
+
+def validate_region_header(header, file_size):
+    """
+    检查区域文件（.mca/.mcr）头部的扇区表是否合理
+
+    只需要文件最前面的 8KB，上传过程中收到头部后即可判断，不必等整个文件传完。
+
+    Args:
+        header: 文件前 REGION_HEADER_SIZE 字节
+        file_size: 文件总大小（字节）
+
+    Returns:
+        (是否有效, 错误信息, 区块数量)
+    """
+    if file_size < REGION_HEADER_SIZE or len(header) < REGION_HEADER_SIZE:
+        return False, '文件小于区域文件头大小（8KB）', 0
+
+    total_sectors = -(-file_size // REGION_SECTOR_SIZE)
+    locations = struct.unpack(f'>{REGION_CHUNK_SLOTS}I', header[:REGION_SECTOR_SIZE])
+
+    used = []
+    for slot, location in enumerate(locations):
+        if location == 0:
+            continue
+        offset, sector_count = location >> 8, location & 0xFF
+        if offset < 2 or sector_count == 0:
+            return False, f'区块 {slot} 的扇区位置无效: offset={offset}, count={sector_count}', 0
+        if offset + sector_count > total_sectors:
+            return False, f'区块 {slot} 超出文件范围: 扇区 {offset}+{sector_count} > {total_sectors}', 0
+        used.append((offset, offset + sector_count, slot))
+
+    if not used:
+        return False, '区域文件中没有任何区块', 0
+
+    used.sort()
+    for (_, previous_end, previous_slot), (start, _, slot) in zip(used, used[1:]):
+        if start < previous_end:
+            return False, f'区块 {previous_slot} 与区块 {slot} 的扇区重叠', 0
+
+    return True, '', len(used)
@@ -3,6 +3,7 @@
 """
 from flask import Blueprint, jsonify, request
 from app.models.annotation import Annotation
+from app.utils.cache import invalidate_map_cache
 from app import db
 
 bp = Blueprint('annotation', __name__)
@@ -20,5 +21,6 @@ def create_annotation():
     annotation = Annotation.create_from_dict(data)
     db.session.add(annotation)
     db.session.commit()
+    invalidate_map_cache(annotation.map_data_id)
     return jsonify(annotation.to_dict()), 201
 
@@ -2,109 +2,449 @@
 API蓝图 - 提供RESTful API接口
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file, stream_with_context
 from app.models.map_data import MapData
 from app.models.annotation import Annotation
 from app.models.training_job import TrainingJob
 from app.services.mca_parser import MCAParser
+from app.services.block_store import BlockStore
+from app.services import block_codec
+from app.services.block_codec import ensure_binary_artifact
+from app.services import map_tiles
+from app.services import map_lod
+from app.services import mesher
+from app.services import map_shell
+from app.services import stats_service
+from app.services import search_service
+from app.services import annotation_bulk
+from app.services import spatial_service
+from app.services import volume_counts
 from app.utils.validators import allowed_file
 from app.utils.logging_config import log_error, log_user_action
 from app.utils.decorators import (
     monitor_performance, validate_json_request,
-    log_user_activity, handle_exceptions, api_response
+    log_user_activity, handle_exceptions, api_response, alternate_format, require_admin_token
 )
-from app.utils.response import APIResponse, make_json_response
-from app.utils.cache import cache_result
+from app.utils.response import APIResponse, make_json_response, ndjson_response, sse_response
+from app.utils.progress import progress_stream, parse_last_event_id
+from app.utils.cache import cache_result, cache_manager, invalidate_map_cache
+from app.utils.http_cache import (
+    conditional_map_response, CACHE_CONTROL_ARTIFACT, CACHE_CONTROL_RECORD
+)
+from app.utils.pagination import keyset_paginate, cursor_requested, InvalidCursorError
+from app.utils.json_provider import RawJSON
+from app.utils import profiling
 from app import db
+import io
 import os
 import json
 
 bp = Blueprint('api', __name__)
 
+
+def _paginated_listing(query, model, serialize, default_per_page, max_per_page, message):
+    """
+    列表接口分页
+
+    默认 OFFSET 分页（page 默认为1，附带总数），与原有响应格式一致；传入 cursor 或 mode=cursor 时
+    按 (created_at, id) 游标分页，游标取自上一次响应的 next_cursor / prev_cursor，count=true 时额外返回总数。
+    """
+    per_page = max(1, min(request.args.get('per_page', default_per_page, type=int), max_per_page))
+
+    if not cursor_requested(request.args):
+        page = request.args.get('page', 1, type=int)
+        pagination = query.order_by(model.created_at.desc(), model.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return APIResponse.paginated(serialize(pagination.items), page, per_page, pagination.total, message)
+
+    try:
+        result = keyset_paginate(query, model, request.args.get('cursor'), per_page)
+    except InvalidCursorError as e:
+        return APIResponse.validation_error(str(e))
+
+    total = None
+    if request.args.get('count', 'false').lower() == 'true':
+        total = query.order_by(None).count()
+
+    return APIResponse.cursor_paginated(
+        serialize(result['items']), per_page, result['next_cursor'], result['prev_cursor'], total, message
+    )
+
+
 @bp.route('/maps', methods=['GET'])
 @api_response()
 @monitor_performance('api_get_maps')
 @log_user_activity('获取地图列表')
-@cache_result(expire=300)  # 缓存5分钟
+@cache_result(expire=300, stale_ttl=60, tags=('maps:list',))  # 缓存5分钟，过期后1分钟内返回旧值并后台刷新
 def get_maps():
     """获取所有地图列表"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
-
         query = MapData.query
 
         # 支持按状态过滤
         status = request.args.get('status')
         if status:
-            query = query.filter(MapData.status == status)
+            query = query.filter(MapData.parse_status == status)
 
-        # 支���按文件名搜索
-        search = request.args.get('search')
+        # 支持按文件名、世界名搜索（优先使用全文索引），q 与全局搜索接口的参数名一致
+        search = (request.args.get('search') or request.args.get('q') or '').strip()
         if search:
-            query = query.filter(MapData.filename.contains(search))
-
-        # 分页查询
-        maps_pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            query = search_service.filter_maps(query, search)
 
-        maps_data = [map_data.to_dict() for map_data in maps_pagination.items]
-
-        return APIResponse.paginated(
-            maps_data, page, per_page, maps_pagination.total
-        )
+        return _paginated_listing(query, MapData, MapData.serialize_many, 20, 100, '获取成功')
     except Exception as e:
         log_error(e, context='获取地图列表')
         return APIResponse.internal_error('获取地图列表失败')
 
 @bp.route('/maps/<int:map_id>', methods=['GET'])
+@conditional_map_response(scope='record', cache_control=CACHE_CONTROL_RECORD)
 @api_response()
 @monitor_performance('api_get_map_detail')
 @log_user_activity('获取地图详情')
-@cache_result(expire=300)
 def get_map_detail(map_id):
-    """获取地图详细信息"""
-    try:
-        map_data = MapData.query.get_or_404(map_id)
-        return APIResponse.success(data=map_data.to_dict())
-    except Exception as e:
-        log_error(f"获取地图详情失败: {str(e)}", extra={'map_id': map_id})
-        return APIResponse.error("获取地图详情失败")
+    """获取地图详细信息及Three.js数据"""
+    map_record = _map_detail_record(map_id=map_id)
+    if map_record is None:
+        return APIResponse.not_found(f'地图 {map_id} 不存在')
+
+    if not map_record.get('is_parsed'):
+        return {'error': '地图尚未解析'}, 404
+
+    # Three.js数据按原样拼接缓存文件，不解码再编码，也不再存一份到缓存
+    threejs_data = None
+    threejs_file_path = os.path.join(
+        current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'threejs_data_{map_id}.json'
+    )
+    if os.path.exists(threejs_file_path):
+        try:
+            threejs_data = RawJSON.from_file(threejs_file_path)
+        except Exception as e:
+            return {'error': f'加载地图数据失败: {str(e)}'}, 500
+
+    return {
+        'map_data': map_record,
+        'threejs_data': threejs_data
+    }
+
+@cache_result(expire=300, tags=('map:{map_id}',))
+def _map_detail_record(map_id):
+    """地图记录的序列化结果，地图不存在时返回None（不缓存）"""
+    map_data = MapData.query.get(map_id)
+    return map_data.to_dict() if map_data else None
+
+# 预热时通过该属性调用缓存层，见 CacheWarmer._warm_view
+get_map_detail.cached_view = _map_detail_record.cached_view
+
+def _parsed_block_store(map_id):
+    """返回已解析地图的方块存储，不可用时返回 (None, 错误响应)"""
+    # 不用 get_or_404：api_response 会把 NotFound 当作一般异常返回500
+    map_data = MapData.query.get(map_id)
+    if not map_data:
+        return None, APIResponse.not_found(f'地图 {map_id} 不存在')
+
+    if not map_data.is_parsed:
+        return None, APIResponse.error("地图尚未解析完成", status_code=400)
+
+    store = BlockStore(map_id)
+    if not store.exists():
+        return None, APIResponse.not_found("方块存储不存在，请重新解析地图")
+
+    return store, None
+
+def _requested_block_set(store):
+    """
+    解析 blocks 查询参数，返回 (方块集合, 错误响应)
+
+    默认 shell（只含外表面方块），blocks=all 返回完整集合。
+    """
+    block_set = request.args.get('blocks', map_shell.BLOCK_SET_SHELL)
+    if block_set not in (map_shell.BLOCK_SET_SHELL, map_shell.BLOCK_SET_ALL):
+        return None, APIResponse.error(f"不支持的方块集合: {block_set}", code="INVALID_BLOCK_SET", status_code=400)
+    return map_shell.preview_store(store, block_set), None
+
+@monitor_performance('api_stream_map_blocks')
+def stream_map_blocks(map_id):
+    """以NDJSON流式返回地图方块：首行为元信息，之后每行是一个区块的方块批次"""
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return make_json_response(error)
+
+    source, error = _requested_block_set(store)
+    if error:
+        return make_json_response(error)
+
+    meta = source.meta
+    header = json.dumps({
+        'meta': {
+            'map_id': map_id,
+            'block_set': source.block_set,
+            'chunk_count': meta.get('chunk_count', 0),
+            'block_count': meta.get('block_count', 0)
+        }
+    }, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def generate():
+        yield header
+        # 直接转发磁盘上的区块行，不做解码和重新编码
+        yield from source.iter_chunk_lines()
+
+    return ndjson_response(generate())
+
+def _load_lod_index(store):
+    """读取LOD索引，旧地图没有LOD数据时按需生成"""
+    index = map_lod.load_lod_index(store)
+    if index is None:
+        with cache_manager.lock(f"artifact:{store.map_data_id}:lod", timeout=300, blocking_timeout=300):
+            index = map_lod.ensure_lod_pyramid(store)
+    return index
+
+def _requested_lod(store):
+    """解析 lod 查询参数，返回 (LOD级别, 错误响应)；未指定时级别为None"""
+    factor = request.args.get('lod', type=int)
+    if factor is None or factor == 1:
+        return None, None
+
+    level = map_lod.find_level(_load_lod_index(store), factor)
+    if level is None:
+        return None, APIResponse.error(f"不支持的LOD级别: {factor}", code="INVALID_LOD", status_code=400)
+    return level, None
+
+@monitor_performance('api_binary_map_blocks')
+def binary_map_blocks(map_id):
+    """
+    以二进制格式返回地图方块，格式说明见 app.services.block_codec
+
+    默认返回 shell 集合，blocks=all 返回完整集合；lod 参数选择完整集合的降采样级别。
+    """
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return make_json_response(error)
+
+    level, error = _requested_lod(store)
+    if error:
+        return make_json_response(error)
+
+    if level is not None:
+        artifact_path = map_lod.level_path(store, level['factor'])
+    else:
+        source, error = _requested_block_set(store)
+        if error:
+            return make_json_response(error)
+
+        # 同一地图只由一个进程生成二进制产物
+        name = map_shell.binary_artifact_name(source)
+        with cache_manager.lock(f"artifact:{map_id}:{name}", timeout=300, blocking_timeout=300):
+            artifact_path = ensure_binary_artifact(source, name)
+
+    return send_file(os.path.abspath(artifact_path), mimetype=block_codec.CONTENT_TYPE,
+                     etag=False, conditional=False)
 
 @bp.route('/maps/<int:map_id>/blocks', methods=['GET'])
+@conditional_map_response(scope='artifact', cache_control=CACHE_CONTROL_ARTIFACT)
+@alternate_format('ndjson', stream_map_blocks)
+@alternate_format('binary', binary_map_blocks)
 @api_response()
 @monitor_performance('api_get_map_blocks')
 @log_user_activity('获取地图方块数据')
-@cache_result(expire=600)  # 缓存10分钟
+@cache_result(expire=600, stale_ttl=300, tags=('map:{map_id}',))  # 缓存10分钟
 def get_map_blocks(map_id):
-    """获取地图的方块数据用于3D渲染"""
+    """获取地图的方块数据用于3D渲染，指定 lod=2/4/8 时返回整张地图的降采样数据"""
     try:
-        map_data = MapData.query.get_or_404(map_id)
+        map_data = MapData.query.get(map_id)
+        if not map_data:
+            return APIResponse.not_found(f'地图 {map_id} 不存在')
 
         if not map_data.is_parsed:
             return APIResponse.error("地图尚未解析完成", status_code=400)
 
+        if 'lod' in request.args:
+            store, error = _parsed_block_store(map_id)
+            if error:
+                return error
+
+            level, error = _requested_lod(store)
+            if error:
+                return error
+            if level is None:
+                level = map_lod.find_level(_load_lod_index(store), 1)
+
+            return APIResponse.success(data={
+                'geometries': [],
+                'materials': {},
+                'blocks': map_lod.read_level_blocks(store, level['factor']),
+                'lod': level
+            })
+
         # 从缓存的JSON文件读取3D数据
         threejs_cache_path = os.path.join(
-            current_app.config.get('MODELS_CACHE_FOLDER', 'models_cache'),
+            current_app.config.get('MODEL_CACHE_DIR', 'models_cache'),
             f'threejs_data_{map_id}.json'
         )
 
         if os.path.exists(threejs_cache_path):
-            with open(threejs_cache_path, 'r') as f:
-                blocks_data = json.load(f)
-            return APIResponse.success(data=blocks_data)
+            # 产物已是JSON，直接拼接进响应，不解码再编码
+            return APIResponse.success(data=RawJSON.from_file(threejs_cache_path))
         else:
             # 如果缓存不存在，重新生成
             parser = MCAParser()
-            blocks_data = parser.generate_threejs_data(map_data.file_path, map_id)
-            return APIResponse.success(data=blocks_data)
+            result = parser.generate_threejs_data(map_data.file_path, map_id, output_dir=os.path.dirname(threejs_cache_path))
+            if not result.get('success'):
+                return APIResponse.error(f"生成方块数据失败: {result.get('error')}")
+            return APIResponse.success(data=result['data'])
 
     except Exception as e:
         log_error(f"获取地图方块数据失败: {str(e)}", extra={'map_id': map_id})
         return APIResponse.error("获取地图方块数据失败")
 
+def _load_volume_counts(store):
+    """读取方块计数前缀和，旧地图没有时按需生成"""
+    volume = volume_counts.load_volume_counts(store)
+    if volume is None:
+        with cache_manager.lock(f"artifact:{store.map_data_id}:volume_counts", timeout=300, blocking_timeout=300):
+            volume = volume_counts.ensure_volume_counts(store)
+    return volume
+
+@bp.route('/maps/<int:map_id>/blocks/counts', methods=['GET'])
+@api_response()
+@monitor_performance('api_get_block_counts')
+def get_block_counts(map_id):
+    """
+    统计包围盒内的方块数量：非空气方块总数和各高频方块类型的数量
+
+    bbox=x1,y1,z1,x2,y2,z2 可重复；annotation_id 可重复，统计标注包围盒。
+    每个包围盒只需 8 次查表，适合框选时实时刷新。数量为解析采样点数，乘以 sample_volume 为估算的实际方块数。
+    """
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return error
+
+    boxes = []
+    try:
+        for raw in request.args.getlist('bbox'):
+            values = [int(value) for value in raw.split(',')]
+            if len(values) != 6:
+                raise ValueError('bbox 需要 6 个整数')
+            boxes.append(spatial_service.normalize_box(values))
+        annotation_ids = [int(value) for value in request.args.getlist('annotation_id')]
+    except ValueError as e:
+        return APIResponse.validation_error(f'参数格式错误: {e}')
+
+    if annotation_ids:
+        annotations = Annotation.query.filter(
+            Annotation.map_data_id == map_id, Annotation.id.in_(annotation_ids)
+        ).all()
+        found = {annotation.id: annotation for annotation in annotations}
+        missing = [annotation_id for annotation_id in annotation_ids if annotation_id not in found]
+        if missing:
+            return APIResponse.not_found(f"标注不存在: {', '.join(map(str, missing))}")
+        boxes.extend(
+            (found[i].min_x, found[i].min_y, found[i].min_z, found[i].max_x, found[i].max_y, found[i].max_z)
+            for i in annotation_ids
+        )
+
+    if not boxes:
+        return APIResponse.validation_error('需要 bbox 或 annotation_id 参数')
+    if len(boxes) > 100:
+        return APIResponse.validation_error('一次最多统计 100 个包围盒')
+
+    volume = _load_volume_counts(store)
+    results = volume_counts.describe_counts(volume, boxes)
+    for result, annotation_id in zip(results[len(boxes) - len(annotation_ids):], annotation_ids):
+        result['annotation_id'] = annotation_id
+
+    cell_size = volume['cell_size'].tolist()
+    return APIResponse.success({
+        'boxes': results,
+        'types': volume['type_names'],
+        'cell_size': cell_size,
+        'sample_volume': int(volume['sample_step'].prod()),
+        'exact': cell_size == volume['sample_step'].tolist()
+    }, '统计方块数量成功')
+
+def _load_tile_manifest(store):
+    """读取瓦片清单，旧地图没有瓦片时按需生成"""
+    manifest = map_tiles.load_manifest(store)
+    if manifest is None:
+        with cache_manager.lock(f"artifact:{store.map_data_id}:tiles", timeout=300, blocking_timeout=300):
+            manifest = map_tiles.ensure_tiles(store)
+    return manifest
+
+@bp.route('/maps/<int:map_id>/tiles', methods=['GET'])
+@conditional_map_response(scope='artifact', cache_control=CACHE_CONTROL_ARTIFACT)
+@api_response()
+@monitor_performance('api_get_map_tiles')
+def get_map_tiles(map_id):
+    """获取地图瓦片清单：每个瓦片的坐标、包围盒、方块数量和ETag"""
+    try:
+        store, error = _parsed_block_store(map_id)
+        if error:
+            return error
+
+        manifest = _load_tile_manifest(store)
+        return APIResponse.success(data=dict(
+            manifest,
+            map_id=map_id,
+            url_template=f'/api/maps/{map_id}/tiles/{{tx}}/{{tz}}',
+            mesh_url_template=f'/api/maps/{map_id}/tiles/{{tx}}/{{tz}}/mesh'
+        ))
+
+    except Exception as e:
+        log_error(f"获取地图瓦片清单失败: {str(e)}", extra={'map_id': map_id})
+        return APIResponse.error("获取地图瓦片清单失败")
+
+@bp.route('/maps/<int:map_id>/tiles/<int(signed=True):tile_x>/<int(signed=True):tile_z>', methods=['GET'])
+@monitor_performance('api_get_map_tile')
+def get_map_tile(map_id, tile_x, tile_z):
+    """以二进制格式返回单个瓦片，ETag为瓦片内容哈希，与清单中一致"""
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return make_json_response(error)
+
+    manifest = _load_tile_manifest(store)
+    tile = map_tiles.find_tile(manifest, tile_x, tile_z)
+    if tile is None:
+        return make_json_response(APIResponse.not_found("瓦片不存在"))
+
+    response = send_file(
+        os.path.abspath(map_tiles.tile_path(store, tile_x, tile_z)),
+        mimetype=block_codec.CONTENT_TYPE, etag=tile['etag'], conditional=True
+    )
+    response.headers['Cache-Control'] = CACHE_CONTROL_ARTIFACT
+    return response
+
+@bp.route('/maps/<int:map_id>/chunks/<int(signed=True):chunk_x>/<int(signed=True):chunk_z>/mesh', methods=['GET'])
+@conditional_map_response(scope='artifact', cache_control=CACHE_CONTROL_ARTIFACT)
+@monitor_performance('api_get_chunk_mesh')
+def get_chunk_mesh(map_id, chunk_x, chunk_z):
+    """返回单个区块的贪心网格（只含可见面），格式说明见 app.services.mesher"""
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return make_json_response(error)
+
+    # 只为存储中存在的区块生成网格，任意坐标都落盘会被用来占满磁盘
+    if not store.has_chunk(chunk_x, chunk_z):
+        return make_json_response(APIResponse.not_found("区块不存在"))
+
+    path = mesher.ensure_chunk_mesh(store, chunk_x, chunk_z)
+    return send_file(os.path.abspath(path), mimetype=mesher.CONTENT_TYPE, etag=False, conditional=False)
+
+@bp.route('/maps/<int:map_id>/tiles/<int(signed=True):tile_x>/<int(signed=True):tile_z>/mesh', methods=['GET'])
+@conditional_map_response(scope='artifact', cache_control=CACHE_CONTROL_ARTIFACT)
+@monitor_performance('api_get_tile_mesh')
+def get_tile_mesh(map_id, tile_x, tile_z):
+    """返回一个瓦片范围内所有区块合并后的贪心网格"""
+    store, error = _parsed_block_store(map_id)
+    if error:
+        return make_json_response(error)
+
+    manifest = _load_tile_manifest(store)
+    if map_tiles.find_tile(manifest, tile_x, tile_z) is None:
+        return make_json_response(APIResponse.not_found("瓦片不存在"))
+
+    path = mesher.ensure_tile_mesh(store, tile_x, tile_z, manifest['tile_size'])
+    return send_file(os.path.abspath(path), mimetype=mesher.CONTENT_TYPE, etag=False, conditional=False)
+
 @bp.route('/maps/<int:map_id>/export/obj', methods=['GET'])
 @api_response()
 @monitor_performance('api_export_obj')
@@ -203,6 +543,7 @@ def parse_map(map_id):
         # 更新地图状态
         map_data.status = 'parsing'
         db.session.commit()
+        invalidate_map_cache(map_id)
 
         return APIResponse.success({
             'task_id': result.get('task_id'),
@@ -224,23 +565,150 @@ def get_map_annotations(map_id):
         if not map_data:
             return APIResponse.not_found(f'地图 {map_id} 不存在')
 
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 200)
-
-        annotations_pagination = Annotation.query.filter_by(
-            map_data_id=map_id
-        ).paginate(page=page, per_page=per_page, error_out=False)
-
-        annotations_data = [ann.to_dict() for ann in annotations_pagination.items]
-
-        return APIResponse.paginated(
-            annotations_data, page, per_page, annotations_pagination.total,
-            '获取标注数据成功'
+        return _paginated_listing(
+            Annotation.query.filter_by(map_data_id=map_id), Annotation,
+            lambda items: [ann.to_dict() for ann in items], 50, 200, '获取标注数据成功'
         )
     except Exception as e:
         log_error(e, context=f'获取地图标注: {map_id}')
         return APIResponse.internal_error('获取标注数据���败')
 
+@bp.route('/maps/<int:map_id>/annotations/import', methods=['POST'])
+@api_response()
+@monitor_performance('api_import_annotations')
+@log_user_activity('批量导入标注')
+def import_map_annotations(map_id):
+    """
+    批量导入标注，请求体为 NDJSON（每行一个标注）或带表头的 CSV
+
+    format 参数或 Content-Type（text/csv）选择格式；on_error=abort 时有任何无效行则全部不导入
+    """
+    map_data = MapData.query.get(map_id)
+    if not map_data:
+        return APIResponse.not_found(f'地图 {map_id} 不存在')
+
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    on_error = request.args.get('on_error', 'skip')
+    if on_error not in ('skip', 'abort'):
+        return APIResponse.validation_error('on_error 仅支持 skip / abort')
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        result = annotation_bulk.import_annotations(map_data, stream, fmt, on_error)
+    except annotation_bulk.AnnotationImportError as e:
+        return APIResponse.validation_error(str(e))
+    except UnicodeDecodeError:
+        return APIResponse.validation_error('请求体必须是UTF-8编码')
+
+    if result['inserted']:
+        invalidate_map_cache(map_id)
+
+    if result['rolled_back']:
+        return APIResponse.error(
+            f"{result['failed']} 行无效，未导入任何标注", code='IMPORT_ABORTED', details=result, status_code=422
+        )
+    return APIResponse.success(result, f"导入 {result['inserted']} 条标注，{result['failed']} 行无效")
+
+@bp.route('/maps/<int:map_id>/annotations/export', methods=['GET'])
+@monitor_performance('api_export_annotations')
+def export_map_annotations(map_id):
+    """流式导出地图的全部标注（format=ndjson / csv），格式与批量导入一致"""
+    if not db.session.query(MapData.id).filter_by(id=map_id).first():
+        return make_json_response(APIResponse.not_found(f'地图 {map_id} 不存在'))
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt == 'csv':
+        body, mimetype = annotation_bulk.export_csv(map_id), 'text/csv'
+    elif fmt == 'ndjson':
+        body, mimetype = annotation_bulk.export_ndjson(map_id, current_app.json.dumps_bytes), 'application/x-ndjson'
+    else:
+        return make_json_response(APIResponse.validation_error('format 仅支持 ndjson / csv'))
+
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=map_{map_id}_annotations.{fmt}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _coordinate_arg(name, count):
+    """解析逗号分隔的整数坐标参数，缺失返回 None，格式错误抛出 ValueError"""
+    raw = request.args.get(name)
+    if raw is None:
+        return None
+    values = [int(value) for value in raw.split(',')]
+    if len(values) != count:
+        raise ValueError(f'{name} 需要 {count} 个整数')
+    return values
+
+def _spatial_limit(name, default, maximum):
+    value = request.args.get(name, default, type=int)
+    return max(1, min(value, maximum))
+
+@bp.route('/maps/<int:map_id>/annotations/intersect', methods=['GET'])
+@api_response()
+@monitor_performance('api_annotations_intersect')
+def get_intersecting_annotations(map_id):
+    """与包围盒相交的标注：bbox=x1,y1,z1,x2,y2,z2"""
+    if not db.session.query(MapData.id).filter_by(id=map_id).first():
+        return APIResponse.not_found(f'地图 {map_id} 不存在')
+    try:
+        bbox = _coordinate_arg('bbox', 6)
+    except ValueError as e:
+        return APIResponse.validation_error(f'bbox 格式错误: {e}')
+    if bbox is None:
+        return APIResponse.validation_error('缺少 bbox 参数')
+
+    box = spatial_service.normalize_box(bbox)
+    annotations = spatial_service.intersecting(map_id, box, _spatial_limit('limit', 500, 5000))
+    return APIResponse.success({
+        'bbox': {'min': list(box[:3]), 'max': list(box[3:])},
+        'annotations': [annotation.to_dict() for annotation in annotations],
+        'count': len(annotations)
+    }, '查询相交标注成功')
+
+@bp.route('/maps/<int:map_id>/annotations/contain', methods=['GET'])
+@api_response()
+@monitor_performance('api_annotations_contain')
+def get_containing_annotations(map_id):
+    """包含某个点（point=x,y,z）或整个包围盒（bbox=x1,y1,z1,x2,y2,z2）的标注"""
+    if not db.session.query(MapData.id).filter_by(id=map_id).first():
+        return APIResponse.not_found(f'地图 {map_id} 不存在')
+    try:
+        point = _coordinate_arg('point', 3)
+        bbox = _coordinate_arg('bbox', 6) if point is None else point + point
+    except ValueError as e:
+        return APIResponse.validation_error(f'坐标格式错误: {e}')
+    if bbox is None:
+        return APIResponse.validation_error('需要 point 或 bbox 参数')
+
+    box = spatial_service.normalize_box(bbox)
+    annotations = spatial_service.containing(map_id, box, _spatial_limit('limit', 500, 5000))
+    return APIResponse.success({
+        'bbox': {'min': list(box[:3]), 'max': list(box[3:])},
+        'annotations': [annotation.to_dict() for annotation in annotations],
+        'count': len(annotations)
+    }, '查询包含标注成功')
+
+@bp.route('/maps/<int:map_id>/annotations/nearest', methods=['GET'])
+@api_response()
+@monitor_performance('api_annotations_nearest')
+def get_nearest_annotations(map_id):
+    """距离点（point=x,y,z）最近的 k 个标注，按包围盒的欧氏距离升序"""
+    if not db.session.query(MapData.id).filter_by(id=map_id).first():
+        return APIResponse.not_found(f'地图 {map_id} 不存在')
+    try:
+        point = _coordinate_arg('point', 3)
+    except ValueError as e:
+        return APIResponse.validation_error(f'point 格式错误: {e}')
+    if point is None:
+        return APIResponse.validation_error('缺少 point 参数')
+
+    ranked = spatial_service.nearest(map_id, point, _spatial_limit('k', 10, 200))
+    return APIResponse.success({
+        'point': point,
+        'annotations': [dict(annotation.to_dict(), distance=round(distance, 3)) for annotation, distance in ranked],
+        'count': len(ranked)
+    }, '查询最近标注成功')
+
 @bp.route('/annotations', methods=['POST'])
 @api_response()
 @validate_json_request(['map_data_id', 'annotation_type', 'coordinates'])
@@ -268,6 +736,7 @@ def create_annotation():
 
     db.session.add(annotation)
     db.session.commit()
+    invalidate_map_cache(annotation.map_data_id)
 
     return APIResponse.created(annotation.to_dict(), '标注创建成功')
 
@@ -277,9 +746,6 @@ def create_annotation():
 def get_training_jobs():
     """获取训练任务列表"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
-
         query = TrainingJob.query
 
         # 支持按状态过滤
@@ -287,15 +753,8 @@ def get_training_jobs():
         if status:
             query = query.filter(TrainingJob.status == status)
 
-        jobs_pagination = query.order_by(
-            TrainingJob.created_at.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
-
-        jobs_data = [job.to_dict() for job in jobs_pagination.items]
-
-        return APIResponse.paginated(
-            jobs_data, page, per_page, jobs_pagination.total,
-            '获取训练任务成功'
+        return _paginated_listing(
+            query, TrainingJob, lambda items: [job.to_dict() for job in items], 20, 100, '获取训练任务成功'
         )
     except Exception as e:
         log_error(e, context='获取训练任务列表')
@@ -348,37 +807,110 @@ def get_training_job(job_id):
         log_error(e, context=f'获取训练任务详情: {job_id}')
         return APIResponse.internal_error('获取训练任务详情失败')
 
+@bp.route('/training-jobs/<int:job_id>/events', methods=['GET'])
+def stream_training_job_events(job_id):
+    """训练进度事件流（SSE），支持 Last-Event-ID 续传"""
+    job = TrainingJob.query.get(job_id)
+    if not job:
+        return make_json_response(APIResponse.not_found(f'训练任务 {job_id} 不存在'))
+
+    snapshot = {
+        'training_job_id': job_id,
+        'state': job.status,
+        'progress': job.progress or 0.0
+    }
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+    return sse_response(progress_stream('training', job_id, last_event_id, snapshot))
+
+@bp.route('/tasks/<task_id>/events', methods=['GET'])
+def stream_task_events(task_id):
+    """后台任务（地图生成、导出等）进度事件流（SSE），按Celery任务ID订阅"""
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+    return sse_response(progress_stream('task', task_id, last_event_id))
+
 @bp.route('/system/stats', methods=['GET'])
 @api_response()
 @monitor_performance('api_system_stats')
-@cache_result(expire=60)  # 缓存1分钟
+@cache_result(expire=60, tags=('stats',))  # 缓存1分钟
 def get_system_stats():
     """获取系统统计信息"""
     try:
-        stats = {
-            'maps': {
-                'total': MapData.query.count(),
-                'parsed': MapData.query.filter_by(status='parsed').count(),
-                'parsing': MapData.query.filter_by(status='parsing').count(),
-                'error': MapData.query.filter_by(status='error').count()
-            },
-            'annotations': {
-                'total': Annotation.query.count()
-            },
-            'training_jobs': {
-                'total': TrainingJob.query.count(),
-                'pending': TrainingJob.query.filter_by(status='pending').count(),
-                'running': TrainingJob.query.filter_by(status='running').count(),
-                'completed': TrainingJob.query.filter_by(status='completed').count(),
-                'failed': TrainingJob.query.filter_by(status='failed').count()
-            }
-        }
+        stats = stats_service.get_system_stats()
 
         return APIResponse.success(stats, '获取系统统计成功')
     except Exception as e:
         log_error(e, context='获取系统统计')
         return APIResponse.internal_error('获取系统统计失败')
 
+@bp.route('/admin/profiles', methods=['GET'])
+@require_admin_token()
+@api_response()
+def list_profiles():
+    """列出已保存的慢请求/慢任务剖析"""
+    profiles = profiling.list_profiles()
+
+    kind = request.args.get('kind')
+    if kind:
+        profiles = [p for p in profiles if p.get('kind') == kind]
+
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    return APIResponse.success(profiles[:limit], '获取剖析列表成功')
+
+@bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+@require_admin_token()
+def download_profile(profile_id):
+    """
+    下载剖析结果：sampler 为 collapsed stacks 文本，cprofile 为 pstats 文件；
+    pstats 文件可用 format=text 查看按 sort 排序的前 limit 项
+    """
+    path = profiling.get_profile_file(profile_id)
+    if path is None:
+        return APIResponse.not_found('剖析结果不存在')
+
+    if path.endswith('.prof') and request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            return APIResponse.validation_error('sort 仅支持 cumulative / tottime / ncalls')
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        return current_app.response_class(
+            profiling.render_pstats(path, limit, sort), mimetype='text/plain'
+        )
+
+    return send_file(
+        path, as_attachment=True, download_name=os.path.basename(path),
+        mimetype='application/octet-stream' if path.endswith('.prof') else 'text/plain'
+    )
+
+@bp.route('/search', methods=['GET'])
+@api_response()
+@monitor_performance('api_search')
+def global_search():
+    """全文搜索地图和标注，结果按相关度排序"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return APIResponse.validation_error('缺少搜索关键词 q')
+
+    types = request.args.get('type', ','.join(search_service.SEARCH_TYPES)).split(',')
+    invalid = [t for t in types if t not in search_service.SEARCH_TYPES]
+    if invalid:
+        return APIResponse.validation_error(
+            f'不支持的搜索类型: {", ".join(invalid)}，可选: {", ".join(search_service.SEARCH_TYPES)}'
+        )
+
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    map_id = request.args.get('map_id', type=int)
+
+    try:
+        result = search_service.search(query, types=types, limit=limit, map_id=map_id)
+        return APIResponse.success(result, '搜索成功')
+    except Exception as e:
+        log_error(e, context=f'全文搜索: {query}')
+        return APIResponse.internal_error('搜索失败')
+
 @bp.route('/health', methods=['GET'])
 @api_response()
 def health_check():
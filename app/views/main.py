@@ -2,9 +2,15 @@
 主页面视图
 """
 
-from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for, current_app
 from app.models.map_data import MapData
 from app.models.annotation import Annotation
+from app.services import stats_service
+from app.services import search_service
+from app.utils.cache import cache_result, delete_map_cache
+from app.utils.http_cache import conditional_map_response
+from app.utils.pagination import keyset_paginate, cursor_requested, InvalidCursorError
+from app.utils.metrics import metrics
 from app import db
 import json
 import os
@@ -19,36 +25,27 @@ def index():
 @bp.route('/dashboard')
 def dashboard():
     """仪表板"""
-    # 获取统计数据
-    total_maps = MapData.query.count()
-    parsed_maps = MapData.query.filter_by(is_parsed=True).count()
-    total_annotations = Annotation.query.count()
-    
+    # 获取统计数据（读取计数行）
+    stats = stats_service.get_dashboard_stats()
+
     recent_maps = MapData.query.order_by(MapData.created_at.desc()).limit(5).all()
-    
-    stats = {
-        'total_maps': total_maps,
-        'parsed_maps': parsed_maps,
-        'pending_maps': total_maps - parsed_maps,
-        'total_annotations': total_annotations,
-        'recent_maps': [map_data.to_dict() for map_data in recent_maps]
-    }
+    stats['recent_maps'] = MapData.serialize_many(recent_maps)
     
     return render_template('dashboard.html', stats=stats)
 
 @bp.route('/api/stats')
 def api_stats():
     """API: 获取统计数据"""
-    total_maps = MapData.query.count()
-    parsed_maps = MapData.query.filter_by(is_parsed=True).count()
-    total_annotations = Annotation.query.count()
-    
-    return jsonify({
-        'total_maps': total_maps,
-        'parsed_maps': parsed_maps,
-        'pending_maps': total_maps - parsed_maps,
-        'total_annotations': total_annotations
-    })
+    return jsonify(stats_service.get_dashboard_stats())
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 指标（汇总所有工作进程）"""
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return jsonify({'error': 'metrics disabled'}), 404
+    return current_app.response_class(
+        metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 @bp.route('/maps')
 def map_list():
@@ -63,6 +60,7 @@ def map_list():
     return render_template('map_list.html', maps=maps)
 
 @bp.route('/maps/<int:map_id>')
+@conditional_map_response(scope='record')
 def map_viewer(map_id):
     """地图查看器页面"""
     map_data = MapData.query.get_or_404(map_id)
@@ -75,7 +73,7 @@ def map_viewer(map_id):
 
     # 尝试加载Three.js数据
     threejs_data = None
-    threejs_file_path = os.path.join('models_cache', f'threejs_data_{map_id}.json')
+    threejs_file_path = os.path.join(current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'threejs_data_{map_id}.json')
     if os.path.exists(threejs_file_path):
         try:
             with open(threejs_file_path, 'r', encoding='utf-8') as f:
@@ -92,44 +90,57 @@ def map_viewer(map_id):
 @bp.route('/api/maps')
 def api_map_list():
     """API: 获取地图列表"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    result = _map_list_page()
+    if isinstance(result, tuple):
+        body, status_code = result
+        return jsonify(body), status_code
+    return jsonify(result)
+
+@cache_result(expire=300, stale_ttl=60, tags=('maps:list',))  # 缓存键包含查询参数，过期后1分钟内返回旧值并后台刷新
+def _map_list_page():
+    """
+    地图列表的一页（只含已解析的地图）
+
+    默认 OFFSET 分页并返回总数；传入 cursor 或 mode=cursor 时按游标分页，
+    search / q 按文件名、世界名过滤。
+    """
+    per_page = max(1, min(request.args.get('per_page', 10, type=int), 100))
+    query = MapData.query.filter_by(is_parsed=True)
+
+    search = (request.args.get('search') or request.args.get('q') or '').strip()
+    if search:
+        query = search_service.filter_maps(query, search)
+
+    if cursor_requested(request.args):
+        try:
+            result = keyset_paginate(query, MapData, request.args.get('cursor'), per_page)
+        except InvalidCursorError as e:
+            return {'error': str(e)}, 400
+
+        response = {
+            'maps': MapData.serialize_many(result['items']),
+            'next_cursor': result['next_cursor'],
+            'prev_cursor': result['prev_cursor'],
+            'has_next': result['next_cursor'] is not None,
+            'has_prev': result['prev_cursor'] is not None
+        }
+        if request.args.get('count', 'false').lower() == 'true':
+            response['total'] = query.order_by(None).count()
+        return response
 
-    maps = MapData.query.filter_by(is_parsed=True).paginate(
+    page = request.args.get('page', 1, type=int)
+    maps = query.order_by(MapData.created_at.desc(), MapData.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
-    return jsonify({
-        'maps': [map_data.to_dict() for map_data in maps.items],
+    return {
+        'maps': MapData.serialize_many(maps.items),
         'total': maps.total,
         'pages': maps.pages,
         'current_page': page,
         'has_next': maps.has_next,
         'has_prev': maps.has_prev
-    })
-
-@bp.route('/api/maps/<int:map_id>')
-def api_map_detail(map_id):
-    """API: 获取地图详细信息"""
-    map_data = MapData.query.get_or_404(map_id)
-
-    if not map_data.is_parsed:
-        return jsonify({'error': '地图尚未解析'}), 404
-
-    # 加载Three.js数据
-    threejs_data = None
-    threejs_file_path = os.path.join('models_cache', f'threejs_data_{map_id}.json')
-    if os.path.exists(threejs_file_path):
-        try:
-            with open(threejs_file_path, 'r', encoding='utf-8') as f:
-                threejs_data = json.load(f)
-        except Exception as e:
-            return jsonify({'error': f'加载地图数据失败: {str(e)}'}), 500
-
-    return jsonify({
-        'map_data': map_data.to_dict(),
-        'threejs_data': threejs_data
-    })
+    }
 
 @bp.route('/api/maps/<int:map_id>', methods=['DELETE'])
 def api_delete_map(map_id):
@@ -146,8 +157,8 @@ def api_delete_map(map_id):
 
         # 删除缓存的JSON文件
         cache_files = [
-            os.path.join('models_cache', f'map_data_{map_id}.json'),
-            os.path.join('models_cache', f'threejs_data_{map_id}.json')
+            os.path.join(current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'map_data_{map_id}.json'),
+            os.path.join(current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'threejs_data_{map_id}.json')
         ]
 
         for cache_file in cache_files:
@@ -157,6 +168,7 @@ def api_delete_map(map_id):
         # 删除数据库记录（会级联删除相关的标注和训练任务）
         db.session.delete(map_data)
         db.session.commit()
+        delete_map_cache(map_id)
 
         # 删除文件
         for file_path in files_to_delete:
@@ -192,8 +204,8 @@ def delete_map(map_id):
 
         # 删除缓存的JSON文件
         cache_files = [
-            os.path.join('models_cache', f'map_data_{map_id}.json'),
-            os.path.join('models_cache', f'threejs_data_{map_id}.json')
+            os.path.join(current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'map_data_{map_id}.json'),
+            os.path.join(current_app.config.get('MODEL_CACHE_DIR', 'models_cache'), f'threejs_data_{map_id}.json')
         ]
 
         for cache_file in cache_files:
@@ -206,6 +218,7 @@ def delete_map(map_id):
         # 删除数据库记录
         db.session.delete(map_data)
         db.session.commit()
+        delete_map_cache(map_id)
 
         # 删除文件
         for file_path in files_to_delete:
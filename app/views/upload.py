@@ -9,7 +9,11 @@ from werkzeug.utils import secure_filename
 from app import db
 from app.models.map_data import MapData
 from app.services.mca_parser import MCAParser
-from app.utils.validators import allowed_file
+from app.services.upload_session import UploadSession, UploadSessionError, parse_content_range
+from app.utils.validators import allowed_file, validate_region_header, REGION_HEADER_SIZE
+from app.utils.cache import cache_manager, invalidate_map_cache
+from app.utils.progress import progress_stream, parse_last_event_id
+from app.utils.response import sse_response
 
 bp = Blueprint('upload', __name__)
 
@@ -18,6 +22,101 @@ def upload_page():
     """上传页面"""
     return render_template('upload.html')
 
+def _register_and_parse(filename, original_filename, file_path, file_size, extra=None):
+    """
+    为已保存的上传文件创建地图记录并启动解析
+
+    优先提交Celery异步任务，失败时回退到同步解析。
+
+    Args:
+        extra: 附加到响应中的字段
+    """
+    extra = extra or {}
+
+    # 创建数据库记录
+    map_data = MapData(
+        filename=filename,
+        original_filename=original_filename,
+        file_path=file_path,
+        file_size=file_size,
+        parse_status='pending'
+    )
+    
+    db.session.add(map_data)
+    db.session.commit()
+    invalidate_map_cache(map_data.id)
+    
+    # 启动异步解析任务
+    try:
+        from app.tasks import celery, parse_mca_file_task
+        task = parse_mca_file_task.delay(map_data.id)
+
+        # 更新任务ID
+        map_data.task_id = task.id
+        map_data.parse_status = 'parsing'
+        db.session.commit()
+
+        return jsonify({
+            'message': 'File uploaded successfully, parsing started',
+            'map_id': map_data.id,
+            'task_id': task.id,
+            'filename': original_filename,
+            'status': 'parsing',
+            **extra
+        })
+
+    except Exception as e:
+        # 如果异 asynchronous 任务启动失败，回退到同步解析
+        current_app.logger.warning(f"异步任务启动失败，回退到同步解析: {str(e)}")
+
+        try:
+            map_data.parse_status = 'parsing'
+            db.session.commit()
+
+            parser = MCAParser()
+            result = parser.parse_file(file_path, map_data.id)
+
+            if result.get('success', False):
+                map_data.parse_status = 'completed'
+                map_data.is_parsed = True
+                db.session.commit()
+                invalidate_map_cache(map_data.id)
+
+                return jsonify({
+                    'message': 'File uploaded and parsed successfully',
+                    'map_id': map_data.id,
+                    'filename': original_filename,
+                    'status': 'completed',
+                    **extra
+                })
+            else:
+                map_data.parse_status = 'failed'
+                map_data.parse_error = result.get('error', 'Unknown parsing error')
+                db.session.commit()
+                invalidate_map_cache(map_data.id)
+
+                return jsonify({
+                    'message': 'File uploaded but parsing failed',
+                    'map_id': map_data.id,
+                    'filename': original_filename,
+                    'error': result.get('error', 'Unknown parsing error'),
+                    **extra
+                }), 206
+
+        except Exception as sync_e:
+            map_data.parse_status = 'failed'
+            map_data.parse_error = str(sync_e)
+            db.session.commit()
+            invalidate_map_cache(map_data.id)
+
+            return jsonify({
+                'message': 'File uploaded but parsing failed',
+                'map_id': map_data.id,
+                'filename': original_filename,
+                'error': str(sync_e),
+                **extra
+            }), 206
+
 @bp.route('/api/upload', methods=['POST'])
 def upload_file():
     """API: 上传MCA文件"""
@@ -41,90 +140,112 @@ def upload_file():
         file.save(file_path)
         file_size = os.path.getsize(file_path)
         
-        # 创建数据库记录
-        map_data = MapData(
-            filename=filename,
-            original_filename=original_filename,
-            file_path=file_path,
-            file_size=file_size,
-            parse_status='pending'
-        )
-        
-        db.session.add(map_data)
-        db.session.commit()
-        
-        # 启动异步解析任务
-        try:
-            from app.tasks import celery, parse_mca_file_task
-            task = parse_mca_file_task.delay(map_data.id)
+        # 尽早校验区域文件头，无效文件不进入解析队列
+        with open(file_path, 'rb') as f:
+            is_valid, error, _ = validate_region_header(f.read(REGION_HEADER_SIZE), file_size)
+        if not is_valid:
+            os.remove(file_path)
+            return jsonify({'error': f'无效的区域文件: {error}'}), 422
 
-            # 更新任务ID
-            map_data.task_id = task.id
-            map_data.parse_status = 'parsing'
-            db.session.commit()
+        return _register_and_parse(filename, original_filename, file_path, file_size)
 
-            return jsonify({
-                'message': 'File uploaded successfully, parsing started',
-                'map_id': map_data.id,
-                'task_id': task.id,
-                'filename': original_filename,
-                'status': 'parsing'
-            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        except Exception as e:
-            # 如果异 asynchronous 任务启动失败，回退到同步解析
-            current_app.logger.warning(f"异步任务启动失败，回退到同步解析: {str(e)}")
+@bp.route('/api/uploads', methods=['POST'])
+def init_upload():
+    """
+    API: 创建分片上传会话
 
-            try:
-                map_data.parse_status = 'parsing'
-                db.session.commit()
+    请求体: {"filename": ..., "size": 字节数, "sha256": 可选}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        total_size = int(data.get('size', -1))
+    except (TypeError, ValueError):
+        total_size = -1
+    if total_size < 0:
+        return jsonify({'error': 'Invalid file size'}), 400
 
-                parser = MCAParser()
-                result = parser.parse_file(file_path, map_data.id)
-
-                if result.get('success', False):
-                    map_data.parse_status = 'completed'
-                    map_data.is_parsed = True
-                    db.session.commit()
-
-                    return jsonify({
-                        'message': 'File uploaded and parsed successfully',
-                        'map_id': map_data.id,
-                        'filename': original_filename,
-                        'status': 'completed'
-                    })
-                else:
-                    map_data.parse_status = 'failed'
-                    map_data.parse_error = result.get('error', 'Unknown parsing error')
-                    db.session.commit()
-
-                    return jsonify({
-                        'message': 'File uploaded but parsing failed',
-                        'map_id': map_data.id,
-                        'filename': original_filename,
-                        'error': result.get('error', 'Unknown parsing error')
-                    }), 206
-
-            except Exception as sync_e:
-                map_data.parse_status = 'failed'
-                map_data.parse_error = str(sync_e)
-                db.session.commit()
+    try:
+        session = UploadSession.create(data.get('filename', ''), total_size, data.get('sha256'))
+    except UploadSessionError as e:
+        return jsonify({'error': e.message}), e.status_code
+
+    result = session.to_dict()
+    result['chunk_size'] = current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    return jsonify(result), 201
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """API: 查询上传进度，续传时从 received 开始"""
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session.to_dict())
+
+@bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """API: 上传一个分片（Content-Range: bytes start-end/total，请求体为原始字节）"""
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    lock = cache_manager.lock(f"upload:{upload_id}", timeout=600)
+    if not lock.acquire(blocking=False):
+        return jsonify({'error': '该上传正在写入其他分片', **session.to_dict()}), 409
 
-                return jsonify({
-                    'message': 'File uploaded but parsing failed',
-                    'map_id': map_data.id,
-                    'filename': original_filename,
-                    'error': str(sync_e)
-                }), 206
+    try:
+        start, length, total = parse_content_range(request.headers.get('Content-Range'), request.content_length)
+        session.append(start, request.stream, length, total)
+    except UploadSessionError as e:
+        current = UploadSession.load(upload_id)
+        return jsonify({'error': e.message, **(current.to_dict() if current else {})}), e.status_code
+    finally:
+        lock.release()
+
+    return jsonify(session.to_dict())
+
+@bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """API: 完成分片上传，校验后创建地图记录并启动解析"""
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    lock = cache_manager.lock(f"upload:{upload_id}", timeout=600)
+    if not lock.acquire(blocking=False):
+        return jsonify({'error': '该上传正在写入分片'}), 409
 
+    try:
+        uploaded = session.finish()
+    except UploadSessionError as e:
+        return jsonify({'error': e.message}), e.status_code
+    finally:
+        lock.release()
+
+    try:
+        return _register_and_parse(
+            uploaded['filename'], uploaded['original_filename'], uploaded['file_path'], uploaded['file_size'],
+            extra={'sha256': uploaded['sha256'], 'chunk_count': uploaded['chunk_count']}
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """API: 放弃分片上传"""
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    session.abort()
+    return jsonify({'success': True, 'upload_id': upload_id})
+
 @bp.route('/api/maps')
 def list_maps():
     """API: 获取地图列表"""
     maps = MapData.query.order_by(MapData.created_at.desc()).all()
-    return jsonify([map_data.to_dict() for map_data in maps])
+    return jsonify(MapData.serialize_many(maps))
 
 @bp.route('/api/maps/<int:map_id>')
 def get_map(map_id):
@@ -133,12 +254,11 @@ def get_map(map_id):
     
     result = map_data.to_dict()
     
-    # 如果已解析，添加统计信息
+    # 如果已解析，添加统计信息（解析完成后已预热）
     if map_data.is_parsed:
         try:
-            parser = MCAParser()
-            stats = parser.get_map_stats(map_id)
-            result['stats'] = stats
+            from app.services.cache_warmer import load_map_stats
+            result['stats'] = load_map_stats(map_id)
         except Exception as e:
             result['stats_error'] = str(e)
     
@@ -173,6 +293,28 @@ def get_parse_status(map_id):
 
     return jsonify(result)
 
+@bp.route('/api/maps/<int:map_id>/events')
+def stream_parse_events(map_id):
+    """
+    API: 解析进度事件流（SSE）
+
+    一个长连接代替轮询状态接口；断线重连时浏览器自动携带 Last-Event-ID 补发错过的事件。
+    """
+    map_data = MapData.query.get_or_404(map_id)
+
+    snapshot = {
+        'map_id': map_id,
+        'state': map_data.parse_status,
+        'progress': map_data.parse_progress or 0.0,
+        'is_parsed': map_data.is_parsed,
+        'parse_error': map_data.parse_error
+    }
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+
+    return sse_response(progress_stream('map', map_id, last_event_id, snapshot))
+
 @bp.route('/api/maps/<int:map_id>', methods=['DELETE'])
 def delete_map(map_id):
     """API: 删除地图"""
@@ -196,6 +338,10 @@ def delete_map(map_id):
             except Exception as e:
                 current_app.logger.warning(f"无法删除文件 {map_data.file_path}: {str(e)}")
 
+        # 删除数据库记录
+        db.session.delete(map_data)
+        db.session.commit()
+
         # 删除缓存数据
         try:
             from app.utils.cache import delete_map_cache
@@ -204,10 +350,6 @@ def delete_map(map_id):
         except Exception as e:
             current_app.logger.warning(f"无法删除缓存: {str(e)}")
 
-        # 删除数据库记录
-        db.session.delete(map_data)
-        db.session.commit()
-
         return jsonify({
             'success': True,
             'message': f'地图 "{map_data.original_filename}" 已成功删除'
@@ -241,6 +383,7 @@ def retry_parse(map_id):
         map_data.is_parsed = False
         map_data.task_id = None
         db.session.commit()
+        invalidate_map_cache(map_id)
 
         # 启动新的解析任务
         try:
@@ -275,6 +418,7 @@ def retry_parse(map_id):
                 map_data.parse_error = result.get('error', 'Unknown parsing error')
 
             db.session.commit()
+            invalidate_map_cache(map_id)
 
             return jsonify({
                 'success': result.get('success', False),
@@ -5,6 +5,7 @@ Celery Worker配置文件
 """
 
 from app import create_app
+from app.utils.profiling import profile_task
 from celery import Celery
 
 def make_celery(app):
@@ -22,7 +23,8 @@ def make_celery(app):
         """确保任务在Flask应用上下文中运行"""
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return self.run(*args, **kwargs)
+                with profile_task(self.name, getattr(self.request, 'id', None)):
+                    return self.run(*args, **kwargs)
 
     celery.Task = ContextTask
     return celery
@@ -14,16 +14,65 @@ class Config:
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///craftne.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite 连接设置（WAL 下后台任务写入时请求仍可并发读取）
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # 毫秒
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or -64000)  # 负数表示KB，约64MB
+
+    # 服务器数据库连接池
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+
+    # JSON编码后端：auto（安装了orjson时使用）/ orjson / stdlib
+    JSON_BACKEND = os.environ.get('JSON_BACKEND') or 'auto'
     
     # 文件上传配置
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'app/static/uploads'
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
     ALLOWED_EXTENSIONS = {'mca', 'mcr'}
+
+    # 分片上传配置
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 8 * 1024 * 1024)  # 8MB
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE') or 500 * 1024 * 1024)  # 单个文件上限
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)  # 未完成的上传保留时间（秒）
     
     # Celery配置
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
     
+    # 文件缓存配置
+    FILE_CACHE_MAX_BYTES = int(os.environ.get('FILE_CACHE_MAX_BYTES') or 1024 * 1024 * 1024)  # 1GB
+    FILE_CACHE_SHARD_DEPTH = int(os.environ.get('FILE_CACHE_SHARD_DEPTH') or 2)
+
+    # 指标与日志配置
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # 多进程共享的指标目录，默认 instance/metrics
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 10)  # 进程累计值写盘间隔（秒）
+    REQUEST_LOG_ENABLED = os.environ.get('REQUEST_LOG_ENABLED', 'true').lower() == 'true'  # 每个请求记录开始/完成日志
+    PERFORMANCE_LOG_ENABLED = os.environ.get('PERFORMANCE_LOG_ENABLED', 'false').lower() == 'true'  # monitor_performance 每次调用记录日志
+
+    # 异步日志队列：队列满时 drop（丢弃并计数，错误日志仍会等待）或 block（等待 LOG_QUEUE_BLOCK_TIMEOUT 秒）
+    LOG_QUEUE_ENABLED = os.environ.get('LOG_QUEUE_ENABLED', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    LOG_QUEUE_POLICY = os.environ.get('LOG_QUEUE_POLICY') or 'drop'
+    LOG_QUEUE_BLOCK_TIMEOUT = float(os.environ.get('LOG_QUEUE_BLOCK_TIMEOUT') or 1.0)
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE') or 256)
+
+    # 性能剖析配置：按比例抽样请求和任务，耗时超过阈值的保存到 PROFILE_DIR（默认 instance/profiles）
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_MODE = os.environ.get('PROFILE_MODE') or 'sampler'  # sampler / cprofile
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.05)
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL') or 0.005)  # 采样间隔（秒）
+    PROFILE_SLOW_THRESHOLD = float(os.environ.get('PROFILE_SLOW_THRESHOLD') or 1.0)  # 慢请求/任务阈值（秒）
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES') or 200)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # 管理接口令牌（X-Admin-Token 请求头）
+
     # AI模型配置
     MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR') or 'models_cache'
     TRAINING_DATA_DIR = os.environ.get('TRAINING_DATA_DIR') or 'training_data'
@@ -32,6 +32,14 @@ class MCAParserConfig:
     # 预览配置
     PREVIEW_BLOCK_LIMIT = int(os.environ.get('MCA_PREVIEW_LIMIT', 1000))
 
+    # 细节层次（LOD）配置：各级降采样倍数，以及Three.js数据允许的最大方块数
+    LOD_FACTORS = tuple(int(f) for f in os.environ.get('MCA_LOD_FACTORS', '1,2,4,8').split(','))
+    THREEJS_BLOCK_LIMIT = int(os.environ.get('MCA_THREEJS_BLOCK_LIMIT', 50000))
+
+    # 方块计数前缀和配置：单独统计的高频方块类型数，以及所有前缀和表合计的最大单元数（超过时合并单元）
+    VOLUME_TOP_TYPES = int(os.environ.get('MCA_VOLUME_TOP_TYPES', 8))
+    VOLUME_MAX_CELLS = int(os.environ.get('MCA_VOLUME_MAX_CELLS', 16_000_000))
+
     # 兼容性配置
     COMPATIBILITY_CHUNK_STEP = int(os.environ.get('MCA_COMPAT_CHUNK_STEP', 4))
     COMPATIBILITY_BLOCK_STEP = int(os.environ.get('MCA_COMPAT_BLOCK_STEP', 8))
@@ -52,6 +60,10 @@ class MCAParserConfig:
             'skip_air_blocks': cls.SKIP_AIR_BLOCKS,
             'max_blocks_per_chunk': cls.MAX_BLOCKS_PER_CHUNK,
             'preview_block_limit': cls.PREVIEW_BLOCK_LIMIT,
+            'lod_factors': cls.LOD_FACTORS,
+            'threejs_block_limit': cls.THREEJS_BLOCK_LIMIT,
+            'volume_top_types': cls.VOLUME_TOP_TYPES,
+            'volume_max_cells': cls.VOLUME_MAX_CELLS,
             'compatibility_chunk_step': cls.COMPATIBILITY_CHUNK_STEP,
             'compatibility_block_step': cls.COMPATIBILITY_BLOCK_STEP
         }
@@ -0,0 +1,32 @@
+"""add annotation_count to map_data
+
+Revision ID: 7c2e4a91d3b5
+Revises: 520933ad24f8
+Create Date: 2026-10-19 10:12:31.482096
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4a91d3b5'
+down_revision = '520933ad24f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('annotation_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # 回填已有地图的标注数量
+    op.execute(
+        'UPDATE map_data SET annotation_count = '
+        '(SELECT COUNT(*) FROM annotations WHERE annotations.map_data_id = map_data.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.drop_column('annotation_count')
@@ -0,0 +1,44 @@
+"""add hot path indexes
+
+Revision ID: a8c24f6e1b93
+Revises: f5b0c3d94e61
+Create Date: 2026-10-19 15:02:41.527318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c24f6e1b93'
+down_revision = 'f5b0c3d94e61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.create_index('ix_map_data_is_parsed_created_at_id', ['is_parsed', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('chunk_data', schema=None) as batch_op:
+        batch_op.create_index('ix_chunk_data_map_data_id_chunk_x_chunk_z', ['map_data_id', 'chunk_x', 'chunk_z'], unique=False)
+
+    with op.batch_alter_table('training_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_training_jobs_map_data_id', ['map_data_id'], unique=False)
+
+    with op.batch_alter_table('generated_maps', schema=None) as batch_op:
+        batch_op.create_index('ix_generated_maps_training_job_id', ['training_job_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generated_maps', schema=None) as batch_op:
+        batch_op.drop_index('ix_generated_maps_training_job_id')
+
+    with op.batch_alter_table('training_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_training_jobs_map_data_id')
+
+    with op.batch_alter_table('chunk_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_chunk_data_map_data_id_chunk_x_chunk_z')
+
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_map_data_is_parsed_created_at_id')
@@ -0,0 +1,36 @@
+"""add stats_counters
+
+Revision ID: b41d8e2f6a07
+Revises: 7c2e4a91d3b5
+Create Date: 2026-10-19 11:05:47.903512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41d8e2f6a07'
+down_revision = '7c2e4a91d3b5'
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = (
+    'maps_total', 'maps_parsed', 'maps_pending', 'maps_parsing', 'maps_completed', 'maps_failed',
+    'annotations_total',
+    'jobs_total', 'jobs_pending', 'jobs_running', 'jobs_completed', 'jobs_failed', 'jobs_stopped',
+)
+
+
+def upgrade():
+    op.create_table('stats_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=False, server_default='0') for name in COUNTER_COLUMNS],
+    sa.Column('rebuilt_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # 计数行在首次读取时由 stats_service 用分组查询生成
+
+
+def downgrade():
+    op.drop_table('stats_counters')
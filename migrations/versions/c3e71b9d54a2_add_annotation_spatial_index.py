@@ -0,0 +1,38 @@
+"""add annotation spatial index
+
+Revision ID: c3e71b9d54a2
+Revises: a8c24f6e1b93
+Create Date: 2026-10-19 18:05:37.482915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e71b9d54a2'
+down_revision = 'a8c24f6e1b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # R*Tree 虚拟表只在 SQLite 上创建，其他数据库由空间查询服务退回范围条件
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS annotation_rtree "
+        "USING rtree_i32(id, min_map, max_map, min_x, max_x, min_y, max_y, min_z, max_z)"
+    )
+    op.execute(
+        "INSERT INTO annotation_rtree (id, min_map, max_map, min_x, max_x, min_y, max_y, min_z, max_z) "
+        "SELECT id, map_data_id, map_data_id, min_x, max_x, min_y, max_y, min_z, max_z FROM annotations"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TABLE IF EXISTS annotation_rtree")
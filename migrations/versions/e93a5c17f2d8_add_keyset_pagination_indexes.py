@@ -0,0 +1,42 @@
+"""add keyset pagination indexes
+
+Revision ID: e93a5c17f2d8
+Revises: b41d8e2f6a07
+Create Date: 2026-10-19 12:21:08.316044
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a5c17f2d8'
+down_revision = 'b41d8e2f6a07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.create_index('ix_map_data_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_map_data_parse_status_created_at_id', ['parse_status', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('annotations', schema=None) as batch_op:
+        batch_op.create_index('ix_annotations_map_data_id_created_at_id', ['map_data_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('training_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_training_jobs_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_training_jobs_status_created_at_id', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('training_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_training_jobs_status_created_at_id')
+        batch_op.drop_index('ix_training_jobs_created_at_id')
+
+    with op.batch_alter_table('annotations', schema=None) as batch_op:
+        batch_op.drop_index('ix_annotations_map_data_id_created_at_id')
+
+    with op.batch_alter_table('map_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_map_data_parse_status_created_at_id')
+        batch_op.drop_index('ix_map_data_created_at_id')
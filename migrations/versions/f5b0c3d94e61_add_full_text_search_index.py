@@ -0,0 +1,47 @@
+"""add full text search index
+
+Revision ID: f5b0c3d94e61
+Revises: e93a5c17f2d8
+Create Date: 2026-10-19 13:40:52.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b0c3d94e61'
+down_revision = 'e93a5c17f2d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 虚拟表只在 SQLite 上创建，其他数据库由搜索服务退回 LIKE 查询
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS map_search "
+        "USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS annotation_search "
+        "USING fts5(title, body, map_data_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO map_search (rowid, title, body) "
+        "SELECT id, original_filename, COALESCE(world_name, '') FROM map_data"
+    )
+    op.execute(
+        "INSERT INTO annotation_search (rowid, title, body, map_data_id) "
+        "SELECT id, label, COALESCE(description, ''), map_data_id FROM annotations"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TABLE IF EXISTS annotation_search")
+    op.execute("DROP TABLE IF EXISTS map_search")